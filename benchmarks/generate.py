@@ -0,0 +1,194 @@
+"""Build repeatable synthetic collections of directories to bag.
+
+Usage:
+    python -m benchmarks.generate tiny-bags /dev/shm/collection --scale 0.1
+"""
+import argparse
+import os
+import random
+import typing
+
+# Size of the block of random data every file is cut from
+BLOCK_SIZE = 1024 * 1024
+
+# System files added to each directory that has them, for the clean and
+# sweep benchmarks
+SYSTEM_FILES = [".DS_Store", "Thumbs.db", "._file0000000.bin"]
+
+
+class Profile(typing.NamedTuple):
+    """Shape of a synthetic collection."""
+
+    #: number of directories, each of which becomes a bag
+    bags: int
+
+    #: number of files in each directory
+    files: int
+
+    #: size of each file in bytes
+    size: int
+
+    #: number of files per subdirectory, 0 to put them all at the top
+    per_directory: int
+
+    #: whether system files are added to every directory
+    system_files: bool
+
+
+PROFILES: typing.Dict[str, Profile] = {
+    # collections of many small bags, where opening each bag costs the most
+    "tiny-bags": Profile(
+        bags=10_000, files=3, size=1024, per_directory=0, system_files=True
+    ),
+    # a single bag where looking up and opening files costs the most
+    "many-files": Profile(
+        bags=1, files=1_000_000, size=4096, per_directory=1000,
+        system_files=True
+    ),
+    # a few large files, where reading and hashing costs the most
+    "large-files": Profile(
+        bags=1, files=4, size=2 * 1024 ** 3, per_directory=0,
+        system_files=False
+    ),
+}
+
+
+def scaled(profile: Profile, scale: float) -> Profile:
+    """Shrink or grow a profile.
+
+    The number of bags and files are scaled for the profiles with many of
+    them, and the size of the files for the others, so that the shape of
+    the collection stays the same.
+
+    Args:
+        profile: profile to scale
+        scale: factor to multiply by
+
+    Returns:
+        The scaled profile
+
+    """
+    if profile.bags > 1:
+        return profile._replace(bags=max(1, round(profile.bags * scale)))
+    if profile.files > 1000:
+        return profile._replace(files=max(1, round(profile.files * scale)))
+    return profile._replace(size=max(1, round(profile.size * scale)))
+
+
+def random_block(seed: int) -> bytes:
+    """Create a block of data that is the same for the same seed.
+
+    Args:
+        seed: seed of the random number generator
+
+    Returns:
+        BLOCK_SIZE random bytes
+
+    """
+    return random.Random(seed).getrandbits(BLOCK_SIZE * 8).to_bytes(
+        BLOCK_SIZE, "little"
+    )
+
+
+def write_file(
+        path: str,
+        size: int,
+        source: memoryview,
+        offset: int
+) -> None:
+    """Write a file cut from a block of data.
+
+    Each file starts at a different offset of the block, so no two files
+    of the collection have the same checksum.
+
+    Args:
+        path: file to create
+        size: size of the file in bytes
+        source: a random block twice over, as returned by
+            :py:func:`random_block`, repeated to fill the file
+        offset: where in the block the file starts
+
+    """
+    offset %= BLOCK_SIZE
+    view = source[offset:offset + BLOCK_SIZE]
+    with open(path, "wb") as file_handle:
+        remaining = size
+        while remaining > 0:
+            chunk = view[:min(remaining, len(view))]
+            file_handle.write(chunk)
+            remaining -= len(chunk)
+
+
+def generate(
+        profile: Profile,
+        root: str,
+        seed: int = 0
+) -> typing.List[str]:
+    """Build a collection of directories, ready to be bagged.
+
+    Args:
+        profile: shape of the collection
+        root: directory to build it in. It is created if needed.
+        seed: the same seed always builds the same collection
+
+    Returns:
+        Paths of the directories which will become bags
+
+    """
+    source = memoryview(random_block(seed) * 2)
+    bag_dirs = []
+    counter = 0
+    for bag_num in range(profile.bags):
+        bag_dir = os.path.join(root, f"bag{bag_num:07d}")
+        os.makedirs(bag_dir)
+        for file_num in range(profile.files):
+            directory = bag_dir
+            if profile.per_directory:
+                directory = os.path.join(
+                    bag_dir, f"dir{file_num // profile.per_directory:05d}"
+                )
+                if file_num % profile.per_directory == 0:
+                    os.makedirs(directory)
+            write_file(
+                os.path.join(directory, f"file{file_num:07d}.bin"),
+                profile.size,
+                source,
+                counter * 4099
+            )
+            counter += 1
+        if profile.system_files:
+            add_system_files(bag_dir)
+        bag_dirs.append(bag_dir)
+    return bag_dirs
+
+
+def add_system_files(directory: str) -> None:
+    """Add one of each of SYSTEM_FILES to a directory.
+
+    Args:
+        directory: directory to add them to
+
+    """
+    for name in SYSTEM_FILES:
+        with open(os.path.join(directory, name), "wb") as file_handle:
+            file_handle.write(b"\0" * 64)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("profile", choices=sorted(PROFILES))
+    parser.add_argument("root", help="directory to build the collection in")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    profile = scaled(PROFILES[args.profile], args.scale)
+    bag_dirs = generate(profile, args.root, args.seed)
+    print(
+        f"{len(bag_dirs)} directories of {profile.files} files of "
+        f"{profile.size} bytes in {args.root}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Compare the process, thread and pipeline hashing engines.
+
+Usage:
+    python -m benchmarks.hashing --files 2000 --size 65536 --workers 4
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import bagit
+
+import grabbags.bags
+import grabbags.hashing
+
+
+def make_payload(root: str, files: int, size: int) -> None:
+    os.makedirs(root)
+    block = os.urandom(size)
+    for num in range(files):
+        with open(os.path.join(root, f"file{num:07d}.bin"), "wb") as f:
+            f.write(block)
+
+
+def timed(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=2000)
+    parser.add_argument("--size", type=int, default=64 * 1024)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--checksums", nargs="+", default=["sha256"])
+    parser.add_argument("--dir", default=None, help="where to create files")
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    try:
+        timings = []
+        for engine in ("processes", "threads", "pipeline"):
+            bag_dir = os.path.join(root, engine)
+            make_payload(bag_dir, args.files, args.size)
+            if engine == "processes":
+                create = timed(
+                    grabbags.bags.make_bag, bag_dir,
+                    processes=args.workers, checksums=args.checksums
+                )
+                validate = timed(
+                    bagit.Bag(bag_dir).validate, processes=args.workers
+                )
+            else:
+                if engine == "threads":
+                    executor = grabbags.hashing.create_thread_pool(
+                        args.workers
+                    )
+                else:
+                    executor = grabbags.hashing.HashPipeline(
+                        args.workers, args.workers
+                    )
+                with executor:
+                    create = timed(
+                        grabbags.bags.make_bag, bag_dir,
+                        checksums=args.checksums, executor=executor
+                    )
+                    validate = timed(
+                        grabbags.bags.Bag(bag_dir, executor=executor).validate
+                    )
+            timings.append((engine, create, validate))
+    finally:
+        shutil.rmtree(root)
+
+    megabytes = args.files * args.size / (1024 * 1024)
+    print(
+        f"{args.files} files of {args.size} bytes, {args.workers} workers, "
+        f"{', '.join(args.checksums)}"
+    )
+    print(f"{'engine':<10} {'create':>10} {'validate':>10} {'MB/s':>10}")
+    for engine, create, validate in timings:
+        print(
+            f"{engine:<10} {create:>9.2f}s {validate:>9.2f}s "
+            f"{megabytes / validate:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
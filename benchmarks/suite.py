@@ -0,0 +1,281 @@
+"""Time every grabbags action on synthetic collections.
+
+Each profile of benchmarks.generate is built afresh for every number of
+processes, then bagged, validated in every mode and cleaned. Results can be
+saved as the baseline of the machine and compared with later runs.
+
+Usage:
+    python -m benchmarks.suite --profile tiny-bags --scale 0.1 \\
+        --processes 1 4 --dir /dev/shm --save
+    python -m benchmarks.suite --profile tiny-bags --scale 0.1 \\
+        --processes 1 4 --dir /dev/shm --compare
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+import typing
+
+import grabbags.grabbags
+import grabbags.utils
+from benchmarks import generate
+
+# Where baselines are kept unless --baselines is given
+BASELINES_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+
+# Validation modes timed, with the options that select them
+VALIDATE_MODES = {
+    "validate": [],
+    "validate-fast": ["--fast"],
+    "validate-no-checksums": ["--no-checksums"],
+    "validate-sample": ["--sample", "0.1", "--sample-seed", "benchmark"],
+}
+
+# Slowdown compared with the baseline that counts as a regression
+DEFAULT_THRESHOLD = 0.1
+
+Timings = typing.Dict[str, typing.Dict[str, float]]
+
+
+def machine_tag(label: typing.Optional[str] = None) -> str:
+    """Name the machine, so baselines are only compared on the same one.
+
+    Args:
+        label: what else sets this run apart, such as the kind of storage
+
+    Returns:
+        A name safe to use as a file name
+
+    """
+    parts = [
+        platform.node() or "unknown",
+        platform.machine() or "unknown",
+        f"{os.cpu_count()}cpu",
+        f"{platform.python_implementation()}"
+        f"{sys.version_info.major}.{sys.version_info.minor}",
+    ]
+    if label:
+        parts.append(label)
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", "-".join(parts))
+
+
+def timed_action(argv: typing.List[str]) -> float:
+    """Run grabbags with command line arguments and time it.
+
+    Args:
+        argv: command line arguments
+
+    Returns:
+        Wall time in seconds
+
+    """
+    timings = []
+
+    def run(args) -> None:
+        runner = grabbags.grabbags.GrabbagsRunner()
+        start = time.perf_counter()
+        runner.run(args)
+        timings.append(time.perf_counter() - start)
+
+    grabbags.grabbags.main(argv + ["--quiet"], runner=run)
+    return timings[0]
+
+
+def timed(function, *args, **kwargs) -> float:
+    start = time.perf_counter()
+    function(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def run_profile(
+        profile: generate.Profile,
+        root: str,
+        processes: typing.List[int],
+        seed: int = 0,
+        repeat: int = 1
+) -> Timings:
+    """Time every action on one profile.
+
+    Args:
+        profile: shape of the collection
+        root: directory to build the collections in
+        processes: values of --processes to time the actions with
+        seed: seed of the collection
+        repeat: how many times to run the benchmarks that leave the
+            collection as it was, keeping the fastest time
+
+    Returns:
+        Seconds taken, keyed by the name of the benchmark and then by the
+        number of processes. Benchmarks that don't use processes are only
+        run once, keyed by "-".
+
+    """
+    results: Timings = {}
+    for count in processes:
+        collection = os.path.join(root, f"processes-{count}")
+        bag_dirs = generate.generate(profile, collection, seed)
+        key = str(count)
+        try:
+            if not results:
+                results["find_bag_dirs"] = {
+                    "-": min(
+                        timed(
+                            lambda: list(
+                                grabbags.grabbags.GrabbagsRunner
+                                .find_bag_dirs(collection)
+                            )
+                        ) for _ in range(repeat)
+                    )
+                }
+                results["remove_system_files"] = {
+                    "-": timed(
+                        lambda: [
+                            grabbags.utils.remove_system_files(bag_dir)
+                            for bag_dir in bag_dirs
+                        ]
+                    )
+                }
+            common = ["--processes", key, collection]
+            results.setdefault("create", {})[key] = timed_action(
+                ["--no-system-files"] + common
+            )
+            for mode, options in VALIDATE_MODES.items():
+                results.setdefault(mode, {})[key] = min(
+                    timed_action(["--validate"] + options + common)
+                    for _ in range(repeat)
+                )
+            for bag_dir in bag_dirs:
+                generate.add_system_files(os.path.join(bag_dir, "data"))
+            results.setdefault("clean", {})[key] = timed_action(
+                ["--clean"] + common
+            )
+        finally:
+            shutil.rmtree(collection)
+    return results
+
+
+def load_baseline(path: str) -> typing.Dict[str, Timings]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as baseline_file:
+        return json.load(baseline_file)["profiles"]
+
+
+def save_baseline(
+        path: str,
+        tag: str,
+        profiles: typing.Dict[str, Timings]
+) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as baseline_file:
+        json.dump(
+            {"machine": tag, "saved": time.time(), "profiles": profiles},
+            baseline_file,
+            indent=2,
+            sort_keys=True
+        )
+
+
+def compare(
+        name: str,
+        timings: Timings,
+        baseline: Timings,
+        threshold: float
+) -> int:
+    """Print the timings of a profile next to its baseline.
+
+    Args:
+        name: name of the profile
+        timings: timings of this run
+        baseline: timings of the baseline, if any
+        threshold: slowdown that counts as a regression, as a fraction
+
+    Returns:
+        Number of regressions found
+
+    """
+    regressions = 0
+    print(f"{name}")
+    print(
+        f"  {'benchmark':<24} {'processes':>9} {'seconds':>10} "
+        f"{'baseline':>10} {'change':>8}"
+    )
+    for benchmark, by_processes in timings.items():
+        for processes, seconds in by_processes.items():
+            before = baseline.get(benchmark, {}).get(processes)
+            line = f"  {benchmark:<24} {processes:>9} {seconds:>10.3f}"
+            if before:
+                change = seconds / before - 1
+                line += f" {before:>10.3f} {change:>+8.1%}"
+                if change > threshold:
+                    line += "  REGRESSION"
+                    regressions += 1
+            print(line)
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--profile", nargs="+", choices=sorted(generate.PROFILES),
+        default=sorted(generate.PROFILES)
+    )
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--processes", type=int, nargs="+", default=[1])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--repeat", type=int, default=3,
+        help="times to repeat the benchmarks which don't change the bags"
+    )
+    parser.add_argument("--dir", default=None, help="where to create files")
+    parser.add_argument(
+        "--label", help="added to the machine tag, such as tmpfs or nfs"
+    )
+    parser.add_argument("--baselines", default=BASELINES_DIR)
+    parser.add_argument(
+        "--save", action="store_true",
+        help="save the timings as the baseline of this machine"
+    )
+    parser.add_argument(
+        "--compare", action="store_true",
+        help="exit with an error if any benchmark is slower than the baseline"
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    tag = machine_tag(args.label)
+    baseline_path = os.path.join(args.baselines, f"{tag}.json")
+    baseline = load_baseline(baseline_path)
+    print(f"machine {tag}, scale {args.scale}")
+
+    profiles = {}
+    regressions = 0
+    for name in args.profile:
+        profile = generate.scaled(generate.PROFILES[name], args.scale)
+        name = f"{name}@{args.scale:g}"
+        root = tempfile.mkdtemp(dir=args.dir)
+        try:
+            profiles[name] = run_profile(
+                profile, root, args.processes, args.seed, args.repeat
+            )
+        finally:
+            shutil.rmtree(root)
+        regressions += compare(
+            name, profiles[name], baseline.get(name, {}), args.threshold
+        )
+
+    if args.save:
+        baseline.update(profiles)
+        save_baseline(baseline_path, tag, baseline)
+        print(f"saved baseline {baseline_path}")
+    if args.compare and regressions:
+        sys.exit(f"{regressions} benchmarks are slower than the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,26 @@
+import concurrent.futures
+import hashlib
+import logging
+import math
+import multiprocessing
 import os
+import random
+import tempfile
+import time
+import typing
+from datetime import date
+
+import bagit
+
+from grabbags import hashing
+from grabbags import utils
+
+if typing.TYPE_CHECKING:
+    from grabbags.cache import ChecksumCache
+    from grabbags.metrics import BagMetrics
+    from grabbags.progress import BagProgress
+
+LOGGER = logging.getLogger(__name__)
 
 
 def is_bag(path) -> bool:
@@ -19,3 +41,1646 @@ def is_bag(path) -> bool:
         return False
 
     return True
+
+
+def payload_oxum(bag_dir: str) -> typing.Optional[typing.Tuple[int, int]]:
+    """Read the Payload-Oxum of a bag without opening its manifests.
+
+    Args:
+        bag_dir: path to bag root folder
+
+    Returns:
+        The byte count and file count recorded in bag-info.txt or None if the
+        bag has no readable Payload-Oxum
+
+    """
+    try:
+        info = bagit._load_tag_file(os.path.join(bag_dir, "bag-info.txt"))
+    except (OSError, bagit.BagError):
+        return None
+
+    oxum = info.get("Payload-Oxum")
+    if isinstance(oxum, list):
+        oxum = oxum[0]
+    if not oxum:
+        return None
+
+    byte_count, _, file_count = oxum.partition(".")
+    if not byte_count.isdigit() or not file_count.isdigit():
+        return None
+    return int(byte_count), int(file_count)
+
+
+def estimate_size(path: str) -> int:
+    """Cheaply estimate the number of bytes that need hashing in a directory.
+
+    Existing bags report their Payload-Oxum. Anything else is measured by
+    adding up the size of every file found below it.
+
+    Args:
+        path: path to a bag or a directory which will become a bag
+
+    Returns:
+        Estimated size in bytes
+
+    """
+    if is_bag(path):
+        oxum = payload_oxum(path)
+        if oxum is not None:
+            return oxum[0]
+
+    total_bytes = 0
+    pending = [path]
+    while pending:
+        try:
+            entries = list(os.scandir(pending.pop()))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                else:
+                    total_bytes += entry.stat(follow_symlinks=False).st_size
+            except OSError:
+                continue
+    return total_bytes
+
+
+def payload_files(bag_dir: str) -> typing.Iterator[str]:
+    """Locate the payload files of a bag.
+
+    The files are yielded in the same sorted order bagit uses when it writes
+    manifests, relative to the bag root and using "/" as separator.
+
+    Args:
+        bag_dir: path to bag root folder
+
+    """
+    data_dir = os.path.join(bag_dir, "data")
+    for dirpath, dirnames, filenames in os.walk(data_dir):
+        filenames.sort()
+        dirnames.sort()
+        for file_name in filenames:
+            rel_path = os.path.relpath(
+                os.path.join(dirpath, file_name), start=bag_dir
+            )
+            yield rel_path.replace(os.sep, "/")
+
+
+# Steps of validation, cheapest first. Validation stops at the first step
+# that fails.
+VALIDATION_STAGES = [
+    "structure",
+    "payload-oxum",
+    "completeness",
+    "tag fixity",
+    "payload fixity",
+]
+
+
+# Bags whose manifests and tag manifests add up to more bytes than this are
+# loaded into a compact ManifestIndex instead of bagit's dictionaries
+COMPACT_MANIFEST_BYTES = 16 * 1024 * 1024
+
+
+def manifests_size(bag_dir: str) -> int:
+    """Add up the size of the manifests and tag manifests of a bag.
+
+    Args:
+        bag_dir: path to bag root folder
+
+    Returns:
+        Total size in bytes, or 0 if the bag can't be read
+
+    """
+    total_bytes = 0
+    try:
+        for name in os.listdir(bag_dir):
+            if name.startswith(("manifest-", "tagmanifest-")):
+                total_bytes += os.path.getsize(os.path.join(bag_dir, name))
+    except OSError:
+        return 0
+    return total_bytes
+
+
+class SamplePolicy(typing.NamedTuple):
+    """How to pick the payload files to hash when spot checking a bag.
+
+    Exactly one of fraction or max_bytes should be set.
+    """
+
+    #: fraction of the payload files to hash, between 0 and 1
+    fraction: typing.Optional[float] = None
+
+    #: number of bytes to hash. Files are added until this is reached.
+    max_bytes: typing.Optional[int] = None
+
+    #: seed for picking the files. Combined with the name of the bag so that
+    #: each bag gets a different, repeatable selection. None picks a new
+    #: selection every time.
+    seed: typing.Optional[str] = None
+
+
+class SampleSummary(typing.NamedTuple):
+    """How much of a bag a spot check covered."""
+
+    files_checked: int
+    files_total: int
+    bytes_checked: int
+    bytes_total: int
+
+
+def corruption_bound(files_checked: int, confidence: float = 0.95) -> float:
+    """Estimate how many files could be corrupt after a clean spot check.
+
+    If files_checked files picked at random all matched their manifests,
+    the fraction of corrupt files is below the value returned with the given
+    confidence.
+
+    Args:
+        files_checked: number of files hashed, none of which were corrupt
+        confidence: confidence level, between 0 and 1
+
+    Returns:
+        Upper bound of the fraction of corrupt files
+
+    """
+    if files_checked <= 0:
+        return 1.0
+    return 1 - (1 - confidence) ** (1 / files_checked)
+
+
+def choose_sample(
+        sample: SamplePolicy,
+        sizes: typing.Dict[str, int],
+        name: str
+) -> typing.Tuple[typing.List[str], SampleSummary]:
+    """Pick the files to hash for a spot check.
+
+    Args:
+        sample: how to pick the files
+        sizes: size in bytes of every file that could be picked, keyed by
+            path
+        name: name of the bag, combined with the seed of the policy
+
+    Returns:
+        The paths picked and how much of the files they cover
+
+    """
+    seed = None if sample.seed is None else f"{sample.seed}:{name}"
+    order = list(sizes)
+    random.Random(seed).shuffle(order)
+    if sample.fraction is not None:
+        chosen = order[:math.ceil(sample.fraction * len(order))]
+    else:
+        chosen = []
+        total_bytes = 0
+        for rel_path in order:
+            if total_bytes >= sample.max_bytes:
+                break
+            chosen.append(rel_path)
+            total_bytes += sizes[rel_path]
+
+    return chosen, SampleSummary(
+        files_checked=len(chosen),
+        files_total=len(order),
+        bytes_checked=sum(sizes[rel_path] for rel_path in chosen),
+        bytes_total=sum(sizes.values())
+    )
+
+
+class Bag(bagit.Bag):
+    """A bag that can hash its payload with a shared executor.
+
+    When an executor is given, every payload file is sent to it as a separate
+    task during validation, instead of bagit starting a new process pool for
+    the bag. This lets several bags share one pool of workers.
+
+    When a checksum cache is given, the digests of the files which validate
+    are recorded in it. If trust_cache is also set, files that haven't
+    changed since their digest was last verified are not hashed again.
+
+    When a sample policy is given, only a random selection of the payload
+    files is hashed. Tag files are always hashed, before any payload file.
+
+    While the bag is measured by :py:mod:`grabbags.metrics` or its progress
+    is shown by :py:mod:`grabbags.progress`, its payload is hashed by
+    grabbags as well, so that the time spent checking its metadata, reading
+    and hashing is recorded and every block read moves the progress on.
+
+    Bags with very large manifests, over COMPACT_MANIFEST_BYTES, have them
+    loaded into a :py:class:`grabbags.manifests.ManifestIndex`, which takes
+    a fraction of the memory of bagit's dictionaries. Such bags are always
+    hashed by grabbags, a limited number of files at a time, and the names
+    of their payload files are only remembered when they differ after
+    Unicode normalization.
+
+    When verify_algorithm is given, each file is hashed with a single
+    algorithm, while completeness is still checked against every manifest.
+
+    When load_manifests is False, the manifests are only loaded if the
+    payload is going to be hashed. Otherwise, completeness is checked with
+    :py:mod:`grabbags.completeness`, which sorts and merges the manifests
+    and the payload in bounded memory, so validating with fast or
+    completeness_only never loads them.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            executor: typing.Optional[concurrent.futures.Executor] = None,
+            checksum_cache: "typing.Optional[ChecksumCache]" = None,
+            trust_cache: bool = False,
+            sample: typing.Optional[SamplePolicy] = None,
+            compact_manifests: typing.Optional[bool] = None,
+            load_manifests: bool = True,
+            verify_algorithm: typing.Optional[str] = None,
+            recorder: "typing.Optional[BagMetrics]" = None,
+            tracker: "typing.Optional[BagProgress]" = None
+    ) -> None:
+        """Open a bag.
+
+        Args:
+            path: path to bag root folder
+            executor: executor to hash the files with, instead of a new
+                process pool
+            checksum_cache: cache of digests which were verified before
+            trust_cache: skip the files whose digests are in the cache
+            sample: policy for hashing only some of the payload files
+            compact_manifests: load the manifests into a ManifestIndex.
+                By default, only manifests over COMPACT_MANIFEST_BYTES are.
+            load_manifests: load the manifests when the bag is opened,
+                rather than only when they are needed to hash the payload
+            verify_algorithm: hash each file with only this algorithm, or
+                with the "strongest" or "fastest" algorithm of the bag,
+                instead of every algorithm it has a manifest for
+            recorder: measurements of the bag, where the time spent
+                validating it is added
+            tracker: progress of the bag, which is told about every block
+                hashed
+
+        """
+        self.executor = executor
+        self.checksum_cache = checksum_cache
+        self.trust_cache = trust_cache
+        self.sample = sample
+
+        #: the last stage of validation that was started, from
+        #: VALIDATION_STAGES. If validation failed, this is where.
+        self.stage: typing.Optional[str] = None
+
+        #: coverage of the last spot check
+        self.sample_summary: typing.Optional[SampleSummary] = None
+        self.compact_manifests = compact_manifests
+        self.load_manifests = load_manifests
+        self.verify_algorithm = verify_algorithm
+        self.recorder = recorder
+        self.tracker = tracker
+
+        #: the algorithm files were verified with, when verify_algorithm is
+        #: set and the bag has a manifest for it
+        self.verified_algorithm: typing.Optional[str] = None
+        super().__init__(path)
+
+    def _load_manifests(self):
+        if not self.load_manifests:
+            return None
+        if self.compact_manifests is None:
+            self.compact_manifests = \
+                manifests_size(self.path) > COMPACT_MANIFEST_BYTES
+        if not self.compact_manifests:
+            return super()._load_manifests()
+
+        from grabbags import manifests
+        manifest_paths = list(self.manifest_files())
+        if self.version_info >= (0, 97):
+            manifest_paths += list(self.tagmanifest_files())
+
+        self.entries = manifests.ManifestIndex()
+        for manifest_path in manifest_paths:
+            alg = os.path.basename(manifest_path).split("-", 1)[1][:-4]
+            if alg not in self.algorithms:
+                self.algorithms.append(alg)
+            for entry_hash, entry_path in manifests.read_manifest(
+                    manifest_path, self.encoding
+            ):
+                entry_path = bagit._decode_filename(
+                    os.path.normpath(entry_path.lstrip("*"))
+                )
+                if self._path_is_dangerous(entry_path):
+                    raise bagit.BagError(
+                        f'Path "{entry_path}" in manifest "{manifest_path}"'
+                        f' is unsafe'
+                    )
+                recorded = self.entries.add(entry_path, alg, entry_hash)
+                if recorded is None:
+                    continue
+                if recorded.lower() != entry_hash.lower():
+                    raise bagit.BagError(
+                        f"{self}: {alg} manifest lists {entry_path} multiple"
+                        f" times with conflicting values"
+                    )
+                message = f"{self}: {alg} manifest lists {entry_path}" \
+                    f" multiple times with the same value"
+                if self.version_info >= (1,):
+                    raise bagit.BagError(message)
+                LOGGER.warning(message)
+        LOGGER.debug(
+            "%s: %d manifest entries take %d bytes",
+            self, len(self.entries), self.entries.nbytes
+        )
+        return None
+
+    def payload_files(self):
+        if not self.load_manifests:
+            # without manifests, nothing looks the names up, so the files
+            # are only streamed, such as to count them for the Payload-Oxum
+            return self._compact_payload_files(remember_names=False)
+        if not self.compact_manifests:
+            return super().payload_files()
+        return self._compact_payload_files()
+
+    def _compact_payload_files(
+            self,
+            remember_names: bool = True
+    ) -> typing.Iterator[str]:
+        # like bagit, but only the names which change when normalized are
+        # remembered
+        data_dir = os.path.join(self.path, "data")
+        for dirpath, _, filenames in os.walk(data_dir):
+            for file_name in filenames:
+                rel_path = os.path.relpath(
+                    os.path.join(dirpath, os.path.normpath(file_name)),
+                    start=self.path
+                )
+                if remember_names:
+                    normalized = bagit.normalize_unicode(rel_path)
+                    if normalized != rel_path:
+                        self.normalized_filesystem_names[normalized] = \
+                            rel_path
+                yield rel_path
+
+    def compare_manifests_with_fs(self):
+        if not self.load_manifests:
+            from grabbags import completeness
+            return completeness.compare_manifests_with_fs(self)
+        if not self.compact_manifests:
+            return super().compare_manifests_with_fs()
+
+        # the file system is walked once, marking each file of the manifests
+        # it finds, rather than building sets of both
+        found = bytearray(len(self.entries))
+        only_on_fs = []
+        for rel_path in self.payload_files():
+            position = self.entries.position(rel_path)
+            if position < 0:
+                only_on_fs.append(rel_path)
+            else:
+                found[position] = 1
+
+        data_prefix = "data" + os.sep
+        only_in_manifest = [
+            path for position, path in enumerate(self.entries)
+            if not found[position] and path.startswith(data_prefix)
+        ]
+        if self.version_info >= (0, 97):
+            only_in_manifest += list(self.missing_optional_tagfiles())
+        return only_in_manifest, only_on_fs
+
+    def validate(self, processes=1, fast=False, completeness_only=False):
+        self.stage = "structure"
+        return super().validate(
+            processes=processes,
+            fast=fast,
+            completeness_only=completeness_only
+        )
+
+    def _validate_contents(
+            self,
+            processes=1,
+            fast=False,
+            completeness_only=False
+    ):
+        started = time.perf_counter()
+        try:
+            # hashing needs the manifests, so completeness is checked with
+            # them as well
+            if not self.load_manifests and not fast and \
+                    not completeness_only:
+                self.load_manifests = True
+                self._load_manifests()
+
+            self.stage = "payload-oxum"
+            if fast and not self.has_oxum():
+                raise bagit.BagValidationError(
+                    "Fast validation requires bag-info.txt to include "
+                    "Payload-Oxum"
+                )
+            self._validate_oxum()
+            if fast:
+                return
+
+            self.stage = "completeness"
+            self._validate_completeness()
+            if completeness_only:
+                return
+        finally:
+            if self.recorder is not None:
+                self.recorder.add_time(
+                    "stat_time", time.perf_counter() - started
+                )
+
+        self._validate_entries(processes)
+
+    def _is_cached(
+            self,
+            stat_result: os.stat_result,
+            hashes: typing.Dict[str, str],
+            algorithms: typing.List[str]
+    ) -> bool:
+        for alg in algorithms:
+            if alg not in hashes:
+                continue
+            cached = self.checksum_cache.lookup(stat_result, alg)
+            if cached is None or cached != hashes[alg].lower():
+                return False
+        return True
+
+    def _calculate_hashes(self, tasks, processes):
+        # results are yielded as they come, so that tasks can be generated
+        # as they are needed
+        if self.executor is not None:
+            yield from hashing.map_reporting(
+                self.executor, hashing.verify_payload_file, tasks,
+                self.recorder, self.tracker
+            )
+            return
+        verify = hashing.reporting_to(
+            hashing.verify_payload_file, self.recorder, self.tracker
+        )
+        if processes == 1:
+            yield from map(verify, tasks)
+            return
+        with multiprocessing.Pool(
+                processes if processes else None,
+                initializer=bagit.posix_multiprocessing_worker_initializer
+                if os.name == "posix" else None
+        ) as pool:
+            yield from pool.imap(
+                hashing.verify_payload_file, tasks, chunksize=64
+            )
+
+    def _fs_path(self, rel_path: str) -> str:
+        if self.compact_manifests:
+            if not self.normalized_filesystem_names:
+                return rel_path
+            return self.normalized_filesystem_names.get(
+                bagit.normalize_unicode(rel_path), rel_path
+            )
+        return self.normalized_filesystem_names.get(rel_path, rel_path)
+
+    def _select_sample(
+            self,
+            entries: typing.Dict[str, typing.Dict[str, str]]
+    ) -> typing.Dict[str, typing.Dict[str, str]]:
+        sizes = {}
+        for rel_path in entries:
+            try:
+                sizes[rel_path] = os.stat(
+                    os.path.join(self.path, self._fs_path(rel_path))
+                ).st_size
+            except OSError:
+                sizes[rel_path] = 0
+
+        chosen, self.sample_summary = choose_sample(
+            self.sample, sizes, os.path.basename(self.path)
+        )
+        LOGGER.info(
+            "%s: spot checking %d of %d files",
+            self, len(chosen), len(sizes)
+        )
+        return {rel_path: entries[rel_path] for rel_path in chosen}
+
+    def _validate_entries(self, processes):
+        # files hashed by bagit itself can't be measured or followed, and
+        # bagit holds every task and result at once
+        if self.executor is None and self.checksum_cache is None and \
+                self.sample is None and not self.compact_manifests and \
+                self.verify_algorithm is None and \
+                self.recorder is None and self.tracker is None:
+            self.stage = "payload fixity"
+            return super()._validate_entries(processes)
+
+        if self.verify_algorithm is not None:
+            self.verified_algorithm = hashing.choose_algorithm(
+                self.verify_algorithm, self.algorithms
+            )
+            if self.verified_algorithm is None:
+                LOGGER.warning(
+                    "%s has no %s manifest, verifying every algorithm",
+                    self, self.verify_algorithm
+                )
+            else:
+                LOGGER.info(
+                    "%s: verifying %s only", self, self.verified_algorithm
+                )
+
+        # the few small tag files are checked before the payload, so that a
+        # damaged bag fails before any time is spent on the payload
+        payload_prefix = "data" + os.sep
+        tag_entries = [
+            (rel_path, hashes) for rel_path, hashes in self.entries.items()
+            if not rel_path.startswith(payload_prefix)
+        ]
+        self.stage = "tag fixity"
+        self._check_entries(tag_entries, 1)
+
+        self.stage = "payload fixity"
+        payload_entries = (
+            (rel_path, hashes) for rel_path, hashes in self.entries.items()
+            if rel_path.startswith(payload_prefix)
+        )
+        if self.sample is not None:
+            payload_entries = self._select_sample(
+                dict(payload_entries)
+            ).items()
+        total, hashed = self._check_entries(payload_entries, processes)
+        if self.checksum_cache is not None and self.trust_cache:
+            LOGGER.info(
+                "%s: %d of %d files unchanged since last verified",
+                self, total - hashed, total
+            )
+        return None
+
+    def _check_entries(
+            self,
+            entries: typing.Iterable[
+                typing.Tuple[str, typing.Dict[str, str]]
+            ],
+            processes: int
+    ) -> typing.Tuple[int, int]:
+        file_stats = {}
+        total = 0
+
+        def make_tasks():
+            nonlocal total
+            for rel_path, hashes in entries:
+                total += 1
+                fs_path = self._fs_path(rel_path)
+                # files missing from the manifest of the chosen algorithm
+                # are verified with the others
+                algorithms = [self.verified_algorithm] \
+                    if self.verified_algorithm in hashes else self.algorithms
+                if self.checksum_cache is not None:
+                    try:
+                        stat_result = os.stat(
+                            os.path.join(self.path, fs_path)
+                        )
+                    except OSError:
+                        stat_result = None
+                    if stat_result is not None:
+                        if self.trust_cache and \
+                                self._is_cached(
+                                    stat_result, hashes, algorithms
+                                ):
+                            continue
+                        file_stats[fs_path] = stat_result
+                yield self.path, fs_path, hashes, algorithms
+
+        errors = []
+        verified = []
+        hashed = 0
+        for rel_path, f_hashes, hashes in \
+                self._calculate_hashes(make_tasks(), processes):
+            hashed += 1
+            file_errors = []
+            for alg, computed_hash in f_hashes.items():
+                stored_hash = hashes[alg].lower()
+                if stored_hash != computed_hash:
+                    file_errors.append(
+                        bagit.ChecksumMismatch(
+                            rel_path, alg, stored_hash, computed_hash
+                        )
+                    )
+            if not file_errors and rel_path in file_stats:
+                verified.append((file_stats.pop(rel_path), f_hashes))
+            for error in file_errors:
+                LOGGER.warning(str(error))
+            errors += file_errors
+
+        if self.checksum_cache is not None and verified:
+            self.checksum_cache.store(verified)
+
+        if errors:
+            raise bagit.BagValidationError("Bag validation failed", errors)
+        return total, hashed
+
+
+# Prefix of the folder the payload is gathered in before it becomes "data"
+TEMP_DATA_PREFIX = "grabbags-tmp"
+
+# Added to the names of tag files while new versions of them are written
+TEMP_FILE_SUFFIX = ".grabbags-tmp"
+
+# Written in a directory before make_bag moves anything in it and removed
+# once the bag is complete, so that an interrupted bag can be told apart
+# from a directory that merely has a "data" folder
+UNFINISHED_MARKER = "grabbags-unfinished.txt"
+
+# Written in a bag once update_bag has finished writing the new versions of
+# its tag files, and removed once they have all replaced the old ones, so
+# that an interrupted update can be finished instead of thrown away
+UPDATE_MARKER = "grabbags-update.txt"
+
+
+class PreparedTree(typing.NamedTuple):
+    """A directory about to become a bag, found by :py:func:`prepare_tree`.
+    """
+
+    #: absolute path to the directory
+    path: str
+
+    #: the directory has nothing in it
+    empty: bool
+
+    #: the directory is already a bag. Nothing below it was scanned.
+    already_a_bag: bool
+
+    #: names of the entries directly inside the directory
+    entries: typing.List[str]
+
+    #: payload files relative to the bag root they will have once bagged,
+    #: in manifest order and using "/" as separator, with their sizes
+    files: typing.List[typing.Tuple[str, int]]
+
+    #: system files removed while scanning
+    system_files: utils.SweepResult
+
+    #: directories which can't be moved into the payload directory
+    unbaggable: typing.List[str]
+
+    #: directories which can't be read
+    unreadable_dirs: typing.List[str]
+
+    #: files which can't be read
+    unreadable_files: typing.List[str]
+
+    @property
+    def total_bytes(self) -> int:
+        """Size of the payload in bytes."""
+        return sum(size for _, size in self.files)
+
+
+class _DirectoryScan(typing.NamedTuple):
+    names: typing.List[str]
+    files: typing.List[typing.Tuple[str, int]]
+    subdirs: typing.List[str]
+    system_files: utils.SweepResult
+    unbaggable: typing.List[str]
+    unreadable_dirs: typing.List[str]
+    unreadable_files: typing.List[str]
+
+
+def _scan_entries(
+        entries: typing.Iterable[os.DirEntry],
+        remove_system_files: bool,
+        log_each: bool
+) -> typing.Tuple[_DirectoryScan, typing.List[str]]:
+    names = []
+    files = []
+    subdirs = []
+    files_removed = 0
+    bytes_removed = 0
+    unbaggable = []
+    unreadable_dirs = []
+    unreadable_files = []
+    for entry in entries:
+        # classify like os.walk does, which bagit uses
+        if entry.is_dir():
+            names.append(entry.name)
+            if not os.access(entry.path, os.W_OK):
+                unbaggable.append(entry.path)
+            if not os.access(entry.path, os.R_OK):
+                unreadable_dirs.append(entry.path)
+            elif not entry.is_symlink():
+                subdirs.append(entry.path)
+            continue
+        if remove_system_files and utils.is_system_file_name(entry.name):
+            bytes_removed += utils.remove_system_file(entry, log_each)
+            files_removed += 1
+            continue
+        names.append(entry.name)
+        if not os.access(entry.path, os.R_OK):
+            unreadable_files.append(entry.path)
+            continue
+        files.append((entry.name, entry.stat().st_size))
+
+    scan = _DirectoryScan(
+        names=names,
+        files=files,
+        subdirs=subdirs,
+        system_files=utils.SweepResult(files_removed, bytes_removed),
+        unbaggable=unbaggable,
+        unreadable_dirs=unreadable_dirs,
+        unreadable_files=unreadable_files
+    )
+    return scan, subdirs
+
+
+def _scan_directory(
+        path: str,
+        remove_system_files: bool,
+        log_each: bool
+) -> typing.Tuple[_DirectoryScan, typing.List[str]]:
+    try:
+        with os.scandir(path) as entries:
+            return _scan_entries(entries, remove_system_files, log_each)
+    except OSError:
+        return _DirectoryScan(
+            names=[],
+            files=[],
+            subdirs=[],
+            system_files=utils.SweepResult(0, 0),
+            unbaggable=[],
+            unreadable_dirs=[path],
+            unreadable_files=[]
+        ), []
+
+
+def prepare_tree(
+        bag_dir: str,
+        remove_system_files: bool = False,
+        threads: int = 1,
+        log_each: bool = False
+) -> PreparedTree:
+    """Scan a directory which is about to be bagged.
+
+    Everything bagging needs to know before it moves the files is found in
+    a single pass with scandir: whether the directory is empty or already a
+    bag, which files and directories lack permissions, and the path and size
+    of every payload file. System files are removed on the way if asked.
+    Nothing below a directory that is already a bag is scanned or removed.
+
+    Args:
+        bag_dir: path to the directory
+        remove_system_files: remove system files found in the directory
+        threads: number of threads scanning subdirectories in parallel
+        log_each: log a warning for every system file removed
+
+    Returns:
+        The prepared tree, ready to be passed to :py:func:`make_bag`
+
+    """
+    bag_dir = os.path.abspath(bag_dir)
+    no_files = utils.SweepResult(0, 0)
+    if not os.access(bag_dir, os.R_OK):
+        return PreparedTree(
+            path=bag_dir, empty=False, already_a_bag=False, entries=[],
+            files=[], system_files=no_files, unbaggable=[bag_dir],
+            unreadable_dirs=[bag_dir], unreadable_files=[]
+        )
+
+    with os.scandir(bag_dir) as entries:
+        top_entries = list(entries)
+    names = {entry.name for entry in top_entries}
+    if not top_entries or {"bagit.txt", "data"} <= names:
+        return PreparedTree(
+            path=bag_dir, empty=not top_entries,
+            already_a_bag=bool(top_entries), entries=sorted(names), files=[],
+            system_files=no_files, unbaggable=[], unreadable_dirs=[],
+            unreadable_files=[]
+        )
+
+    def scan(path: str) -> typing.Tuple[_DirectoryScan, typing.List[str]]:
+        if path == bag_dir:
+            return _scan_entries(top_entries, remove_system_files, log_each)
+        return _scan_directory(path, remove_system_files, log_each)
+
+    scans = utils.scan_tree(scan, bag_dir, threads)
+
+    # put the files in the order bagit writes manifests in, which is the
+    # order of a top down os.walk with sorted names
+    files = []
+    pending = [(bag_dir, "data")]
+    while pending:
+        path, rel_dir = pending.pop()
+        for name, size in sorted(scans[path].files):
+            files.append((f"{rel_dir}/{name}", size))
+        pending.extend(
+            (child, f"{rel_dir}/{os.path.basename(child)}")
+            for child in sorted(scans[path].subdirs, reverse=True)
+        )
+
+    unbaggable = [] if os.access(bag_dir, os.W_OK) else [bag_dir]
+    for result in scans.values():
+        unbaggable.extend(result.unbaggable)
+    return PreparedTree(
+        path=bag_dir,
+        empty=False,
+        already_a_bag=False,
+        entries=scans[bag_dir].names,
+        files=files,
+        system_files=utils.SweepResult(
+            files_removed=sum(
+                result.system_files.files_removed for result in scans.values()
+            ),
+            bytes_removed=sum(
+                result.system_files.bytes_removed for result in scans.values()
+            )
+        ),
+        unbaggable=unbaggable,
+        unreadable_dirs=[
+            unreadable
+            for result in scans.values()
+            for unreadable in result.unreadable_dirs
+        ],
+        unreadable_files=[
+            unreadable
+            for result in scans.values()
+            for unreadable in result.unreadable_files
+        ],
+    )
+
+
+def _mark_unfinished(bag_dir: str) -> None:
+    marker_path = os.path.join(bag_dir, UNFINISHED_MARKER)
+    try:
+        with open(marker_path, "x", encoding="utf-8") as marker:
+            marker.write("Bag creation by grabbags in progress\n")
+    except FileExistsError:
+        raise bagit.BagError(
+            f"{marker_path} already exists. Remove it or restore the "
+            f"unfinished bag before bagging {bag_dir}"
+        )
+
+
+def _move_into_data_dir(
+        bag_dir: str,
+        entries: typing.List[str]
+) -> None:
+    temp_data = tempfile.mkdtemp(prefix=TEMP_DATA_PREFIX, dir=bag_dir)
+    for entry in entries:
+        os.rename(
+            os.path.join(bag_dir, entry), os.path.join(temp_data, entry)
+        )
+
+    data_dir = os.path.join(bag_dir, "data")
+    os.rename(temp_data, data_dir)
+
+    # permissions for the payload directory should match those of the
+    # original directory
+    os.chmod(data_dir, os.stat(bag_dir).st_mode)
+
+
+def _write_manifests(
+        bag_dir: str,
+        results: typing.List[hashing.HashResult],
+        algorithms: typing.List[str],
+        encoding: str = "utf-8",
+        suffix: str = ""
+) -> typing.Tuple[int, int]:
+    for algorithm in algorithms:
+        manifest_path = os.path.join(
+            bag_dir, f"manifest-{algorithm}.txt{suffix}"
+        )
+        with bagit.open_text_file(
+                manifest_path, "w", encoding=encoding) as manifest:
+            for rel_path, _, digests in results:
+                manifest.write(
+                    "%s  %s\n" % (
+                        digests[algorithm], bagit._encode_filename(rel_path)
+                    )
+                )
+    return sum(result[1] for result in results), len(results)
+
+
+def _tag_files(bag_dir: str) -> typing.Iterator[str]:
+    for entry in sorted(os.listdir(bag_dir)):
+        if entry in ("data", UNFINISHED_MARKER, UPDATE_MARKER) or \
+                entry.startswith("tagmanifest-") or \
+                entry.endswith(TEMP_FILE_SUFFIX):
+            continue
+        full_path = os.path.join(bag_dir, entry)
+        if os.path.isfile(full_path):
+            yield entry
+            continue
+        for dirpath, _, filenames in os.walk(full_path):
+            for file_name in sorted(filenames):
+                if file_name.startswith("tagmanifest-"):
+                    continue
+                rel_path = os.path.relpath(
+                    os.path.join(dirpath, file_name), start=bag_dir
+                )
+                yield rel_path.replace(os.sep, "/")
+
+
+def write_tagmanifests(
+        bag_dir: str,
+        algorithms: typing.Iterable[str],
+        encoding: str = "utf-8",
+        suffix: str = ""
+) -> None:
+    """Write the tagmanifest files of a bag.
+
+    Args:
+        bag_dir: path to bag root folder
+        algorithms: algorithms to write a tagmanifest for
+        encoding: encoding used for the tagmanifest files
+        suffix: added to the name of each tagmanifest file. Tag files with
+            a new version written under their name with this suffix are
+            hashed from that new version.
+
+    """
+    tag_files = list(_tag_files(bag_dir))
+    for algorithm in algorithms:
+        lines = []
+        for tag_file in tag_files:
+            hasher = hashlib.new(algorithm)
+            source = os.path.join(bag_dir, tag_file)
+            if suffix and os.path.isfile(source + suffix):
+                source += suffix
+            with open(source, "rb") as file_handle:
+                while True:
+                    block = file_handle.read(bagit.HASH_BLOCK_SIZE)
+                    if not block:
+                        break
+                    hasher.update(block)
+            lines.append("%s %s\n" % (hasher.hexdigest(), tag_file))
+
+        tagmanifest_path = \
+            os.path.join(bag_dir, f"tagmanifest-{algorithm}.txt{suffix}")
+        with bagit.open_text_file(
+                tagmanifest_path, "w", encoding=encoding) as tagmanifest:
+            tagmanifest.writelines(lines)
+
+
+def write_bag_metadata(
+        bag_dir: str,
+        bag_info: typing.Optional[typing.Dict[str, typing.Any]],
+        total_bytes: int,
+        total_files: int
+) -> None:
+    """Write bagit.txt and bag-info.txt for a bag.
+
+    Args:
+        bag_dir: path to bag root folder
+        bag_info: metadata to include in bag-info.txt
+        total_bytes: size of the payload, used for the Payload-Oxum
+        total_files: number of payload files, used for the Payload-Oxum
+
+    """
+    with bagit.open_text_file(
+            os.path.join(bag_dir, "bagit.txt"), "w") as bagit_file:
+        bagit_file.write(
+            "BagIt-Version: 0.97\nTag-File-Character-Encoding: UTF-8\n"
+        )
+
+    bag_info = dict(bag_info or {})
+    if "Bagging-Date" not in bag_info:
+        bag_info["Bagging-Date"] = date.strftime(date.today(), "%Y-%m-%d")
+    if "Bag-Software-Agent" not in bag_info:
+        bag_info["Bag-Software-Agent"] = \
+            f"bagit.py v{bagit.VERSION} <{bagit.PROJECT_URL}>"
+
+    bag_info["Payload-Oxum"] = f"{total_bytes}.{total_files}"
+    bagit._make_tag_file(os.path.join(bag_dir, "bag-info.txt"), bag_info)
+
+
+def _hash_files(
+        tasks: typing.List[typing.Tuple[str, str, typing.List[str]]],
+        processes: int = 1,
+        executor: typing.Optional[concurrent.futures.Executor] = None,
+        recorder: "typing.Optional[BagMetrics]" = None,
+        tracker: "typing.Optional[BagProgress]" = None
+) -> typing.List[hashing.HashResult]:
+    if executor is not None:
+        return list(hashing.map_reporting(
+            executor, hashing.hash_payload_file, tasks, recorder, tracker
+        ))
+    if processes > 1:
+        # files hashed in separate processes can't report to the bag
+        with multiprocessing.Pool(processes=processes) as pool:
+            return pool.map(hashing.hash_payload_file, tasks)
+    hash_file = hashing.reporting_to(
+        hashing.hash_payload_file, recorder, tracker
+    )
+    return [hash_file(task) for task in tasks]
+
+
+def verify_trusted_digests(
+        prepared: PreparedTree,
+        trusted: typing.Dict[str, typing.Dict[str, str]],
+        sample: SamplePolicy,
+        processes: int = 1,
+        executor: typing.Optional[concurrent.futures.Executor] = None,
+        recorder: "typing.Optional[BagMetrics]" = None,
+        tracker: "typing.Optional[BagProgress]" = None
+) -> SampleSummary:
+    """Spot check digests taken from outside a directory before bagging it.
+
+    A random selection of the files with trusted digests is hashed where
+    the files are, before anything is moved, so a directory whose digests
+    can't be trusted is left as it was.
+
+    Args:
+        prepared: result of :py:func:`prepare_tree` for the directory
+        trusted: digests by algorithm, keyed by the path each file will have
+            once bagged
+        sample: how to pick the files to hash
+        processes: number of processes used to calculate checksums
+        executor: shared executor used to hash the files. If given,
+            processes is ignored
+        recorder: measurements of the directory, if it is measured
+        tracker: progress of the directory, if progress is shown
+
+    Returns:
+        How much of the files with trusted digests was checked
+
+    Raises:
+        bagit.BagError: if any file doesn't match its trusted digests
+
+    """
+    sizes = {
+        rel_path: size for rel_path, size in prepared.files
+        if trusted.get(rel_path)
+    }
+    chosen, summary = choose_sample(
+        sample, sizes, os.path.basename(prepared.path)
+    )
+    LOGGER.info(
+        "%s: checking the trusted checksums of %d of %d files",
+        prepared.path, len(chosen), len(sizes)
+    )
+    payload_prefix = "data/"
+    tasks = [
+        (prepared.path, rel_path[len(payload_prefix):],
+         sorted(trusted[rel_path]))
+        for rel_path in chosen
+    ]
+    mismatches = []
+    for rel_path, (_, _, digests) in zip(
+            chosen,
+            _hash_files(tasks, processes, executor, recorder, tracker)
+    ):
+        for algorithm, digest in digests.items():
+            if digest != trusted[rel_path][algorithm].lower():
+                LOGGER.error(
+                    "%s: %s %s checksum %s doesn't match the trusted %s",
+                    prepared.path, rel_path, algorithm, digest,
+                    trusted[rel_path][algorithm]
+                )
+                mismatches.append(rel_path)
+                break
+    if mismatches:
+        raise bagit.BagError(
+            f"{len(mismatches)} of {len(chosen)} files checked don't match"
+            f" their trusted checksums"
+        )
+    return summary
+
+
+def _complete_trusted(
+        bag_dir: str,
+        prepared: PreparedTree,
+        trusted: typing.Dict[str, typing.Dict[str, str]],
+        checksums: typing.List[str],
+        processes: int = 1,
+        executor: typing.Optional[concurrent.futures.Executor] = None,
+        recorder: "typing.Optional[BagMetrics]" = None,
+        tracker: "typing.Optional[BagProgress]" = None
+) -> typing.List[hashing.HashResult]:
+    # only the algorithms without a trusted digest are calculated, and
+    # trusted digests for algorithms not in the manifests are left out
+    tasks = []
+    for rel_path, _ in prepared.files:
+        digests = trusted.get(rel_path, {})
+        missing = [alg for alg in checksums if alg not in digests]
+        if missing:
+            tasks.append((bag_dir, rel_path, missing))
+    LOGGER.info(
+        "%s: using trusted checksums for %d of %d files",
+        bag_dir, len(prepared.files) - len(tasks), len(prepared.files)
+    )
+    hashed = {
+        result[0]: result
+        for result in _hash_files(
+            tasks, processes, executor, recorder, tracker
+        )
+    }
+    results = []
+    for rel_path, size in prepared.files:
+        digests = {
+            alg: digest.lower()
+            for alg, digest in trusted.get(rel_path, {}).items()
+            if alg in checksums
+        }
+        if rel_path in hashed:
+            _, size, calculated = hashed[rel_path]
+            digests.update(calculated)
+        results.append((rel_path, size, digests))
+    return results
+
+
+def make_bag(
+        bag_dir: str,
+        bag_info: typing.Optional[typing.Dict[str, typing.Any]] = None,
+        processes: int = 1,
+        checksums: typing.Optional[typing.List[str]] = None,
+        executor: typing.Optional[concurrent.futures.Executor] = None,
+        prepared: typing.Optional[PreparedTree] = None,
+        trusted: typing.Optional[
+            typing.Dict[str, typing.Dict[str, str]]
+        ] = None,
+        recorder: "typing.Optional[BagMetrics]" = None,
+        tracker: "typing.Optional[BagProgress]" = None
+) -> bagit.Bag:
+    """Convert a directory into a bag in place.
+
+    This produces the same bag as :py:func:`bagit.make_bag` but it works with
+    absolute paths instead of changing the working directory of the process,
+    so it is safe to create several bags from different threads at once.
+    The directory is scanned only once, by :py:func:`prepare_tree`, and its
+    files are hashed straight from that scan.
+
+    bagit.make_bag can't be reused for this, as it has no hook for any of
+    its steps: it changes directory around the whole bag, walks the
+    directory again to move it, then to hash it, and hashes through a
+    multiprocessing pool of its own, so neither a shared executor nor
+    trusted digests can be given. The bags written are the same as bagit's,
+    which the tests check, except that the lines of the tagmanifests are
+    sorted.
+
+    If bagging fails once the payload has started moving, the directory is
+    put back as it was with :py:func:`restore_unfinished_bag` before the
+    error is raised, so it can be bagged again.
+
+    Args:
+        bag_dir: path to the directory to convert
+        bag_info: metadata to include in bag-info.txt
+        processes: number of processes used to calculate checksums
+        checksums: manifest algorithms to use. Defaults to the bagit defaults
+        executor: shared executor used to hash the payload files. If given,
+            processes is ignored
+        prepared: result of :py:func:`prepare_tree` for the directory, if it
+            was already scanned
+        trusted: digests already known, by algorithm, keyed by the path each
+            file will have once bagged. Those for algorithms in checksums are
+            written to the manifests as they are, and files are only hashed
+            for the algorithms they have no trusted digest for.
+        recorder: measurements of the bag, if it is measured
+        tracker: progress of the bag, if progress is shown
+
+    Returns:
+        The newly created bag
+
+    """
+    checksums = list(bagit.get_hashers(checksums or bagit.DEFAULT_CHECKSUMS))
+    bag_dir = os.path.abspath(bag_dir)
+
+    LOGGER.info("Creating bag for directory %s", bag_dir)
+    if not os.path.isdir(bag_dir):
+        raise RuntimeError(f"Bag directory {bag_dir} does not exist")
+
+    if prepared is None:
+        prepared = prepare_tree(bag_dir)
+    if prepared.already_a_bag:
+        raise bagit.BagError(f"{bag_dir} is already a bag")
+
+    if prepared.unbaggable:
+        LOGGER.error(
+            "Unable to write to the following directories and files:\n%s",
+            prepared.unbaggable
+        )
+        raise bagit.BagError(
+            "Missing permissions to move all files and directories"
+        )
+
+    if prepared.unreadable_dirs or prepared.unreadable_files:
+        raise bagit.BagError(
+            "Read permissions are required to calculate file fixities"
+        )
+
+    _mark_unfinished(bag_dir)
+    try:
+        _move_into_data_dir(bag_dir, prepared.entries)
+
+        if trusted is None:
+            tasks = [
+                (bag_dir, rel_path, checksums)
+                for rel_path, _ in prepared.files
+            ]
+            results = _hash_files(
+                tasks, processes, executor, recorder, tracker
+            )
+        else:
+            results = _complete_trusted(
+                bag_dir, prepared, trusted, checksums, processes, executor,
+                recorder, tracker
+            )
+
+        total_bytes, total_files = _write_manifests(
+            bag_dir, results, checksums
+        )
+        write_bag_metadata(bag_dir, bag_info, total_bytes, total_files)
+        write_tagmanifests(bag_dir, checksums)
+    except Exception:
+        # put the directory back as it was, so it can simply be bagged
+        # again. If that fails too, the marker stays for --resume.
+        try:
+            restore_unfinished_bag(bag_dir)
+        except (OSError, bagit.BagError):
+            LOGGER.exception(
+                "Unable to restore %s after bagging it failed", bag_dir
+            )
+        raise
+    os.remove(os.path.join(bag_dir, UNFINISHED_MARKER))
+    return bagit.Bag(bag_dir)
+
+
+class UpdateResult(typing.NamedTuple):
+    """What :py:func:`update_bag` changed in a bag."""
+
+    #: payload files which weren't in the manifests, relative to the bag
+    #: root
+    added: typing.List[str]
+
+    #: payload files modified since the manifests were written
+    changed: typing.List[str]
+
+    #: files in the manifests which are no longer in the payload
+    removed: typing.List[str]
+
+    #: number of payload files whose digests were kept
+    unchanged: int
+
+    @property
+    def modified(self) -> bool:
+        """The manifests had to be written again."""
+        return bool(self.added or self.changed or self.removed)
+
+
+def _replace_tag_files(bag_dir: str) -> None:
+    for name in sorted(os.listdir(bag_dir)):
+        if name.endswith(TEMP_FILE_SUFFIX):
+            os.replace(
+                os.path.join(bag_dir, name),
+                os.path.join(bag_dir, name[:-len(TEMP_FILE_SUFFIX)])
+            )
+
+
+def _recover_update(bag_dir: str) -> None:
+    marker_path = os.path.join(bag_dir, UPDATE_MARKER)
+    if os.path.exists(marker_path):
+        # every new tag file was complete, so the update is finished
+        LOGGER.info("Finishing the interrupted update of %s", bag_dir)
+        _replace_tag_files(bag_dir)
+        os.remove(marker_path)
+        return
+    for name in os.listdir(bag_dir):
+        if name.endswith(TEMP_FILE_SUFFIX):
+            LOGGER.info("Removing %s left by an interrupted update", name)
+            os.remove(os.path.join(bag_dir, name))
+
+
+def _payload_adds_up(
+        bag_dir: str,
+        sizes: typing.Dict[str, int],
+        kept: typing.Iterable[str],
+        partial: bool
+) -> bool:
+    # the manifests don't record file sizes, so the sizes of the files
+    # taken as unchanged are checked against the Payload-Oxum as a whole.
+    # When other files changed or are gone, their old sizes are unknown and
+    # only an upper bound can be checked.
+    oxum = payload_oxum(bag_dir)
+    if oxum is None:
+        return False
+    kept = list(kept)
+    kept_bytes = sum(sizes[rel_path] for rel_path in kept)
+    if partial:
+        return kept_bytes <= oxum[0] and len(kept) <= oxum[1]
+    return kept_bytes == oxum[0] and len(kept) == oxum[1]
+
+
+def update_bag(
+        bag_dir: str,
+        processes: int = 1,
+        executor: typing.Optional[concurrent.futures.Executor] = None,
+        recorder: "typing.Optional[BagMetrics]" = None,
+        tracker: "typing.Optional[BagProgress]" = None
+) -> UpdateResult:
+    """Bring the manifests of a bag up to date with its payload.
+
+    Only the payload files which are new, or which were modified after the
+    manifests were last written, are hashed, with every algorithm of the
+    payload manifests. The digests of the other files are taken from the
+    manifests, and files which are gone are dropped from them. If the sizes
+    of the files taken as unchanged don't agree with the Payload-Oxum, a
+    file changed size without its modification time changing, and every
+    file is hashed again, as it is when the bag has no Payload-Oxum. The
+    manifests, the Payload-Oxum in bag-info.txt and the tagmanifests are
+    then written again.
+
+    New versions of all these files are written next to the old ones
+    first. Once all of them are complete, UPDATE_MARKER is written and they
+    replace the old ones, one at a time. An update interrupted before the
+    marker is written is dropped, and one interrupted after it is finished,
+    the next time the bag is updated.
+
+    Args:
+        bag_dir: path to bag root folder
+        processes: number of processes used to calculate checksums
+        executor: shared executor used to hash the payload files. If given,
+            processes is ignored
+        recorder: measurements of the bag, if it is measured
+        tracker: progress of the bag, if progress is shown
+
+    Returns:
+        What changed in the bag
+
+    """
+    from grabbags import completeness
+    bag_dir = os.path.abspath(bag_dir)
+    _recover_update(bag_dir)
+    bag = Bag(bag_dir)
+    manifest_paths = list(bag.manifest_files())
+    # algorithms only found in tagmanifests don't apply to the payload
+    algorithms = [
+        os.path.basename(path)[len("manifest-"):-len(".txt")]
+        for path in manifest_paths
+    ]
+    written = min(
+        os.stat(manifest_path).st_mtime_ns for manifest_path in manifest_paths
+    )
+    payload_prefix = "data" + os.sep
+    in_manifest = {
+        bagit.normalize_unicode(rel_path): rel_path
+        for rel_path in bag.entries if rel_path.startswith(payload_prefix)
+    }
+
+    added = []
+    changed = []
+    sizes = {}
+    digests = {}
+    tasks = []
+    for fs_path in completeness.payload_paths(bag_dir):
+        rel_path = fs_path.replace(os.sep, "/")
+        stat_result = os.stat(os.path.join(bag_dir, fs_path))
+        sizes[rel_path] = stat_result.st_size
+        manifest_path = in_manifest.pop(bagit.normalize_unicode(fs_path), None)
+        if manifest_path is None:
+            added.append(fs_path)
+        else:
+            hashes = bag.entries[manifest_path]
+            if stat_result.st_mtime_ns < written and \
+                    all(alg in hashes for alg in algorithms):
+                digests[rel_path] = hashes
+                continue
+            changed.append(fs_path)
+        tasks.append((bag_dir, rel_path, algorithms))
+    removed = sorted(in_manifest.values())
+
+    suspects = {}
+    if digests and not _payload_adds_up(
+            bag_dir, sizes, digests, bool(added or changed or removed)):
+        LOGGER.warning(
+            "%s: the payload doesn't add up to its Payload-Oxum, so every"
+            " file is hashed again", bag_dir
+        )
+        suspects, digests = digests, {}
+        tasks.extend(
+            (bag_dir, rel_path, algorithms) for rel_path in sorted(suspects)
+        )
+
+    if tasks:
+        LOGGER.info(
+            "%s: hashing %d new and %d changed files, dropping %d missing"
+            " files", bag_dir, len(added), len(changed) + len(suspects),
+            len(removed)
+        )
+    for rel_path, _, calculated in _hash_files(
+            tasks, processes, executor, recorder, tracker):
+        recorded = suspects.get(rel_path)
+        if recorded is not None and any(
+                calculated[alg] != recorded[alg].lower()
+                for alg in algorithms):
+            changed.append(rel_path.replace("/", os.sep))
+        digests[rel_path] = calculated
+
+    result = UpdateResult(
+        added=added,
+        changed=changed,
+        removed=removed,
+        unchanged=len(digests) - len(added) - len(changed)
+    )
+    if not result.modified:
+        return result
+
+    results = [
+        (rel_path, sizes[rel_path], digests[rel_path])
+        for rel_path in sorted(digests)
+    ]
+    total_bytes, total_files = _write_manifests(
+        bag_dir, results, algorithms, bag.encoding, TEMP_FILE_SUFFIX
+    )
+    bag.info["Payload-Oxum"] = f"{total_bytes}.{total_files}"
+    bagit._make_tag_file(
+        os.path.join(bag_dir, "bag-info.txt" + TEMP_FILE_SUFFIX), bag.info
+    )
+    tag_algorithms = [
+        os.path.basename(path)[len("tagmanifest-"):-len(".txt")]
+        for path in bag.tagmanifest_files()
+    ]
+    write_tagmanifests(
+        bag_dir, tag_algorithms, bag.encoding, TEMP_FILE_SUFFIX
+    )
+
+    marker_path = os.path.join(bag_dir, UPDATE_MARKER)
+    with open(marker_path, "w", encoding="utf-8") as marker:
+        marker.write("Update by grabbags in progress\n")
+    _replace_tag_files(bag_dir)
+    os.remove(marker_path)
+    return result
+
+
+class CleanResult(typing.NamedTuple):
+    """Payload files of a bag which are not in its manifests."""
+
+    #: system files which were removed, or would have been on a dry run
+    removed: typing.List[str]
+
+    #: other files which were left in place
+    unexpected: typing.List[str]
+
+    #: total size of the removed files in bytes
+    bytes_removed: int
+
+
+def clean_payload(bag: bagit.Bag, dry_run: bool = False) -> CleanResult:
+    """Remove system files that are not in the manifests of a bag.
+
+    The payload is walked once. Each file is looked up in an index of the
+    manifest paths, compared after Unicode normalization like bagit does,
+    and system files are removed as soon as they are found. Bags opened with
+    a :py:class:`grabbags.manifests.ManifestIndex` are looked up in it
+    directly.
+
+    Bags opened without loading their manifests are compared with
+    :py:func:`grabbags.completeness.differences` instead, in bounded
+    memory, and their files are reported in sorted order.
+
+    Args:
+        bag: bag to clean
+        dry_run: report what would be removed without removing anything
+
+    Returns:
+        The system files removed and other files not found in the manifests
+
+    """
+    if not getattr(bag, "load_manifests", True):
+        return _clean_sorted(bag, dry_run)
+
+    from grabbags import manifests
+    if isinstance(bag.entries, manifests.ManifestIndex):
+        # the index already compares paths after normalization
+        in_manifest = bag.entries
+    else:
+        data_prefix = "data" + os.sep
+        in_manifest = {
+            bagit.normalize_unicode(path)
+            for path in bag.entries
+            if path.startswith(data_prefix)
+        }
+    removed = []
+    unexpected = []
+    bytes_removed = 0
+    pending = ["data"]
+    while pending:
+        rel_dir = pending.pop()
+        with os.scandir(os.path.join(bag.path, rel_dir)) as entries:
+            for entry in entries:
+                rel_path = os.path.join(rel_dir, entry.name)
+                # classify like os.walk does, which bagit uses
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        pending.append(rel_path)
+                    continue
+                if bagit.normalize_unicode(rel_path) in in_manifest:
+                    continue
+                if not utils.is_system_file_name(entry.name):
+                    unexpected.append(rel_path)
+                    continue
+                bytes_removed += entry.stat(follow_symlinks=False).st_size
+                if not dry_run:
+                    os.remove(entry.path)
+                removed.append(rel_path)
+
+    return CleanResult(
+        removed=removed, unexpected=unexpected, bytes_removed=bytes_removed
+    )
+
+
+def _clean_sorted(bag: bagit.Bag, dry_run: bool) -> CleanResult:
+    from grabbags import completeness
+    removed = []
+    unexpected = []
+    bytes_removed = 0
+    for kind, rel_path in completeness.differences(bag):
+        if kind != completeness.UNEXPECTED:
+            continue
+        if not utils.is_system_file_name(os.path.basename(rel_path)):
+            unexpected.append(rel_path)
+            continue
+        full_path = os.path.join(bag.path, rel_path)
+        bytes_removed += os.lstat(full_path).st_size
+        if not dry_run:
+            os.remove(full_path)
+        removed.append(rel_path)
+
+    return CleanResult(
+        removed=removed, unexpected=unexpected, bytes_removed=bytes_removed
+    )
+
+
+def _bag_metadata_complete(bag_dir: str) -> bool:
+    entries = os.listdir(bag_dir)
+    if "bagit.txt" not in entries or "bag-info.txt" not in entries:
+        return False
+    manifests = {
+        entry[len("manifest-"):] for entry in entries
+        if entry.startswith("manifest-")
+    }
+    tagmanifests = {
+        entry[len("tagmanifest-"):] for entry in entries
+        if entry.startswith("tagmanifest-")
+    }
+    return bool(manifests) and manifests == tagmanifests
+
+
+def restore_unfinished_bag(bag_dir: str) -> bool:
+    """Undo a bag creation which was interrupted part of the way through.
+
+    Only directories holding the marker that :py:func:`make_bag` writes
+    before it moves anything are touched. The payload is moved back to
+    where it was before :py:func:`make_bag` started and any bag metadata
+    that was already written is removed, so the directory can be bagged
+    again from scratch. A bag that only missed being recorded as finished
+    is left alone.
+
+    Args:
+        bag_dir: path to the directory that was being bagged
+
+    Returns:
+        True if the directory was restored, False if there was nothing to do
+
+    Raises:
+        bagit.BagError: a file to move back would replace one that is
+            already there. Nothing is overwritten and the marker is kept.
+
+    """
+    marker_path = os.path.join(bag_dir, UNFINISHED_MARKER)
+    if not os.path.isfile(marker_path):
+        return False
+
+    entries = os.listdir(bag_dir)
+    temp_dirs = [
+        entry for entry in entries if entry.startswith(TEMP_DATA_PREFIX)
+    ]
+    if not temp_dirs:
+        if "data" not in entries or _bag_metadata_complete(bag_dir):
+            # the bag was finished, only the marker was left behind
+            os.remove(marker_path)
+            return False
+
+        # the payload was already moved into "data", so every other file
+        # but the marker is bag metadata written by make_bag
+        for entry in entries:
+            if entry in ("bagit.txt", "bag-info.txt") or \
+                    entry.startswith(("manifest-", "tagmanifest-")):
+                os.remove(os.path.join(bag_dir, entry))
+        temp_data = tempfile.mkdtemp(prefix=TEMP_DATA_PREFIX, dir=bag_dir)
+        os.rmdir(temp_data)
+        os.rename(os.path.join(bag_dir, "data"), temp_data)
+        temp_dirs = [os.path.basename(temp_data)]
+
+    conflicts = []
+    for temp_dir in temp_dirs:
+        temp_path = os.path.join(bag_dir, temp_dir)
+        for entry in os.listdir(temp_path):
+            target = os.path.join(bag_dir, entry)
+            if os.path.lexists(target):
+                conflicts.append(target)
+                continue
+            os.rename(os.path.join(temp_path, entry), target)
+    if conflicts:
+        raise bagit.BagError(
+            f"Unable to restore unfinished bag {bag_dir}, these paths "
+            f"already exist: {', '.join(conflicts)}"
+        )
+
+    os.remove(marker_path)
+    for temp_dir in temp_dirs:
+        os.rmdir(os.path.join(bag_dir, temp_dir))
+    LOGGER.info("Restored unfinished bag %s", bag_dir)
+    return True
@@ -0,0 +1,137 @@
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checksums (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    ctime_ns INTEGER NOT NULL,
+    algorithm TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    verified REAL NOT NULL,
+    PRIMARY KEY (device, inode, algorithm)
+)
+"""
+
+
+class ChecksumCache:
+    """Remember the digests of files that have already been verified.
+
+    Entries are keyed by the device, inode, size, modification time and
+    change time of a file. If any of these change, the cached digest no
+    longer applies and the file has to be hashed again. Entries older than
+    max_age are also ignored, so that every file is fully rehashed at least
+    that often.
+
+    The cache can be shared by several threads.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            max_age: typing.Optional[float] = None
+    ) -> None:
+        """Open or create a checksum cache.
+
+        Args:
+            path: location of the SQLite database file
+            max_age: maximum age of a cached digest, in seconds. None means
+                cached digests never expire.
+
+        """
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute(_SCHEMA)
+            self._connection.commit()
+
+    def __enter__(self) -> "ChecksumCache":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    @staticmethod
+    def _key(stat_result: os.stat_result) -> typing.Tuple[int, int]:
+        return stat_result.st_dev, stat_result.st_ino
+
+    @staticmethod
+    def _signature(
+            stat_result: os.stat_result
+    ) -> typing.Tuple[int, int, int]:
+        return (
+            stat_result.st_size,
+            stat_result.st_mtime_ns,
+            stat_result.st_ctime_ns
+        )
+
+    def lookup(
+            self,
+            stat_result: os.stat_result,
+            algorithm: str
+    ) -> typing.Optional[str]:
+        """Get the cached digest of a file.
+
+        Args:
+            stat_result: result of os.stat() for the file
+            algorithm: name of the checksum algorithm
+
+        Returns:
+            The digest last verified for the file or None if the file changed
+            since then, the digest expired or the file was never verified.
+
+        """
+        oldest = 0.0 if self.max_age is None else time.time() - self.max_age
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT digest FROM checksums "
+                "WHERE device = ? AND inode = ? AND algorithm = ? "
+                "AND size = ? AND mtime_ns = ? AND ctime_ns = ? "
+                "AND verified >= ?",
+                self._key(stat_result) + (algorithm,) +
+                self._signature(stat_result) + (oldest,)
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def store(
+            self,
+            entries: typing.Iterable[
+                typing.Tuple[os.stat_result, typing.Dict[str, str]]
+            ]
+    ) -> None:
+        """Record digests which have just been verified.
+
+        Args:
+            entries: the os.stat() result of each file, taken before it was
+                hashed, with the digests found keyed by algorithm
+
+        """
+        now = time.time()
+        rows = [
+            self._key(stat_result) + self._signature(stat_result) +
+            (algorithm, digest, now)
+            for stat_result, digests in entries
+            for algorithm, digest in digests.items()
+        ]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO checksums "
+                "(device, inode, size, mtime_ns, ctime_ns, algorithm, digest, "
+                "verified) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._connection.commit()
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,288 @@
+import heapq
+import io
+import logging
+import os
+import tempfile
+import typing
+
+import bagit
+
+from grabbags import manifests
+
+LOGGER = logging.getLogger(__name__)
+
+# Records sorted in memory at a time. Beyond this, sorted runs are written
+# to temporary files and merged.
+MAX_SORT_RECORDS = 100_000
+
+# Characters read from a run at a time while merging
+_READ_SIZE = 64 * 1024
+
+# Separates the fields of records in runs. It can't be part of a path.
+_SEPARATOR = "\0"
+
+# What compare_sorted yields for each difference
+MISSING = "missing"
+UNEXPECTED = "unexpected"
+
+Record = typing.Tuple[str, ...]
+
+
+def _write_run(records: typing.List[Record]) -> typing.TextIO:
+    # TemporaryFile only takes errors from Python 3.8
+    run = io.TextIOWrapper(
+        tempfile.TemporaryFile("w+b"),
+        encoding="utf-8", errors="surrogateescape", newline=""
+    )
+    for record in records:
+        run.write(_SEPARATOR.join(record))
+        run.write(_SEPARATOR)
+    run.seek(0)
+    return run
+
+
+def _read_run(run: typing.TextIO, fields: int) -> typing.Iterator[Record]:
+    pending = ""
+    values: typing.List[str] = []
+    while True:
+        block = run.read(_READ_SIZE)
+        if not block:
+            return
+        parts = (pending + block).split(_SEPARATOR)
+        pending = parts.pop()
+        for value in parts:
+            values.append(value)
+            if len(values) == fields:
+                yield tuple(values)
+                values = []
+
+
+def external_sort(
+        records: typing.Iterable[Record],
+        max_in_memory: typing.Optional[int] = None
+) -> typing.Iterator[Record]:
+    """Sort records of strings without holding all of them in memory.
+
+    Records are sorted in memory in chunks of max_in_memory. If there is
+    more than one chunk, each is written to a temporary file, and the files
+    are merged as the result is read.
+
+    Args:
+        records: tuples of strings, all of the same length, none of which
+            contain NUL characters
+        max_in_memory: number of records sorted in memory at a time.
+            Defaults to MAX_SORT_RECORDS.
+
+    Yields:
+        The records in order
+
+    """
+    max_in_memory = max_in_memory or MAX_SORT_RECORDS
+    chunk: typing.List[Record] = []
+    runs: typing.List[typing.TextIO] = []
+    fields = 0
+    try:
+        for record in records:
+            chunk.append(record)
+            if len(chunk) >= max_in_memory:
+                fields = len(record)
+                chunk.sort()
+                runs.append(_write_run(chunk))
+                chunk = []
+        chunk.sort()
+        if not runs:
+            yield from chunk
+            return
+        if chunk:
+            runs.append(_write_run(chunk))
+            chunk = []
+        LOGGER.debug("Merging %d sorted runs", len(runs))
+        yield from heapq.merge(*(_read_run(run, fields) for run in runs))
+    finally:
+        for run in runs:
+            run.close()
+
+
+def payload_paths(bag_dir: str) -> typing.Iterator[str]:
+    """Locate the payload files of a bag, like bagit.Bag.payload_files does.
+
+    Args:
+        bag_dir: path to bag root folder
+
+    Yields:
+        The path of each file relative to the bag root
+
+    """
+    for dirpath, _, filenames in os.walk(os.path.join(bag_dir, "data")):
+        for file_name in filenames:
+            yield os.path.relpath(
+                os.path.join(dirpath, os.path.normpath(file_name)),
+                start=bag_dir
+            )
+
+
+def _manifest_records(
+        bag: bagit.Bag,
+        tag_paths: typing.Set[str]
+) -> typing.Iterator[Record]:
+    manifest_paths = list(bag.manifest_files())
+    if bag.version_info >= (0, 97):
+        manifest_paths += list(bag.tagmanifest_files())
+    payload_prefix = "data" + os.sep
+    for manifest_path in manifest_paths:
+        alg = os.path.basename(manifest_path).split("-", 1)[1][:-4]
+        for entry_hash, entry_path in manifests.read_manifest(
+                manifest_path, bag.encoding
+        ):
+            entry_path = bagit._decode_filename(
+                os.path.normpath(entry_path.lstrip("*"))
+            )
+            if bag._path_is_dangerous(entry_path):
+                raise bagit.BagError(
+                    f'Path "{entry_path}" in manifest "{manifest_path}"'
+                    f' is unsafe'
+                )
+            if not entry_path.startswith(payload_prefix):
+                tag_paths.add(entry_path)
+                continue
+            yield (
+                bagit.normalize_unicode(entry_path), entry_path, alg,
+                entry_hash
+            )
+
+
+def _check_duplicates(
+        bag: bagit.Bag,
+        records: typing.Iterator[Record]
+) -> typing.Iterator[Record]:
+    # entries listed twice in a manifest are next to each other once sorted
+    previous: typing.Optional[Record] = None
+    for record in records:
+        if previous is not None and previous[1:3] == record[1:3]:
+            _, entry_path, alg, entry_hash = record
+            if previous[3].lower() != entry_hash.lower():
+                raise bagit.BagError(
+                    f"{bag}: {alg} manifest lists {entry_path} multiple"
+                    f" times with conflicting values"
+                )
+            message = f"{bag}: {alg} manifest lists {entry_path}" \
+                f" multiple times with the same value"
+            if bag.version_info >= (1,):
+                raise bagit.BagError(message)
+            LOGGER.warning(message)
+        previous = record
+        yield record[:2]
+
+
+def _unique(records: typing.Iterator[Record]) -> typing.Iterator[Record]:
+    previous = None
+    for record in records:
+        if record[0] != previous:
+            previous = record[0]
+            yield record
+
+
+def compare_sorted(
+        in_manifest: typing.Iterable[Record],
+        on_fs: typing.Iterable[Record]
+) -> typing.Iterator[typing.Tuple[str, str]]:
+    """Find the differences between two sorted lists of paths.
+
+    Args:
+        in_manifest: normalized and original paths in the manifests, sorted
+        on_fs: normalized and original paths on the file system, sorted
+
+    Yields:
+        MISSING and the path of each file only in the manifests, and
+        UNEXPECTED and the path of each file only on the file system
+
+    """
+    in_manifest = _unique(iter(in_manifest))
+    on_fs = _unique(iter(on_fs))
+    manifest_entry = next(in_manifest, None)
+    fs_entry = next(on_fs, None)
+    while manifest_entry is not None or fs_entry is not None:
+        if fs_entry is None or (
+                manifest_entry is not None and manifest_entry[0] < fs_entry[0]
+        ):
+            yield MISSING, manifest_entry[1]
+            manifest_entry = next(in_manifest, None)
+        elif manifest_entry is None or fs_entry[0] < manifest_entry[0]:
+            yield UNEXPECTED, fs_entry[1]
+            fs_entry = next(on_fs, None)
+        else:
+            manifest_entry = next(in_manifest, None)
+            fs_entry = next(on_fs, None)
+
+
+def differences(
+        bag: bagit.Bag,
+        max_in_memory: typing.Optional[int] = None
+) -> typing.Iterator[typing.Tuple[str, str]]:
+    """Compare the manifests of a bag with its payload, in bounded memory.
+
+    The manifests are read line by line and the payload is walked, without
+    loading either into memory. Both lists of paths are sorted, after
+    Unicode normalization, with :py:func:`external_sort`, then merged. At
+    most max_in_memory paths of each list are held in memory at a time,
+    which is about 50 MB for both lists with the default of
+    MAX_SORT_RECORDS, however large the bag.
+
+    Like bagit, manifest paths that point outside the bag and entries that
+    are listed twice in a manifest raise a BagError, and from BagIt 0.97,
+    files listed in tag manifests which don't exist count as missing.
+
+    Args:
+        bag: bag to compare, which doesn't need its manifests loaded
+        max_in_memory: number of paths sorted in memory at a time
+
+    Yields:
+        MISSING and the path of each file only in the manifests, and
+        UNEXPECTED and the path of each file only on the file system, in
+        the order of their normalized paths
+
+    """
+    tag_paths: typing.Set[str] = set()
+    in_manifest = _check_duplicates(
+        bag,
+        external_sort(_manifest_records(bag, tag_paths), max_in_memory)
+    )
+    on_fs = external_sort(
+        (
+            (bagit.normalize_unicode(path), path)
+            for path in payload_paths(bag.path)
+        ),
+        max_in_memory
+    )
+    yield from compare_sorted(in_manifest, on_fs)
+    if bag.version_info >= (0, 97):
+        for tag_path in sorted(tag_paths):
+            if not os.path.isfile(os.path.join(bag.path, tag_path)):
+                yield MISSING, tag_path
+
+
+def compare_manifests_with_fs(
+        bag: bagit.Bag,
+        max_in_memory: typing.Optional[int] = None
+) -> typing.Tuple[typing.List[str], typing.List[str]]:
+    """Compare the manifests of a bag with its payload, in bounded memory.
+
+    This gives the same result as bagit.Bag.compare_manifests_with_fs, with
+    each list sorted, using :py:func:`differences`.
+
+    Args:
+        bag: bag to compare, which doesn't need its manifests loaded
+        max_in_memory: number of paths sorted in memory at a time
+
+    Returns:
+        The files only in the manifests and the files only on the file system
+
+    """
+    only_in_manifest = []
+    only_on_fs = []
+    for kind, path in differences(bag, max_in_memory):
+        if kind == MISSING:
+            only_in_manifest.append(path)
+        else:
+            only_on_fs.append(path)
+    return only_in_manifest, only_on_fs
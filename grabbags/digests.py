@@ -0,0 +1,534 @@
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import typing
+
+import bagit
+
+from grabbags import bags
+from grabbags import manifests
+
+LOGGER = logging.getLogger(__name__)
+
+# Entries written to the database at a time while a bag is indexed
+BATCH_SIZE = 10_000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS settings (
+    name TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS bags (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    manifest_signature TEXT,
+    files INTEGER NOT NULL DEFAULT 0,
+    bytes INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS entries (
+    bag INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    PRIMARY KEY (bag, path)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_by_digest ON entries (digest);
+CREATE TABLE IF NOT EXISTS duplicates (
+    digest BLOB PRIMARY KEY,
+    copies INTEGER NOT NULL,
+    size INTEGER
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS overlaps (
+    bag INTEGER NOT NULL,
+    other INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    PRIMARY KEY (bag, other)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS changed_bags (
+    bag INTEGER PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS changed_digests (
+    digest BLOB PRIMARY KEY
+) WITHOUT ROWID;
+"""
+
+
+class Entry(typing.NamedTuple):
+    """A payload file listed in the manifest of an indexed bag."""
+
+    #: absolute path of the bag
+    bag: str
+
+    #: path of the file relative to the bag root, as in the manifest
+    path: str
+
+    #: size of the file in bytes, or None if it couldn't be found
+    size: typing.Optional[int]
+
+
+class Duplicate(typing.NamedTuple):
+    """Content found in more than one payload file."""
+
+    #: digest of the content in hex
+    digest: str
+
+    #: number of files with the content
+    copies: int
+
+    #: size of the content in bytes, or None if no copy could be found
+    size: typing.Optional[int]
+
+
+class Overlap(typing.NamedTuple):
+    """Content that a bag shares with another bag."""
+
+    #: absolute path of the bag
+    bag: str
+
+    #: absolute path of the other bag
+    other: str
+
+    #: number of files of the bag with the same content as a file of the
+    #: other bag
+    files: int
+
+    #: total size of those files in bytes
+    bytes: int
+
+
+class IndexSummary(typing.NamedTuple):
+    """Totals for a digest index."""
+
+    bags: int
+    files: int
+    bytes: int
+
+    #: number of distinct contents found in more than one file
+    duplicated: int
+
+    #: number of files holding those contents
+    copies: int
+
+    #: bytes taken up by copies beyond the first of each content
+    extra_bytes: int
+
+
+class DigestIndex:
+    """Index of the payload files of many bags by content.
+
+    The index is built from the payload manifests of each bag, so no
+    payload file is read or even looked up: each entry holds the digest of
+    the file from the manifest, the bag and the path. The size of a bag
+    comes from its Payload-Oxum. Digests are stored as binary in a SQLite
+    database, with an index on the digest, so looking up a digest stays fast
+    with hundreds of millions of entries.
+
+    Files with the same content in several places, and the content each bag
+    shares with the others, are found by :py:meth:`summarize` and stored in
+    their own tables so that queries don't have to go through every entry.
+    Only the content of the bags added, changed or removed since the last
+    summary is looked at again, and only one copy of each duplicated content
+    is looked up for its size. Empty files are left out of these.
+
+    A bag whose manifest hasn't changed since it was indexed is not read
+    again. Every bag in an index is indexed with the same algorithm.
+
+    The index can be shared by several threads.
+    """
+
+    def __init__(
+            self,
+            path: str,
+            algorithm: typing.Optional[str] = None
+    ) -> None:
+        """Open or create a digest index.
+
+        Args:
+            path: location of the SQLite database file
+            algorithm: manifest algorithm to index. Defaults to the
+                algorithm of an existing index, or sha256 for a new one.
+
+        Raises:
+            ValueError: if the index was built with a different algorithm
+
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.executescript(_SCHEMA)
+            row = self._connection.execute(
+                "SELECT value FROM settings WHERE name = 'algorithm'"
+            ).fetchone()
+            if row is None:
+                self.algorithm = algorithm or "sha256"
+                self._connection.execute(
+                    "INSERT INTO settings VALUES ('algorithm', ?)",
+                    (self.algorithm,)
+                )
+            else:
+                self.algorithm = row[0]
+            self._connection.commit()
+        if algorithm is not None and algorithm != self.algorithm:
+            self.close()
+            raise ValueError(
+                f"{path} is an index of {self.algorithm} digests, not"
+                f" {algorithm}"
+            )
+
+    def __enter__(self) -> "DigestIndex":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def manifest_path(self, bag_dir: str) -> str:
+        """Locate the payload manifest of a bag for the algorithm indexed.
+
+        Args:
+            bag_dir: path to bag root folder
+
+        Returns:
+            Path to the manifest, which may not exist
+
+        """
+        return os.path.join(bag_dir, f"manifest-{self.algorithm}.txt")
+
+    @staticmethod
+    def _signature(manifest_path: str) -> str:
+        stat_result = os.stat(manifest_path)
+        return f"{stat_result.st_size}:{stat_result.st_mtime_ns}"
+
+    def _entries(
+            self,
+            bag: bagit.Bag,
+            manifest_path: str
+    ) -> typing.Iterator[typing.Tuple[str, bytes]]:
+        for entry_hash, entry_path in manifests.read_manifest(
+                manifest_path, bag.encoding
+        ):
+            entry_path = bagit._decode_filename(
+                os.path.normpath(entry_path.lstrip("*"))
+            )
+            if bag._path_is_dangerous(entry_path):
+                raise bagit.BagError(
+                    f'Path "{entry_path}" in manifest "{manifest_path}"'
+                    f' is unsafe'
+                )
+            try:
+                digest = bytes.fromhex(entry_hash)
+            except ValueError:
+                LOGGER.warning(
+                    "%s: Invalid %s digest for %s: %s",
+                    manifest_path, self.algorithm, entry_path, entry_hash
+                )
+                continue
+            yield entry_path, digest
+
+    def _clear_bag(self, bag_id: int) -> None:
+        # the content the bag had and its overlaps are summarized again
+        self._connection.execute(
+            "INSERT OR IGNORE INTO changed_bags VALUES (?)", (bag_id,)
+        )
+        self._connection.execute(
+            "INSERT OR IGNORE INTO changed_digests"
+            " SELECT digest FROM entries WHERE bag = ?",
+            (bag_id,)
+        )
+        self._connection.execute(
+            "DELETE FROM entries WHERE bag = ?", (bag_id,)
+        )
+
+    def add_bag(self, bag: bagit.Bag) -> typing.Optional[int]:
+        """Add the entries of the manifest of a bag to the index.
+
+        Entries from an earlier run are replaced. Only the manifest and the
+        Payload-Oxum are read.
+
+        Args:
+            bag: bag to index, which doesn't need its manifests loaded
+
+        Returns:
+            Number of files indexed, or None if the manifest hasn't changed
+            since the bag was last indexed
+
+        Raises:
+            FileNotFoundError: if the bag has no manifest for the algorithm
+                indexed
+
+        """
+        bag_path = os.path.abspath(bag.path)
+        manifest_path = self.manifest_path(bag.path)
+        signature = self._signature(manifest_path)
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT id, manifest_signature FROM bags WHERE path = ?",
+                (bag_path,)
+            ).fetchone()
+            if row is not None and row[1] == signature:
+                return None
+            if row is None:
+                bag_id = self._connection.execute(
+                    "INSERT INTO bags (path) VALUES (?)", (bag_path,)
+                ).lastrowid
+            else:
+                bag_id = row[0]
+                # the signature is only written back once every entry is
+                # in, so an interrupted bag is indexed again
+                self._connection.execute(
+                    "UPDATE bags SET manifest_signature = NULL, files = 0,"
+                    " bytes = 0 WHERE id = ?",
+                    (bag_id,)
+                )
+                self._clear_bag(bag_id)
+            self._connection.execute(
+                "INSERT OR IGNORE INTO changed_bags VALUES (?)", (bag_id,)
+            )
+            self._connection.commit()
+
+        files = 0
+        batch = []
+        for entry_path, digest in self._entries(bag, manifest_path):
+            batch.append((bag_id, entry_path, digest))
+            files += 1
+            if len(batch) >= BATCH_SIZE:
+                self._insert(batch)
+                batch = []
+        self._insert(batch)
+        oxum = bags.payload_oxum(bag.path)
+        total_bytes = oxum[0] if oxum is not None else 0
+        with self._lock:
+            self._connection.execute(
+                "UPDATE bags SET manifest_signature = ?, files = ?, bytes = ?"
+                " WHERE id = ?",
+                (signature, files, total_bytes, bag_id)
+            )
+            self._connection.commit()
+        return files
+
+    def _insert(self, batch: typing.List[tuple]) -> None:
+        with self._lock:
+            # a path listed twice in a manifest is indexed once
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO entries (bag, path, digest)"
+                " VALUES (?, ?, ?)",
+                batch
+            )
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO changed_digests VALUES (?)",
+                ((digest,) for _, _, digest in batch)
+            )
+            self._connection.commit()
+
+    def remove_missing(self) -> typing.List[str]:
+        """Remove the bags that are gone from the index.
+
+        A bag is gone when its manifest for the algorithm indexed can't be
+        found, as when the bag was moved or deleted.
+
+        Returns:
+            Paths of the bags removed
+
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT id, path FROM bags"
+            ).fetchall()
+        missing = [
+            (bag_id, bag_path) for bag_id, bag_path in rows
+            if not os.path.isfile(self.manifest_path(bag_path))
+        ]
+        with self._lock, self._connection:
+            for bag_id, _ in missing:
+                self._clear_bag(bag_id)
+                self._connection.execute(
+                    "DELETE FROM bags WHERE id = ?", (bag_id,)
+                )
+        return [bag_path for _, bag_path in missing]
+
+    def _find_sizes(self) -> None:
+        rows = self._connection.execute(
+            "SELECT duplicates.digest, bags.path, entries.path"
+            " FROM duplicates"
+            " JOIN entries USING (digest)"
+            " JOIN bags ON bags.id = entries.bag"
+            " WHERE duplicates.size IS NULL"
+            " ORDER BY duplicates.digest"
+        ).fetchall()
+        sizes = {}
+        for digest, bag_path, entry_path in rows:
+            if digest in sizes:
+                continue
+            try:
+                sizes[digest] = \
+                    os.stat(os.path.join(bag_path, entry_path)).st_size
+            except OSError:
+                continue
+        self._connection.executemany(
+            "UPDATE duplicates SET size = ? WHERE digest = ?",
+            ((size, digest) for digest, size in sizes.items())
+        )
+
+    def summarize(self) -> None:
+        """Find the duplicated content and the overlaps between bags.
+
+        Only the content of the bags added, changed or removed since the
+        last summary is counted again, and only the overlaps of those bags
+        with the others, so this is run after the bags are added rather
+        than on every query.
+        """
+        empty = hashlib.new(self.algorithm, b"").digest()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "DELETE FROM duplicates"
+                " WHERE digest IN (SELECT digest FROM changed_digests)"
+            )
+            # sizes found for the content before are kept
+            self._connection.execute(
+                "INSERT INTO duplicates (digest, copies)"
+                " SELECT digest, COUNT(*) FROM entries"
+                " WHERE digest IN (SELECT digest FROM changed_digests)"
+                "  AND digest != ?"
+                " GROUP BY digest HAVING COUNT(*) > 1",
+                (empty,)
+            )
+            self._find_sizes()
+            self._connection.execute(
+                "DELETE FROM overlaps"
+                " WHERE bag IN (SELECT bag FROM changed_bags)"
+                "  OR other IN (SELECT bag FROM changed_bags)"
+            )
+            # the files of each content are counted by bag first, so that
+            # the pairs of bags come from those counts rather than from
+            # every pair of files
+            self._connection.execute(
+                "WITH held AS ("
+                "  SELECT digest, bag, COUNT(*) AS files FROM entries"
+                "  WHERE digest IN ("
+                "   SELECT digest FROM entries"
+                "   WHERE bag IN (SELECT bag FROM changed_bags)"
+                "  ) AND digest != ?"
+                "  GROUP BY digest, bag"
+                ")"
+                " INSERT INTO overlaps"
+                " SELECT held.bag, other.bag, SUM(held.files),"
+                "  TOTAL(held.files * duplicates.size)"
+                " FROM held"
+                " JOIN held AS other ON other.digest = held.digest"
+                "  AND other.bag != held.bag"
+                " JOIN duplicates ON duplicates.digest = held.digest"
+                " WHERE held.bag IN (SELECT bag FROM changed_bags)"
+                "  OR other.bag IN (SELECT bag FROM changed_bags)"
+                " GROUP BY held.bag, other.bag",
+                (empty,)
+            )
+            self._connection.execute("DELETE FROM changed_bags")
+            self._connection.execute("DELETE FROM changed_digests")
+
+    def lookup(self, digest: str) -> typing.List[Entry]:
+        """Find every file with some content.
+
+        Args:
+            digest: digest of the content in hex
+
+        Returns:
+            The files with the content, by bag and path
+
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT bags.path, entries.path"
+                " FROM entries JOIN bags ON bags.id = entries.bag"
+                " WHERE entries.digest = ?"
+                " ORDER BY bags.path, entries.path",
+                (bytes.fromhex(digest),)
+            ).fetchall()
+        found = []
+        for bag_path, entry_path in rows:
+            try:
+                size: typing.Optional[int] = \
+                    os.stat(os.path.join(bag_path, entry_path)).st_size
+            except OSError:
+                size = None
+            found.append(Entry(bag_path, entry_path, size))
+        return found
+
+    def duplicates(self) -> typing.Iterator[Duplicate]:
+        """List the content found in more than one file by the last summary.
+
+        Yields:
+            Each duplicated content, in the order of its digest
+
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT digest, copies, size FROM duplicates ORDER BY digest"
+            ).fetchall()
+        for digest, copies, size in rows:
+            yield Duplicate(digest.hex(), copies, size)
+
+    def overlaps(
+            self,
+            bag_dir: typing.Optional[str] = None,
+            limit: typing.Optional[int] = None
+    ) -> typing.List[Overlap]:
+        """List the content shared between bags, found by the last summary.
+
+        Args:
+            bag_dir: only list the content this bag shares with others.
+                None lists every pair of bags.
+            limit: maximum number of overlaps to list
+
+        Returns:
+            The overlaps, with the most bytes in common first
+
+        """
+        query = (
+            "SELECT bag.path, other.path, overlaps.files, overlaps.bytes"
+            " FROM overlaps"
+            " JOIN bags AS bag ON bag.id = overlaps.bag"
+            " JOIN bags AS other ON other.id = overlaps.other"
+        )
+        parameters: typing.List[typing.Any] = []
+        if bag_dir is not None:
+            query += " WHERE bag.path = ?"
+            parameters.append(os.path.abspath(bag_dir))
+        query += (
+            " ORDER BY overlaps.bytes DESC, overlaps.files DESC, bag.path,"
+            " other.path"
+        )
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        with self._lock:
+            rows = self._connection.execute(query, parameters).fetchall()
+        return [Overlap(bag, other, files, int(size))
+                for bag, other, files, size in rows]
+
+    def summary(self) -> IndexSummary:
+        """Count what is in the index.
+
+        Returns:
+            Totals as of the last :py:meth:`summarize`
+
+        """
+        with self._lock:
+            bags, files, total_bytes = self._connection.execute(
+                "SELECT COUNT(*), TOTAL(files), TOTAL(bytes) FROM bags"
+                " WHERE manifest_signature IS NOT NULL"
+            ).fetchone()
+            duplicated, copies, extra_bytes = self._connection.execute(
+                "SELECT COUNT(*), TOTAL(copies),"
+                " TOTAL((copies - 1) * size) FROM duplicates"
+            ).fetchone()
+        return IndexSummary(
+            bags, int(files), int(total_bytes),
+            duplicated, int(copies), int(extra_bytes)
+        )
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,150 @@
+import concurrent.futures
+import logging
+import os
+import typing
+
+from grabbags import utils
+
+LOGGER = logging.getLogger(__name__)
+
+# Kinds of directories found
+BAG = "bag"
+NOT_A_BAG = "not_a_bag"
+EMPTY = "empty"
+
+
+class Discovered(typing.NamedTuple):
+    """A directory found by :py:func:`discover_bag_dirs`."""
+
+    #: path to the directory
+    path: str
+
+    #: what the directory looked like when it was found: BAG, NOT_A_BAG or
+    #: EMPTY
+    kind: str
+
+
+def classify(names: typing.Collection[str]) -> str:
+    """Work out what kind of directory this is from the names inside it.
+
+    This matches :py:func:`grabbags.bags.is_bag`, without having to stat
+    anything.
+
+    Args:
+        names: names of the entries in the directory
+
+    Returns:
+        BAG, NOT_A_BAG or EMPTY
+
+    """
+    if not names:
+        return EMPTY
+    if "bagit.txt" in names and "data" in names:
+        return BAG
+    return NOT_A_BAG
+
+
+def _scan(
+        path: str,
+        level: int,
+        symlink: bool,
+        depth: int,
+        split_directories: bool = False
+) -> typing.Tuple[
+    typing.List[Discovered],
+    typing.List[typing.Tuple[str, int, bool]]
+]:
+    try:
+        with os.scandir(path) as entries:
+            names = []
+            subdirs = []
+            has_files = False
+            for entry in entries:
+                names.append(entry.name)
+                if entry.is_dir():
+                    subdirs.append(
+                        (entry.path, level + 1, entry.is_symlink())
+                    )
+                elif not utils.is_system_file_name(entry.name):
+                    has_files = True
+    except OSError as error:
+        if level == 0:
+            raise
+        LOGGER.warning("Unable to read %s: %s", path, error)
+        return [Discovered(path, NOT_A_BAG)], []
+
+    if level == 0:
+        return [], subdirs
+
+    kind = classify(names)
+    # symlinked directories are never descended into, to avoid loops, and
+    # a directory holding files of its own is a bag to be, unless asked to
+    # split it into bags of its subdirectories
+    if level >= depth or kind != NOT_A_BAG or symlink or \
+            (has_files and not split_directories):
+        return [Discovered(path, kind)], []
+    return [], subdirs
+
+
+def discover_bag_dirs(
+        roots: typing.Iterable[str],
+        depth: int = 1,
+        threads: int = 1,
+        split_directories: bool = False
+) -> typing.Iterator[Discovered]:
+    """Find the directories to process below each root.
+
+    Every directory down to the given depth is listed once. A directory
+    that is empty, already a bag or holds files other than system files is
+    yielded as it is found, without looking any deeper. Directories holding
+    only other directories are looked into until the depth is reached, where
+    they are yielded as well. Directories are listed by a pool of threads,
+    and each one is yielded as soon as it is found, so that the first bags
+    can be processed before the search is over.
+
+    Args:
+        roots: directories to search
+        depth: how many levels below a root to look for bags. 1 means only
+            the directories directly inside each root.
+        threads: number of threads listing directories
+        split_directories: also look into directories holding files, so
+            that their subdirectories are yielded instead of them
+
+    """
+    pending = [(os.fspath(root), 0, False) for root in roots]
+    if threads <= 1:
+        # depth first, in the order the directories are listed, like
+        # the single level search of the runner
+        pending.reverse()
+        while pending:
+            found, subdirs = _scan(
+                *pending.pop(), depth=depth,
+                split_directories=split_directories
+            )
+            yield from found
+            pending.extend(reversed(subdirs))
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads,
+            thread_name_prefix="grabbags-discover"
+    ) as executor:
+        running = {
+            executor.submit(
+                _scan, path, level, symlink, depth, split_directories
+            )
+            for path, level, symlink in pending
+        }
+        while running:
+            done, running = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                found, subdirs = future.result()
+                yield from found
+                running.update(
+                    executor.submit(
+                        _scan, path, level, symlink, depth, split_directories
+                    )
+                    for path, level, symlink in subdirs
+                )
@@ -0,0 +1,211 @@
+import os
+import sqlite3
+import threading
+import time
+import typing
+
+from grabbags import bags
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bags (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_validated REAL,
+    last_checked REAL NOT NULL,
+    last_outcome TEXT NOT NULL,
+    duration REAL NOT NULL
+)
+"""
+
+
+class BagRecord(typing.NamedTuple):
+    """What the schedule remembers about a bag."""
+
+    #: size of the payload in bytes
+    size: int
+
+    #: time of the last successful validation, or None if the bag never
+    #: validated
+    last_validated: typing.Optional[float]
+
+
+class FixitySchedule:
+    """Rolling schedule for validating a collection a little at a time.
+
+    The time each bag last validated and its size are kept in a SQLite
+    database, so that every run can pick up the bags that have gone the
+    longest without being validated. Bags that fail are not marked as
+    validated, so they stay at the front of the queue until they pass.
+
+    The schedule can be shared by several threads.
+    """
+
+    def __init__(self, path: str, cycle_days: float = 90) -> None:
+        """Open or create a fixity schedule.
+
+        Args:
+            path: location of the SQLite database file
+            cycle_days: every bag should be validated at least this often
+
+        """
+        self.path = path
+        self.cycle = cycle_days * SECONDS_PER_DAY
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._connection.execute(_SCHEMA)
+            self._connection.commit()
+
+    def __enter__(self) -> "FixitySchedule":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def records(self) -> typing.Dict[str, BagRecord]:
+        """Get what is known about every bag in the schedule.
+
+        Returns:
+            Records keyed by the absolute path of each bag
+
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT path, size, last_validated FROM bags"
+            ).fetchall()
+        return {
+            path: BagRecord(size, validated)
+            for path, size, validated in rows
+        }
+
+    def throughput(self) -> typing.Optional[float]:
+        """Average validation speed of earlier runs.
+
+        Returns:
+            Bytes validated per second or None if nothing was timed yet
+
+        """
+        with self._lock:
+            total_bytes, total_time = self._connection.execute(
+                "SELECT SUM(size), SUM(duration) FROM bags WHERE duration > 0"
+            ).fetchone()
+        if not total_time:
+            return None
+        return total_bytes / total_time
+
+    def plan(
+            self,
+            bag_dirs: typing.Iterable[typing.Any],
+            budget_bytes: typing.Optional[int] = None,
+            now: typing.Optional[float] = None,
+            sizes: typing.Optional[typing.Dict[str, int]] = None
+    ) -> typing.List[typing.Any]:
+        """Pick the bags to validate in this run, most overdue first.
+
+        Bags that were never validated come first, largest first. The rest
+        follow in the order they were last validated. Bags are added until
+        the next one would go over the byte budget, but the most overdue bag
+        is always included so that a bag larger than the budget still gets
+        its turn.
+
+        Directories that aren't bags are never validated, so they would stay
+        the most overdue forever. They are put after the bags instead,
+        without being measured or counted against the budget.
+
+        Args:
+            bag_dirs: bag directories found, each with a path attribute
+            budget_bytes: maximum number of payload bytes to validate. None
+                means no limit.
+            now: current time, for working out how overdue each bag is
+            sizes: filled with the size of each bag planned, keyed by the
+                path of its directory, so that it isn't measured again
+
+        Returns:
+            The bag directories to validate, in the order to validate them
+
+        """
+        now = time.time() if now is None else now
+        known = self.records()
+        candidates = []
+        not_bags = []
+        for bag_dir in bag_dirs:
+            record = known.get(os.path.abspath(bag_dir.path))
+            if record is None:
+                # only bags are recorded, so anything else is looked at
+                if not bags.is_bag(bag_dir.path):
+                    not_bags.append(bag_dir)
+                    continue
+                record = BagRecord(bags.estimate_size(bag_dir.path), None)
+            age = float("inf") if record.last_validated is None else \
+                now - record.last_validated
+            candidates.append((age, record.size, bag_dir))
+        candidates.sort(key=lambda candidate: candidate[:2], reverse=True)
+
+        planned = []
+        planned_bytes = 0
+        for age, size, bag_dir in candidates:
+            if budget_bytes is not None and planned and \
+                    planned_bytes + size > budget_bytes:
+                break
+            planned.append(bag_dir)
+            planned_bytes += size
+            if sizes is not None:
+                sizes[bag_dir.path] = size
+        return planned + not_bags
+
+    def overdue(self, now: typing.Optional[float] = None) -> int:
+        """Count the bags that have gone longer than a cycle unvalidated.
+
+        Args:
+            now: current time
+
+        Returns:
+            Number of bags in the schedule that are overdue
+
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM bags "
+                "WHERE last_validated IS NULL OR last_validated < ?",
+                (now - self.cycle,)
+            ).fetchone()
+        return count
+
+    def record(
+            self,
+            bag_dir: str,
+            size: int,
+            valid: bool,
+            duration: float
+    ) -> None:
+        """Record that a bag has just been validated.
+
+        Args:
+            bag_dir: path to the bag
+            size: size of its payload in bytes
+            valid: whether the bag validated
+            duration: time validation took, in seconds
+
+        """
+        now = time.time()
+        path = os.path.abspath(bag_dir)
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO bags "
+                "(path, size, last_validated, last_checked, last_outcome, "
+                "duration) VALUES (?, ?, COALESCE(?, "
+                "(SELECT last_validated FROM bags WHERE path = ?)), ?, ?, ?)",
+                (
+                    path, size, now if valid else None, path, now,
+                    "valid" if valid else "invalid", duration
+                )
+            )
+            self._connection.commit()
+
+    def close(self) -> None:
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
@@ -1,20 +1,44 @@
 import abc
 import argparse
+import concurrent.futures
 import gettext
 import logging
+import multiprocessing
 import os
 import re
 import sys
+import threading
+import time
 import typing
 import warnings
 
 import bagit
 
 from grabbags.bags import is_bag
+import grabbags.bags
+import grabbags.hashing
+import grabbags.results
 import grabbags.utils
 
+# The modules of optional features are imported when the feature is used, so
+# that starting grabbags stays fast
+if typing.TYPE_CHECKING:
+    import grabbags.cache
+    import grabbags.digests
+    import grabbags.discovery
+    import grabbags.fixity
+    import grabbags.journal
+    import grabbags.metrics
+    import grabbags.progress
+
 SUMMARY_REPORT_HEADER = "Summary Report:"
 
+# Pairs of bags with the most content in common listed by the --index report
+REPORTED_OVERLAPS = 10
+
+# Bags handed to the bag workers ahead of those being processed, per worker
+PENDING_BAGS_PER_WORKER = 2
+
 successes = []
 failures = []
 not_a_bag = []
@@ -65,6 +89,36 @@ class BagArgumentParser(argparse.ArgumentParser):
         self.set_defaults(bag_info={})
 
 
+class VersionAction(argparse.Action):
+    """Print the version of grabbags and exit.
+
+    Unlike argparse's own version action, the version is only looked up when
+    the option is used, because finding it can mean running git.
+    """
+
+    def __init__(self, option_strings, dest=argparse.SUPPRESS,
+                 default=argparse.SUPPRESS, help=None):
+        super().__init__(
+            option_strings=option_strings,
+            dest=dest,
+            default=default,
+            nargs=0,
+            help=help or _("show program's version number and exit")
+        )
+
+    def __call__(self, parser, namespace, values, option_string=None):
+        # printed to stdout, like argparse's own version action
+        print(grabbags.utils.current_version().strip())
+        parser.exit()
+
+
+def processes_count(value: str) -> typing.Union[int, str]:
+    """Parse the value of --processes, a number or "auto"."""
+    if value == "auto":
+        return value
+    return int(value)
+
+
 def _make_parser():
     parser = BagArgumentParser(
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -72,20 +126,140 @@ def _make_parser():
     )
     parser.add_argument(
         '--version', "-v",
-        action='version',
-        version=grabbags.utils.current_version()
+        action=VersionAction
     )
 
     parser.add_argument(
         "--processes",
-        type=int,
+        type=processes_count,
         dest="processes",
         default=1,
         help=_(
-            "Use multiple processes to calculate checksums faster"
+            "Use multiple processes to calculate checksums faster. When"
+            " combined with --bag-workers, the processes are shared by all"
+            " the bags being worked on. With auto, checksums are calculated"
+            " by threads, starting with one per CPU, and their number is"
+            " adjusted during the run to what the storage and the"
+            " algorithms keep busy (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--hash-threads",
+        type=int,
+        dest="hash_threads",
+        default=0,
+        help=_(
+            "Calculate checksums with this many threads instead of"
+            " processes. Threads share one pool for all bags and avoid the"
+            " cost of starting processes (default: disabled)"
+        ),
+    )
+    parser.add_argument(
+        "--read-threads",
+        type=int,
+        dest="read_threads",
+        default=0,
+        help=_(
+            "Read files with this many threads while separate threads,"
+            " set with --hash-threads, calculate the checksums of the blocks"
+            " already read (default: disabled)"
+        ),
+    )
+    parser.add_argument(
+        "--hash-memory",
+        type=int,
+        dest="hash_memory",
+        metavar="MB",
+        default=grabbags.hashing.PIPELINE_MEMORY // (1024 * 1024),
+        help=_(
+            "Memory used for the read buffers with --read-threads, in"
+            " megabytes (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--bag-workers",
+        type=int,
+        dest="bag_workers",
+        default=1,
+        help=_(
+            "Number of bags to process at the same time"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--largest-first",
+        action="store_true",
+        help=_(
+            "With --bag-workers, find every bag and measure it before"
+            " starting, so that the largest bags are started first"
+        ),
+    )
+    parser.add_argument(
+        "--depth",
+        type=int,
+        default=1,
+        help=_(
+            "How many levels below each directory to look for bags. Empty"
+            " directories and bags are never looked into"
             " (default: %(default)s)"
         ),
     )
+    parser.add_argument(
+        "--split-directories",
+        action="store_true",
+        help=_(
+            "With --depth, also look below directories that hold files of"
+            " their own, so that their subdirectories become bags and their"
+            " files are left out. By default such a directory is treated as"
+            " a bag, or turned into one"
+        ),
+    )
+    parser.add_argument(
+        "--discovery-threads",
+        type=int,
+        default=1,
+        metavar="THREADS",
+        help=_(
+            "Number of threads listing directories while looking for bags"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--journal",
+        metavar="FILE",
+        help=_(
+            "Record the progress of the run in FILE, so that it can be"
+            " picked up again with --resume if it gets interrupted"
+        ),
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="FILE",
+        help=_(
+            "Skip the bags which the run recorded in the journal FILE has"
+            " already finished with the same action and options, and keep"
+            " recording progress to it"
+        ),
+    )
+    parser.add_argument(
+        "--results-file",
+        metavar="FILE",
+        help=_(
+            "Write the outcome of each bag to this file as a line of JSON as"
+            " soon as the bag is finished, instead of keeping every outcome"
+            " in memory until the end of the run"
+        ),
+    )
+    parser.add_argument(
+        "--metrics-file",
+        metavar="FILE",
+        help=_(
+            "Measure the bytes read, the files hashed and the time spent on"
+            " metadata, reading and hashing, add them to the summary report"
+            " and write them to FILE for the textfile collector of the"
+            " Prometheus node exporter. FILE must end with .prom"
+        ),
+    )
     parser.add_argument(
         "--log",
         help=_("The name of the log file (default: stdout)")
@@ -95,6 +269,16 @@ def _make_parser():
         action="store_true",
         help=_("Suppress all progress information other than errors"),
     )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help=_(
+            "Show the bytes processed, the speed and the time left while the"
+            " run goes on. Progress is shown on the terminal, or logged every"
+            " minute when the output is not a terminal. All directories are"
+            " found and measured before the first bag starts"
+        ),
+    )
     command_group = parser.add_mutually_exclusive_group()
     command_group.add_argument(
         "--clean",
@@ -107,6 +291,25 @@ def _make_parser():
             " Appledoubles (._*), Icon files"
         ),
     )
+    parser.add_argument(
+        "--sweep-threads",
+        type=int,
+        default=1,
+        metavar="THREADS",
+        help=_(
+            "Number of threads scanning subdirectories of a new bag, and"
+            " removing system files with --no-system-files"
+            " (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--log-system-files",
+        action="store_true",
+        help=_(
+            "Log a warning for every file removed by --no-system-files,"
+            " instead of only a summary for each bag"
+        ),
+    )
     command_group.add_argument(
         "--validate",
         dest="action_type",
@@ -117,6 +320,27 @@ def _make_parser():
             " creating new ones"
         ),
     )
+    command_group.add_argument(
+        "--update",
+        dest="action_type",
+        action="store_const",
+        const="update",
+        help=_(
+            "Update the manifests of existing bags after files were added,"
+            " changed or removed, calculating the checksums of only the new"
+            " and modified files"
+        ),
+    )
+    command_group.add_argument(
+        "--index",
+        dest="index_file",
+        metavar="DATABASE",
+        help=_(
+            "Record the digests in the manifests of existing bags in the"
+            " given database, without reading their payload, and report the"
+            " files with the same content in several places"
+        ),
+    )
     parser.set_defaults(action_type='create')
     parser.add_argument(
         "--fast",
@@ -127,6 +351,14 @@ def _make_parser():
             " without performing checksum validation to detect corruption."
         ),
     )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help=_(
+            "Modify --clean behaviour to only report the system files that"
+            " would be removed, without removing them"
+        ),
+    )
     parser.add_argument(
         "--no-checksums",
         "--completeness-only",
@@ -138,6 +370,125 @@ def _make_parser():
         ),
     )
 
+    parser.add_argument(
+        "--checksum-cache",
+        dest="checksum_cache",
+        metavar="DATABASE",
+        help=_(
+            "Modify --validate behaviour to record the checksums of files"
+            " that validate in the given cache database"
+        ),
+    )
+    parser.add_argument(
+        "--trust-cache",
+        "--incremental",
+        dest="trust_cache",
+        action="store_true",
+        help=_(
+            "Modify --validate behaviour to skip calculating the checksum of"
+            " files that have not changed since they were last verified,"
+            " according to --checksum-cache"
+        ),
+    )
+    parser.add_argument(
+        "--cache-max-age",
+        type=float,
+        dest="cache_max_age",
+        metavar="DAYS",
+        default=30,
+        help=_(
+            "Checksums verified longer ago than this are calculated again"
+            " even with --trust-cache (default: %(default)s)"
+        ),
+    )
+    parser.add_argument(
+        "--fixity-schedule",
+        metavar="DATABASE",
+        help=_(
+            "Modify --validate to keep a rolling schedule in this file and"
+            " validate the bags that have gone longest without validating"
+            " first"
+        ),
+    )
+    parser.add_argument(
+        "--budget-bytes",
+        type=int,
+        metavar="BYTES",
+        help=_(
+            "Stop adding bags to this run of --fixity-schedule before this"
+            " many bytes"
+        ),
+    )
+    parser.add_argument(
+        "--budget-time",
+        type=float,
+        metavar="MINUTES",
+        help=_(
+            "Don't start a bag of --fixity-schedule that isn't expected to"
+            " finish within this many minutes of the start of the run"
+        ),
+    )
+    parser.add_argument(
+        "--cycle-days",
+        type=float,
+        metavar="DAYS",
+        default=90,
+        help=_(
+            "Warn when bags of --fixity-schedule have gone longer than this"
+            " without validating (default: %(default)s)"
+        ),
+    )
+    sample_args = parser.add_mutually_exclusive_group()
+    sample_args.add_argument(
+        "--sample",
+        type=float,
+        metavar="FRACTION",
+        help=_(
+            "Modify --validate to only calculate the checksums of a random"
+            " fraction, between 0 and 1, of the payload files of each bag"
+        ),
+    )
+    sample_args.add_argument(
+        "--sample-bytes",
+        type=int,
+        metavar="BYTES",
+        help=_(
+            "Modify --validate to only calculate the checksums of random"
+            " payload files of each bag, until this many bytes are read"
+        ),
+    )
+    parser.add_argument(
+        "--sample-seed",
+        metavar="SEED",
+        help=_(
+            "Seed for choosing the files checked by --sample or"
+            " --sample-bytes, to check the same files again"
+        ),
+    )
+
+    parser.add_argument(
+        "--verify-algorithm",
+        choices=sorted(bagit.CHECKSUM_ALGOS) + ["strongest", "fastest"],
+        metavar="ALGORITHM",
+        help=_(
+            "Modify --validate to calculate the checksums of each file with"
+            " only this algorithm, or with the strongest or fastest"
+            " algorithm of each bag, instead of every manifest of the bag."
+            " Files are still checked against every manifest for"
+            " completeness"
+        ),
+    )
+
+    parser.add_argument(
+        "--index-algorithm",
+        choices=sorted(bagit.CHECKSUM_ALGOS),
+        metavar="ALGORITHM",
+        help=_(
+            "Manifest algorithm recorded by --index (default: the algorithm"
+            " of an existing database, or sha256)"
+        ),
+    )
+
     parser.add_argument(
         "--no-system-files",
         action="store_true",
@@ -148,6 +499,27 @@ def _make_parser():
         ),
     )
 
+    parser.add_argument(
+        "--trust-sidecars",
+        action="store_true",
+        help=_(
+            "Modify bag creation to take the checksums of payload files from"
+            " sidecar files next to them, such as image.tif.md5, instead of"
+            " calculating them. Add --sample or --sample-bytes to check some"
+            " of them first"
+        ),
+    )
+    parser.add_argument(
+        "--checksum-csv",
+        metavar="NAME",
+        help=_(
+            "Modify bag creation to take the checksums of payload files from"
+            " CSV files with this name, with a column of paths relative to"
+            " the CSV and a column for each algorithm, instead of"
+            " calculating them"
+        ),
+    )
+
     checksum_args = parser.add_argument_group(
         _("Checksum Algorithms"),
         _(
@@ -286,34 +658,121 @@ class GrabbagsRunner:
         # self.not_a_bag: typing.List[str] = []
         self.skipped: typing.List[str] = []
         self.results: typing.List[typing.Dict[str, typing.Any]] = []
+        # counted as the bags finish, so the report doesn't have to go
+        # through the lists above
+        self._counters = grabbags.results.ResultCounters()
+        self._results_lock = threading.Lock()
+        self.hash_executor: typing.Optional[concurrent.futures.Executor] = \
+            None
+        self.checksum_cache: typing.Optional[grabbags.cache.ChecksumCache] = \
+            None
+        self.journal: typing.Optional[grabbags.journal.Journal] = None
+        self.fixity_schedule: typing.Optional[
+            grabbags.fixity.FixitySchedule
+        ] = None
+        self.digest_index: typing.Optional[
+            grabbags.digests.DigestIndex
+        ] = None
+        self._deadline: typing.Optional[float] = None
+        self._throughput: typing.Optional[float] = None
+        self._out_of_time = False
+        self.deferred = 0
+        self._planned_sizes: typing.Dict[str, int] = {}
+        self.result_sink: typing.Optional[grabbags.results.ResultSink] = None
+        self.run_metrics: typing.Optional["grabbags.metrics.RunMetrics"] = None
+        self.progress: typing.Optional["grabbags.progress.Progress"] = None
 
     @staticmethod
     def find_bag_dirs(search_root: str) -> "typing.Iterable[os.DirEntry[str]]":
         yield from filter(lambda i: i.is_dir(), os.scandir(search_root))
 
-    def get_report(self, args) -> str:
-        actions: typing.Dict[str, AbsAction] = {
-            "validate": ValidateBag(args, LOGGER),
-            "clean": CleanBag(args, LOGGER),
-            "create": MakeBag(args, LOGGER)
+    @staticmethod
+    def discover(
+            search_roots: typing.Iterable[str],
+            depth: int = 1,
+            threads: int = 1,
+            split_directories: bool = False
+    ) -> "typing.Iterator[grabbags.discovery.Discovered]":
+        """Search for bag directories, possibly below the top level.
+
+        Args:
+            search_roots: directories to search
+            depth: how many levels below a root to look for bags
+            threads: number of threads listing directories
+            split_directories: look below directories holding files as well
+
+        """
+        import grabbags.discovery
+        found: typing.Dict[str, int] = {
+            grabbags.discovery.BAG: 0,
+            grabbags.discovery.NOT_A_BAG: 0,
+            grabbags.discovery.EMPTY: 0,
         }
-        action = actions[args.action_type]
-        return action.create_report(args, self)
+        for discovered in grabbags.discovery.discover_bag_dirs(
+                search_roots, depth=depth, threads=threads,
+                split_directories=split_directories):
+            found[discovered.kind] += 1
+            yield discovered
+        LOGGER.info(
+            _("Found %d bags, %d other directories and %d empty directories"),
+            found[grabbags.discovery.BAG],
+            found[grabbags.discovery.NOT_A_BAG],
+            found[grabbags.discovery.EMPTY]
+        )
+
+    def summary(self) -> grabbags.results.ResultCounters:
+        """Count the outcomes of the bags processed so far.
+
+        Returns:
+            Counts as described in :py:class:`grabbags.results.ResultCounters`
+
+        """
+        return self._counters
+
+    def get_report(self, args) -> str:
+        action = ACTIONS[args.action_type](args, LOGGER)
+        report = action.create_report(args, self)
+        if self.run_metrics is not None:
+            report += "\n".join(self.run_metrics.report()) + "\n"
+        return report
 
     def _run_action(self,
                     action_type: str,
                     bag_dir: 'os.DirEntry[str]',
                     args: argparse.Namespace) -> None:
 
-        actions: typing.Dict[str, AbsAction] = {
-            "validate": ValidateBag(args, LOGGER),
-            "clean": CleanBag(args, LOGGER),
-            "create": MakeBag(args, LOGGER)
-        }
-
-        action: AbsAction = actions[action_type]
+        action: AbsAction = ACTIONS[action_type](
+            args, LOGGER, self.hash_executor, self.checksum_cache,
+            self.digest_index
+        )
+        size = None
+        if self.fixity_schedule is not None:
+            # measured when the run was planned, and 0 for directories that
+            # aren't bags
+            size = self._planned_sizes.get(bag_dir.path, 0)
+            if not self._within_time_budget(size):
+                if self.progress is not None:
+                    self.progress.skip_bag(bag_dir.path)
+                return
+        started = time.monotonic()
+        bag_progress = None
+        if self.progress is not None:
+            bag_progress = action.tracker = \
+                self.progress.start_bag(bag_dir.path)
+        bag_metrics = None
+        if self.run_metrics is not None:
+            bag_metrics = action.recorder = \
+                self.run_metrics.start(bag_dir.path)
+        if self.journal is not None:
+            self.journal.start(os.path.abspath(bag_dir.path), action_type)
         try:
-            action.execute(bag_dir=bag_dir.path)
+            # directories found by discover() were already classified, and
+            # come as grabbags.discovery.Discovered named tuples rather than
+            # os.DirEntry
+            action.execute(
+                bag_dir=bag_dir.path,
+                kind=bag_dir.kind if isinstance(bag_dir, tuple) else None
+            )
         except bagit.BagError as error:
             if action_type == "clean":
                 LOGGER.error(
@@ -325,6 +784,16 @@ class GrabbagsRunner:
                     _("%(bag)s could not be bagged: %(error)s"),
                     {"bag": bag_dir.path, "error": error}
                 )
+            elif action_type == "update":
+                LOGGER.error(
+                    _("%(bag)s could not be updated: %(error)s"),
+                    {"bag": bag_dir.path, "error": error}
+                )
+            elif action_type == "index":
+                LOGGER.error(
+                    _("%(bag)s could not be indexed: %(error)s"),
+                    {"bag": bag_dir.path, "error": error}
+                )
             elif action_type == "validate":
                 # This will be removed as soon as the other actions are ready
                 pass
@@ -333,24 +802,431 @@ class GrabbagsRunner:
                     f"args contain invalid action_type: {args.action_type}"
                 )
         finally:
-            self.successes += action.successes
-            self.failures += action.failures
-            self.skipped += action.skipped
-            self.results.append(action.results)
+            outcome = self._outcome(action, bag_dir.path)
+            self._add_result(
+                grabbags.results.BagResult.from_results(
+                    action.results, outcome
+                ),
+                action.results
+            )
+            if bag_metrics is not None:
+                self.run_metrics.finish(bag_metrics, outcome.value)
+            if bag_progress is not None:
+                self.progress.finish_bag(bag_progress)
+            if self.result_sink is not None:
+                self.result_sink.write(
+                    bag_dir.path,
+                    action_type,
+                    outcome.value,
+                    grabbags.bags.payload_oxum(bag_dir.path),
+                    time.monotonic() - started,
+                    None if bag_metrics is None else bag_metrics.as_dict()
+                )
+            if self.journal is not None:
+                self.journal.finish(
+                    os.path.abspath(bag_dir.path), action_type, outcome.value
+                )
+            if self.fixity_schedule is not None and outcome in (
+                    grabbags.results.Outcome.SUCCESS,
+                    grabbags.results.Outcome.FAILURE
+            ):
+                self.fixity_schedule.record(
+                    bag_dir.path,
+                    size,
+                    valid=outcome is grabbags.results.Outcome.SUCCESS,
+                    duration=time.monotonic() - started
+                )
+
+    def _add_result(
+            self,
+            result: grabbags.results.BagResult,
+            results: typing.Dict[str, typing.Any]
+    ) -> None:
+        outcome_lists = {
+            grabbags.results.Outcome.SUCCESS: self.successes,
+            grabbags.results.Outcome.FAILURE: self.failures,
+            grabbags.results.Outcome.SKIPPED: self.skipped,
+        }
+        with self._results_lock:
+            self._counters.add(result)
+            # when every outcome is streamed to a file, only the counts are
+            # kept, so memory use stays flat
+            if self.result_sink is None:
+                if result.outcome in outcome_lists:
+                    outcome_lists[result.outcome].append(result.path)
+                self.results.append(results)
+
+    def _within_time_budget(self, size: int) -> bool:
+        if self._deadline is None:
+            return True
+        with self._results_lock:
+            if not self._out_of_time:
+                remaining = self._deadline - time.monotonic()
+                expected = 0.0 if self._throughput is None else \
+                    size / self._throughput
+                # once a bag doesn't fit, the ones after it wait for the
+                # next run too, so that the most overdue bags go first
+                self._out_of_time = remaining <= 0 or expected > remaining
+            if self._out_of_time:
+                self.deferred += 1
+                return False
+        return True
+
+    def _plan_fixity(
+            self,
+            args: argparse.Namespace,
+            bag_dirs: "typing.Iterable[os.DirEntry[str]]"
+    ) -> "typing.List[os.DirEntry[str]]":
+        import grabbags.fixity
+        self.fixity_schedule = grabbags.fixity.FixitySchedule(
+            args.fixity_schedule, cycle_days=args.cycle_days
+        )
+        bag_dirs = list(bag_dirs)
+        planned = self.fixity_schedule.plan(
+            bag_dirs,
+            budget_bytes=getattr(args, "budget_bytes", None),
+            sizes=self._planned_sizes
+        )
+        self.deferred = len(bag_dirs) - len(planned)
+        budget_time = getattr(args, "budget_time", None)
+        if budget_time is not None:
+            self._deadline = time.monotonic() + budget_time * 60
+            self._throughput = self.fixity_schedule.throughput()
+        LOGGER.info(
+            _("Validating the %d most overdue of %d bags"),
+            len(planned), len(bag_dirs)
+        )
+        return planned
+
+    def _finish_fixity(self) -> None:
+        import grabbags.fixity
+        if self.deferred:
+            LOGGER.info(
+                _("%d bags are left for the next run of the schedule"),
+                self.deferred
+            )
+        overdue = self.fixity_schedule.overdue()
+        if overdue:
+            LOGGER.warning(
+                _("%d bags have not validated within %g days. Increase the "
+                  "budget or run the schedule more often."),
+                overdue,
+                self.fixity_schedule.cycle / grabbags.fixity.SECONDS_PER_DAY
+            )
+
+    @staticmethod
+    def _outcome(action: "AbsAction",
+                 bag_dir: str) -> grabbags.results.Outcome:
+        if bag_dir in action.failures or action.successful is not True:
+            return grabbags.results.Outcome.FAILURE
+        if action.results.get("not_a_bag"):
+            return grabbags.results.Outcome.NOT_A_BAG
+        if bag_dir in action.skipped:
+            return grabbags.results.Outcome.SKIPPED
+        return grabbags.results.Outcome.SUCCESS
+
+    @staticmethod
+    def resume(
+            bag_dirs: "typing.Iterable[os.DirEntry[str]]",
+            state: "grabbags.journal.JournalState"
+    ) -> "typing.Iterator[os.DirEntry[str]]":
+        """Skip the bags that an interrupted run has already finished.
+
+        Bags which were being created when the run was interrupted are put
+        back the way they were, so that they can be bagged again.
+
+        Args:
+            bag_dirs: bag directories to process
+            state: progress recorded in the journal of the interrupted run
+
+        """
+        already_finished = 0
+        for bag_dir in bag_dirs:
+            path = os.path.abspath(bag_dir.path)
+            if path in state.finished:
+                already_finished += 1
+                continue
+            if state.unfinished.get(path) == "create":
+                try:
+                    grabbags.bags.restore_unfinished_bag(path)
+                except bagit.BagError as error:
+                    LOGGER.error(_("Skipping %s: %s"), path, error)
+                    continue
+            yield bag_dir
+        LOGGER.info(
+            _("Skipped %d bags already finished by an earlier run"),
+            already_finished
+        )
+
+    @staticmethod
+    def schedule(
+            bag_dirs: "typing.Iterable[os.DirEntry[str]]",
+            workers: int = 1,
+            sizes: typing.Optional[typing.Dict[str, int]] = None
+    ) -> "typing.List[os.DirEntry[str]]":
+        """Order bag directories so that the largest ones are started first.
+
+        Starting the biggest bags first keeps a single huge bag from running
+        on its own long after every other bag has finished.
+
+        Args:
+            bag_dirs: bag directories to schedule
+            workers: number of threads used to estimate the sizes
+            sizes: sizes already estimated, keyed by the path of each bag
+                directory
+
+        Returns:
+            The bag directories, largest first
+
+        """
+        bag_dirs = list(bag_dirs)
+        if sizes is None:
+            sizes = GrabbagsRunner.estimate_sizes(bag_dirs, workers)
+        return sorted(
+            bag_dirs, key=lambda bag_dir: sizes[bag_dir.path], reverse=True
+        )
+
+    @staticmethod
+    def estimate_sizes(
+            bag_dirs: "typing.List[os.DirEntry[str]]",
+            workers: int = 1
+    ) -> typing.Dict[str, int]:
+        """Estimate the number of bytes to hash in each bag directory.
+
+        Args:
+            bag_dirs: bag directories
+            workers: number of threads used to estimate the sizes
+
+        Returns:
+            Sizes in bytes, keyed by the path of each bag directory
+
+        """
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(workers, 1)) as executor:
+            sizes = executor.map(
+                grabbags.bags.estimate_size,
+                (bag_dir.path for bag_dir in bag_dirs)
+            )
+            return {
+                bag_dir.path: size for bag_dir, size in zip(bag_dirs, sizes)
+            }
 
     def run(self, args: argparse.Namespace) -> None:
         """Run the grabbags jobs based on the given user arguments.
 
+        When args.bag_workers is greater than one, that many bags are
+        processed at the same time, each one in its own thread, in the order
+        they are found, or starting with the largest if args.largest_first
+        is set. If args.processes is also greater than one, every
+        bag sends its files to a single pool of that many processes, so idle
+        processes pick up files from the bags that are still running.
+
+        When args.hash_threads is set, files are hashed by a single pool of
+        that many threads instead. Setting args.read_threads as well splits
+        the work between threads reading files and threads hashing them.
+
+        When args.processes is "auto", files are hashed by a single pool of
+        threads which adjusts its number of workers as the run goes on, see
+        :py:class:`grabbags.hashing.AdaptiveHashPool`.
+
         Args:
             args: Parsed user arguments.
 
         """
-        for bag_parent in args.directories:
-            for bag_dir in self.find_bag_dirs(bag_parent):
+        bag_workers = getattr(args, "bag_workers", 1)
+        depth = getattr(args, "depth", 1)
+        discovery_threads = getattr(args, "discovery_threads", 1)
+        if depth == 1 and discovery_threads <= 1:
+            bag_dirs = (
+                bag_dir
+                for bag_parent in args.directories
+                for bag_dir in self.find_bag_dirs(bag_parent)
+            )
+        else:
+            bag_dirs = self.discover(
+                args.directories, depth=depth, threads=discovery_threads,
+                split_directories=getattr(args, "split_directories", False)
+            )
+        if getattr(args, "checksum_cache", None) is not None:
+            self._open_checksum_cache(args)
+        if args.action_type == "index":
+            self._open_digest_index(args)
+        if getattr(args, "resume", None) is not None or \
+                getattr(args, "journal", None) is not None:
+            bag_dirs = self._open_journal(args, bag_dirs)
+        if getattr(args, "fixity_schedule", None) is not None:
+            bag_dirs = self._plan_fixity(args, bag_dirs)
+        results_file = getattr(args, "results_file", None)
+        if results_file is not None:
+            self.result_sink = grabbags.results.ResultSink(
+                results_file, append=getattr(args, "resume", False)
+            )
+        if getattr(args, "metrics_file", None) is not None:
+            from grabbags import metrics
+            self.run_metrics = metrics.RunMetrics(bag_workers)
+        if getattr(args, "progress", False):
+            bag_dirs = list(bag_dirs)
+            from grabbags import progress
+            self.progress = progress.Progress()
+            self.progress.set_work(
+                self.estimate_sizes(bag_dirs, bag_workers)
+            )
+        self.hash_executor = self._create_hash_executor(args)
+        try:
+            if bag_workers <= 1:
+                for bag_dir in bag_dirs:
+                    self._run_action(action_type=args.action_type,
+                                     bag_dir=bag_dir,
+                                     args=args)
+            else:
+                self._run_concurrently(args, bag_dirs, bag_workers)
+        finally:
+            if self.hash_executor is not None:
+                self.hash_executor.shutdown()
+                self.hash_executor = None
+            if self.checksum_cache is not None:
+                self.checksum_cache.close()
+                self.checksum_cache = None
+            if self.journal is not None:
+                self.journal.close()
+                self.journal = None
+            if self.fixity_schedule is not None:
+                self._finish_fixity()
+                self.fixity_schedule.close()
+                self.fixity_schedule = None
+            if self.digest_index is not None:
+                self._finish_digest_index()
+                self.digest_index.close()
+                self.digest_index = None
+            if self.result_sink is not None:
+                self.result_sink.close()
+                self.result_sink = None
+            if self.progress is not None:
+                self.progress.close()
+            if self.run_metrics is not None:
+                self.run_metrics.stop()
+                self.run_metrics.write_textfile(
+                    args.metrics_file, args.action_type
+                )
+
+    def _open_checksum_cache(self, args: argparse.Namespace) -> None:
+        import grabbags.cache
+        self.checksum_cache = grabbags.cache.ChecksumCache(
+            args.checksum_cache,
+            max_age=args.cache_max_age * grabbags.cache.SECONDS_PER_DAY
+        )
+
+    def _open_digest_index(self, args: argparse.Namespace) -> None:
+        import grabbags.digests
+        self.digest_index = grabbags.digests.DigestIndex(
+            args.index_file, getattr(args, "index_algorithm", None)
+        )
+
+    def _finish_digest_index(self) -> None:
+        for bag_path in self.digest_index.remove_missing():
+            LOGGER.info(_("Removed %s from the index: it is gone"), bag_path)
+        LOGGER.info(
+            _("Looking for duplicate content in %s"), self.digest_index.path
+        )
+        started = time.monotonic()
+        self.digest_index.summarize()
+        LOGGER.debug(
+            "Found duplicate content in %.1f seconds",
+            time.monotonic() - started
+        )
+
+    def _open_journal(
+            self,
+            args: argparse.Namespace,
+            bag_dirs: "typing.Iterable[os.DirEntry[str]]"
+    ) -> "typing.Iterable[os.DirEntry[str]]":
+        import grabbags.journal
+        resume = getattr(args, "resume", None)
+        fingerprint = grabbags.journal.options_fingerprint(args)
+        if resume is not None:
+            bag_dirs = self.resume(
+                bag_dirs,
+                grabbags.journal.Journal.read(resume, fingerprint)
+            )
+        self.journal = grabbags.journal.Journal(
+            resume or args.journal, fingerprint
+        )
+        return bag_dirs
 
-                self._run_action(action_type=args.action_type,
-                                 bag_dir=bag_dir,
-                                 args=args)
+    @staticmethod
+    def _create_hash_executor(
+            args: argparse.Namespace
+    ) -> typing.Optional[concurrent.futures.Executor]:
+        if args.action_type in ("clean", "index"):
+            return None
+
+        processes = getattr(args, "processes", 1)
+        if processes == "auto":
+            return grabbags.hashing.AdaptiveHashPool()
+
+        hash_threads = getattr(args, "hash_threads", 0)
+        read_threads = getattr(args, "read_threads", 0)
+        if read_threads:
+            return grabbags.hashing.HashPipeline(
+                read_threads,
+                hash_threads or os.cpu_count() or 1,
+                memory=args.hash_memory * 1024 * 1024
+            )
+        if hash_threads:
+            return grabbags.hashing.create_thread_pool(hash_threads)
+
+        if getattr(args, "bag_workers", 1) > 1 and processes != 1:
+            # Use spawn because the pool is started while the bag worker
+            # threads are running, which isn't safe with fork. Python 3.6
+            # can only use the default.
+            if sys.version_info < (3, 7):
+                return concurrent.futures.ProcessPoolExecutor(
+                    max_workers=processes or None
+                )
+            return concurrent.futures.ProcessPoolExecutor(
+                max_workers=processes or None,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return None
+
+    def _run_concurrently(
+            self,
+            args: argparse.Namespace,
+            bag_dirs: "typing.Iterable[os.DirEntry[str]]",
+            bag_workers: int
+    ) -> None:
+        # a fixity schedule has already put the bags in order
+        if getattr(args, "largest_first", False) and \
+                self.fixity_schedule is None:
+            bag_dirs = self.schedule(
+                bag_dirs,
+                bag_workers,
+                None if self.progress is None else self.progress.sizes
+            )
+        # bags are handed to the workers as they free up rather than all at
+        # once, so a run over millions of bags doesn't hold a queued task
+        # and a future for every one of them
+        max_pending = PENDING_BAGS_PER_WORKER * bag_workers
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=bag_workers) as executor:
+            jobs: typing.Set[concurrent.futures.Future] = set()
+            for bag_dir in bag_dirs:
+                if len(jobs) >= max_pending:
+                    done, jobs = concurrent.futures.wait(
+                        jobs, return_when=concurrent.futures.FIRST_COMPLETED
+                    )
+                    for job in done:
+                        job.result()
+                jobs.add(
+                    executor.submit(
+                        self._run_action,
+                        action_type=args.action_type,
+                        bag_dir=bag_dir,
+                        args=args
+                    )
+                )
+            for job in concurrent.futures.as_completed(jobs):
+                job.result()
 
 
 def run2(args: argparse.Namespace) -> None:
@@ -370,41 +1246,66 @@ def run2(args: argparse.Namespace) -> None:
     action: str = {
         'validate': 'validated',
         'clean': 'cleaned',
-        'create': 'created'
+        'create': 'created',
+        'update': 'updated',
+        'index': 'indexed'
     }.get(args.action_type, "")
 
+    summary = runner.summary()
     LOGGER.info(
         _("%(count)s bags %(action)s successfully"),
-        {"count": len(runner.successes), "action": action}
+        {"count": summary["successes"], "action": action}
     )
-    if runner.failures and len(runner.failures) > 0:
+    if summary["failures"] > 0:
         LOGGER.warning(
             _("%(count)s bags not %(action)s"),
-            {"count": len(runner.failures), "action": action}
+            {"count": summary["failures"], "action": action}
         )
+        if runner.failures:
+            LOGGER.warning(
+                _("Failed for the following folders: %s"),
+                ", ".join(runner.failures)
+            )
+
+    if summary["not_a_bag"] > 0:
         LOGGER.warning(
-            _("Failed for the following folders: %s"),
-            ", ".join(runner.failures)
+            _("%(count)s folders are not bags"),
+            {"count": summary["not_a_bag"]}
         )
+        not_a_bag_paths = [
+            result["path"] for result in runner.results
+            if result.get("not_a_bag") is True
+        ]
+        if not_a_bag_paths:
+            LOGGER.warning(
+                _("The following folders are not bags: %s"),
+                ", ".join(not_a_bag_paths)
+            )
 
-    not_a_bag_results = [
-        result for result in runner.results
-        if 'not_a_bag' in result and result['not_a_bag'] is True
-    ]
-
-    if not_a_bag_results:
+    if summary.empty_dirs:
         LOGGER.warning(
-            _("%(count)s folders are not bags"),
-            {"count": len(not_a_bag_results)}
+            _("The following empty folders were skipped: %s"),
+            ", ".join(summary.empty_dirs)
         )
+    if summary.already_bags:
         LOGGER.warning(
-            _("The following folders are not bags: %s"),
-            ", ".join(not_a_bag_results)
+            _("The following folders are already bags: %s"),
+            ", ".join(summary.already_bags)
+        )
+
+    if getattr(args, "results_file", None) is not None:
+        LOGGER.info(
+            _("The outcome of every bag is in %s"), args.results_file
         )
 
 
 def run(args: argparse.Namespace):
     warnings.warn("Use run2 instead", PendingDeprecationWarning)
+    # the module level lists only hold the bags of the latest run, so that
+    # they don't keep growing when grabbags is used as a library
+    del successes[:]
+    del failures[:]
+    del not_a_bag[:]
     for bag_parent in args.directories:
         for bag_dir in filter(lambda i: i.is_dir(), os.scandir(bag_parent)):
             if args.action_type == "validate":
@@ -476,11 +1377,29 @@ class AbsAction(abc.ABC):
 
     def __init__(
             self,
-            args: argparse.Namespace, logger: logging.Logger = None
+            args: argparse.Namespace, logger: logging.Logger = None,
+            hash_executor: typing.Optional[concurrent.futures.Executor] = None,
+            checksum_cache: typing.Optional[
+                "grabbags.cache.ChecksumCache"
+            ] = None,
+            digest_index: typing.Optional[
+                "grabbags.digests.DigestIndex"
+            ] = None
     ) -> None:
 
         self.logger = logger or logging.getLogger(__name__)
         self.args = args
+
+        # hash_executor is shared between actions running at the same time so
+        # that all the bags in progress draw from the same pool of workers
+        self.hash_executor = hash_executor
+        self.checksum_cache = checksum_cache
+        self.digest_index = digest_index
+
+        # measurements and progress of the bag being processed, set by the
+        # runner when the run is measured or shows its progress
+        self.recorder: typing.Optional["grabbags.metrics.BagMetrics"] = None
+        self.tracker: typing.Optional["grabbags.progress.BagProgress"] = None
         self.successes = []
         self.failures = []
 
@@ -500,21 +1419,48 @@ class AbsAction(abc.ABC):
         # AND i want a count of directories that are not bags and their paths
 
 
+    def _sample_policy(self) -> typing.Optional[grabbags.bags.SamplePolicy]:
+        fraction = getattr(self.args, "sample", None)
+        max_bytes = getattr(self.args, "sample_bytes", None)
+        if fraction is None and max_bytes is None:
+            return None
+        return grabbags.bags.SamplePolicy(
+            fraction=fraction,
+            max_bytes=max_bytes,
+            seed=getattr(self.args, "sample_seed", None)
+        )
+
     @abc.abstractmethod
     def create_report(self, args, runner):
         """Create a string report"""
 
+    @staticmethod
+    def _is_bag(bag_dir: str, kind: typing.Optional[str]) -> bool:
+        if kind is None:
+            return is_bag(bag_dir)
+        # discovery classifies a directory from its listing the same way
+        # is_bag does, so it isn't looked at again
+        import grabbags.discovery
+        return kind == grabbags.discovery.BAG
+
     @abc.abstractmethod
-    def execute(self, bag_dir: str):
-        """Run the command."""
+    def execute(self, bag_dir: str, kind: typing.Optional[str] = None):
+        """Run the command.
+
+        Args:
+            bag_dir: File path to a directory
+            kind: what :py:mod:`grabbags.discovery` found the directory to
+                be, if it was classified when it was found
+
+        """
 
 
 class ValidateBag(AbsAction):
     """Validate bag action."""
 
-    def execute(self, bag_dir: str):
+    def execute(self, bag_dir: str, kind: typing.Optional[str] = None):
         self.results['path'] = bag_dir
-        if not is_bag(bag_dir):
+        if not self._is_bag(bag_dir, kind):
             self.logger.warning(_("%s is not a bag. Skipped."), bag_dir)
             self.results['not_a_bag'] = True
             self.successful = True
@@ -524,7 +1470,30 @@ class ValidateBag(AbsAction):
 
     def validate(self, bag_dir: str) -> None:
         """Validate directory."""
-        bag = bagit.Bag(bag_dir)
+        sample = self._sample_policy()
+        # bags that are measured or followed are hashed by grabbags, which
+        # can tell reading from hashing and report every block, and bags
+        # with huge manifests are loaded into a compact index
+        verify_algorithm = getattr(self.args, "verify_algorithm", None)
+        if self.hash_executor is not None or \
+                self.checksum_cache is not None or sample is not None or \
+                verify_algorithm is not None or \
+                self.recorder is not None or self.tracker is not None or \
+                grabbags.bags.manifests_size(bag_dir) > \
+                grabbags.bags.COMPACT_MANIFEST_BYTES:
+            bag = grabbags.bags.Bag(
+                bag_dir,
+                executor=self.hash_executor,
+                checksum_cache=self.checksum_cache,
+                trust_cache=getattr(self.args, "trust_cache", False),
+                sample=sample,
+                load_manifests=not (self.args.fast or self.args.no_checksums),
+                verify_algorithm=verify_algorithm,
+                recorder=self.recorder,
+                tracker=self.tracker
+            )
+        else:
+            bag = bagit.Bag(bag_dir)
 
         # validate throws a BagError or BagValidationError
         try:
@@ -545,6 +1514,10 @@ class ValidateBag(AbsAction):
                       "paths in manifest correct"),
                     bag_dir
                 )
+            elif sample is not None:
+                self.logger.info(
+                    _("%s is valid according to a spot check"), bag_dir
+                )
             else:
                 self.logger.info(_("%s is valid"), bag_dir)
             self.successful = True
@@ -555,24 +1528,54 @@ class ValidateBag(AbsAction):
                 {"bag": bag_dir, "error": error}
             )
             self.successful = False
+        finally:
+            stage = getattr(bag, "stage", None)
+            if isinstance(stage, str):
+                self.results["stage"] = stage
+            verified_algorithm = getattr(bag, "verified_algorithm", None)
+            if isinstance(verified_algorithm, str):
+                self.results["verified_algorithm"] = verified_algorithm
+            summary = getattr(bag, "sample_summary", None)
+            if isinstance(summary, grabbags.bags.SampleSummary):
+                self.results.update(summary._asdict())
 
     def create_report(self, args, runner):
-
-        not_a_bag_results = {
-            result["path"]
-            for result in runner.results
-            if "not_a_bag" in result and result["not_a_bag"]
-        }
-
+        summary = runner.summary()
         report = [
             SUMMARY_REPORT_HEADER,
-            f"{len(runner.successes)} bags validated successfully",
-            f"{len(runner.failures)} failures",
-            f"{len(not_a_bag_results)} directories are not bags",
-            ""
+            f"{summary['successes']} bags validated successfully",
+            f"{summary['failures']} failures",
+            f"{summary['not_a_bag']} directories are not bags",
         ]
+        report += self._sample_report(summary)
+        report.append("")
         return "\n".join(report)
 
+    @staticmethod
+    def _sample_report(
+            summary: grabbags.results.ResultCounters
+    ) -> typing.List[str]:
+        if not summary["sampled"]:
+            return []
+
+        files_checked = summary["files_checked"]
+        files_total = summary["files_total"]
+        bytes_checked = summary["bytes_checked"]
+        bytes_total = summary["bytes_total"]
+        report = [
+            f"Spot check covered {files_checked} of {files_total} files"
+            f" ({files_checked / max(files_total, 1):.1%}) and"
+            f" {bytes_checked} of {bytes_total} bytes"
+            f" ({bytes_checked / max(bytes_total, 1):.1%})"
+        ]
+        if not summary["failures"] and files_checked < files_total:
+            bound = grabbags.bags.corruption_bound(files_checked)
+            report.append(
+                f"With 95% confidence, fewer than {bound:.2%} of the files"
+                f" are corrupt"
+            )
+        return report
+
 
 class CleanBag(AbsAction):
     """CleanBag cleans directory containing bag.
@@ -585,15 +1588,16 @@ class CleanBag(AbsAction):
         that are not bags.
     """
 
-    def execute(self, bag_dir: str):
+    def execute(self, bag_dir: str, kind: typing.Optional[str] = None):
         """Clean bag at given directory.
 
         Args:
             bag_dir: File path to a directory
+            kind: what discovery found the directory to be, if known
 
         """
         self.results['path'] = bag_dir
-        if not is_bag(bag_dir):
+        if not self._is_bag(bag_dir, kind):
             self.logger.warning(_("%s is not a bag. Not cleaning."), bag_dir)
             self.results['not_a_bag'] = True
             self.successful = True
@@ -604,49 +1608,50 @@ class CleanBag(AbsAction):
 
     def clean(self, bag_dir: str):
         """Clean directory."""
-        bag = bagit.Bag(bag_dir)
-        if bag.compare_manifests_with_fs()[1]:
-            for payload_file in bag.compare_manifests_with_fs()[1]:
-                if grabbags.utils.is_system_file(payload_file):
-                    self.logger.info(
-                        "Removing system files from %s", bag_dir
-                    )
-                    os.remove(os.path.join(bag_dir, payload_file))
-                else:
-
-                    self.logger.warning(
-                        "Found file not in manifest: %s", payload_file
-                    )
-        else:
+        # the payload is walked once against the manifests held in memory,
+        # unless they are so large that it is compared with them in sorted
+        # order instead, in bounded memory
+        bag = grabbags.bags.Bag(
+            bag_dir,
+            load_manifests=grabbags.bags.manifests_size(bag_dir) <=
+            grabbags.bags.COMPACT_MANIFEST_BYTES
+        )
+        dry_run = getattr(self.args, "dry_run", False)
+        started = time.perf_counter()
+        result = grabbags.bags.clean_payload(bag, dry_run=dry_run)
+        if self.recorder is not None:
+            self.recorder.add_time(
+                "stat_time", time.perf_counter() - started
+            )
+        for payload_file in result.removed:
+            if dry_run:
+                self.logger.info(
+                    "Would remove system file %s from %s",
+                    payload_file, bag_dir
+                )
+            else:
+                self.logger.info(
+                    "Removing system file %s from %s", payload_file, bag_dir
+                )
+        for payload_file in result.unexpected:
+            self.logger.warning(
+                "Found file not in manifest: %s", payload_file
+            )
+        self.results["system_files_removed"] = len(result.removed)
+        self.results["bytes_removed"] = result.bytes_removed
+        if not result.removed and not result.unexpected:
             self.skipped.append(bag_dir)
             self.logger.info("No system files located in %s", bag_dir)
         # TODO: error handling for cleaning bags
 
     def create_report(self, args, runner):
-
-        cleaned = set()
-        for success in runner.successes:
-            cleaned.add(success)
-
-        failed = set()
-        for failure in runner.failures:
-            failed.add(failure)
-
-        already_cleaned = set()
-        for skipped in runner.skipped:
-            already_cleaned.add(skipped)
-
-        not_bags = set()
-        for result in runner.results:
-            if 'not_a_bag' in result and result['not_a_bag'] is True:
-                not_bags.add(result['path'])
-
+        summary = runner.summary()
         report = [
             SUMMARY_REPORT_HEADER,
-            f"{len(cleaned)} bags cleaned successfully",
-            f"{len(failed)} failures",
-            f"{len(already_cleaned)} bags are already clean",
-            f"{len(not_bags)} directories are not bags",
+            f"{summary['successes']} bags cleaned successfully",
+            f"{summary['failures']} failures",
+            f"{summary['skipped']} bags are already clean",
+            f"{summary['not_a_bag']} directories are not bags",
             ""
         ]
         return "\n".join(report)
@@ -655,70 +1660,283 @@ class CleanBag(AbsAction):
 class MakeBag(AbsAction):
     """Bag creation action."""
 
-    def execute(self, bag_dir: str):
+    def execute(self, bag_dir: str, kind: typing.Optional[str] = None):
         """Generate a bag for the given directory.
 
         Args:
             bag_dir: File path to a directory
+            kind: what discovery found the directory to be, if known. Bags
+                and empty directories are then skipped without scanning
+                them.
 
         """
         self.results["path"] = bag_dir
-        if len(os.listdir(bag_dir)) == 0:
-            self.logger.warning(
-                _("%s is an empty directory. Skipped."), bag_dir)
-            self.skipped.append(bag_dir)
-            self.results["empty_dir"] = True
-            self.results["skipped"] = True
-            self.successful = True
+        if kind is not None:
+            from grabbags import discovery
+            if kind == discovery.EMPTY:
+                self._skip_empty(bag_dir)
+                return
+            if kind == discovery.BAG:
+                self._skip_bag(bag_dir)
+                return
+        no_system_files = self.args.no_system_files is True
+        # a single scan finds everything needed to bag the directory
+        started = time.perf_counter()
+        prepared = grabbags.bags.prepare_tree(
+            bag_dir,
+            remove_system_files=no_system_files,
+            threads=getattr(self.args, "sweep_threads", 1),
+            log_each=getattr(self.args, "log_system_files", False)
+        )
+        if self.recorder is not None:
+            self.recorder.add_time(
+                "stat_time", time.perf_counter() - started
+            )
+        if prepared.empty:
+            self._skip_empty(bag_dir)
             return
 
-        if is_bag(bag_dir):
-            self.logger.warning(_("%s is already a bag. Skipped."), bag_dir)
-            self.skipped.append(bag_dir)
-            self.results["already_a_bag"] = True
-            self.results["skipped"] = True
-            self.successful = True
+        if prepared.already_a_bag:
+            self._skip_bag(bag_dir)
             return
 
-        if self.args.no_system_files is True:
-            self.logger.info(_("Cleaning %s of system files"), bag_dir)
-            grabbags.utils.remove_system_files(root=bag_dir)
+        if no_system_files:
+            self.logger.info(
+                _("Removed %d system files (%d bytes) from %s"),
+                prepared.system_files.files_removed,
+                prepared.system_files.bytes_removed,
+                bag_dir
+            )
+
+        trusted = self._trusted_digests(prepared)
+        if trusted is not None:
+            sample = self._sample_policy()
+            if sample is not None:
+                summary = grabbags.bags.verify_trusted_digests(
+                    prepared,
+                    trusted,
+                    sample,
+                    processes=self.args.processes,
+                    executor=self.hash_executor,
+                    recorder=self.recorder,
+                    tracker=self.tracker
+                )
+                self.results.update(summary._asdict())
 
-        bag = bagit.make_bag(
+        # grabbags.bags.make_bag doesn't change the working directory like
+        # bagit.make_bag does, so bags can be created from several threads
+        bag = grabbags.bags.make_bag(
             bag_dir,
             bag_info=self.args.bag_info,
             processes=self.args.processes,
-            checksums=self.args.checksums
+            checksums=self.args.checksums,
+            executor=self.hash_executor,
+            prepared=prepared,
+            trusted=trusted,
+            recorder=self.recorder,
+            tracker=self.tracker
         )
         self.successes.append(bag_dir)
         self.logger.info(_("Bagged %s"), bag.path)
         self.successful = True
 
-    def create_report(self, args, runner):
-        already_bags = 0
-
-        for result in runner.results:
-            if "already_a_bag" in result and result['already_a_bag'] is True:
-                already_bags += 1
+    def _skip_empty(self, bag_dir: str) -> None:
+        self.logger.warning(_("%s is an empty directory. Skipped."), bag_dir)
+        self.skipped.append(bag_dir)
+        self.results["empty_dir"] = True
+        self.results["skipped"] = True
+        self.successful = True
 
-        empty_dirs = 0
+    def _skip_bag(self, bag_dir: str) -> None:
+        self.logger.warning(_("%s is already a bag. Skipped."), bag_dir)
+        self.skipped.append(bag_dir)
+        self.results["already_a_bag"] = True
+        self.results["skipped"] = True
+        self.successful = True
 
-        for result in runner.results:
-            if "empty_dir" in result and result['empty_dir'] is True:
-                empty_dirs += 1
+    def _trusted_digests(
+            self,
+            prepared: grabbags.bags.PreparedTree
+    ) -> typing.Optional[typing.Dict[str, typing.Dict[str, str]]]:
+        use_sidecars = getattr(self.args, "trust_sidecars", False)
+        csv_name = getattr(self.args, "checksum_csv", None)
+        if not use_sidecars and csv_name is None:
+            return None
+        import grabbags.sidecars
+        trusted = grabbags.sidecars.collect_digests(
+            prepared.files,
+            prepared.path,
+            use_sidecars=use_sidecars,
+            csv_name=csv_name
+        )
+        self.results["files_trusted"] = len(trusted)
+        return trusted
 
+    def create_report(self, args, runner):
+        summary = runner.summary()
         report_lines = [
             SUMMARY_REPORT_HEADER,
-            f"{len(runner.successes)} bags created successfully",
-            f"{len(runner.failures)} failures",
-            f"{empty_dirs} empty directories skipped",
-            f"{already_bags} directories are already a bag"
+            f"{summary['successes']} bags created successfully",
+            f"{summary['failures']} failures",
+            f"{summary['empty_dir']} empty directories skipped",
+            f"{summary['already_a_bag']} directories are already a bag"
         ]
-        # TODO: add paths of empty directories
-        # TODO: add paths of already_bags
+        report_lines += ValidateBag._sample_report(summary)
         return "\n".join(report_lines) + "\n"
 
 
+class UpdateBag(AbsAction):
+    """Bring the manifests of an existing bag up to date with its payload.
+
+    Bags whose payload hasn't changed since their manifests were written are
+    left alone and counted as skipped.
+    """
+
+    def execute(self, bag_dir: str, kind: typing.Optional[str] = None):
+        """Update bag at given directory.
+
+        Args:
+            bag_dir: File path to a directory
+            kind: what discovery found the directory to be, if known
+
+        """
+        self.results["path"] = bag_dir
+        if not self._is_bag(bag_dir, kind):
+            self.logger.warning(_("%s is not a bag. Skipped."), bag_dir)
+            self.results["not_a_bag"] = True
+            self.successful = True
+            return
+
+        result = grabbags.bags.update_bag(
+            bag_dir,
+            processes=self.args.processes,
+            executor=self.hash_executor,
+            recorder=self.recorder,
+            tracker=self.tracker
+        )
+        self.results["files_added"] = len(result.added)
+        self.results["files_changed"] = len(result.changed)
+        self.results["files_removed"] = len(result.removed)
+        if not result.modified:
+            self.logger.info(_("%s is already up to date"), bag_dir)
+            self.skipped.append(bag_dir)
+            self.successful = True
+            return
+
+        for rel_path in result.removed:
+            self.logger.warning(
+                _("Removed %(file)s, which is no longer in %(bag)s, from the"
+                  " manifests"),
+                {"file": rel_path, "bag": bag_dir}
+            )
+        self.logger.info(
+            _("Updated %(bag)s: %(added)d files added, %(changed)d changed"
+              " and %(removed)d removed"),
+            {
+                "bag": bag_dir,
+                "added": len(result.added),
+                "changed": len(result.changed),
+                "removed": len(result.removed),
+            }
+        )
+        self.successes.append(bag_dir)
+        self.successful = True
+
+    def create_report(self, args, runner):
+        summary = runner.summary()
+        report = [
+            SUMMARY_REPORT_HEADER,
+            f"{summary['successes']} bags updated successfully",
+            f"{summary['failures']} failures",
+            f"{summary['skipped']} bags are already up to date",
+            f"{summary['not_a_bag']} directories are not bags",
+            ""
+        ]
+        return "\n".join(report)
+
+
+class IndexBag(AbsAction):
+    """Add the digests in the manifest of a bag to a digest index.
+
+    The payload of the bag is not read. Bags without a manifest for the
+    algorithm of the index are skipped.
+    """
+
+    def execute(self, bag_dir: str, kind: typing.Optional[str] = None):
+        """Index bag at given directory.
+
+        Args:
+            bag_dir: File path to a directory
+            kind: what discovery found the directory to be, if known
+
+        """
+        self.results["path"] = bag_dir
+        if not self._is_bag(bag_dir, kind):
+            self.logger.warning(_("%s is not a bag. Skipped."), bag_dir)
+            self.results["not_a_bag"] = True
+            self.successful = True
+            return
+
+        if not os.path.isfile(self.digest_index.manifest_path(bag_dir)):
+            self.logger.warning(
+                _("%(bag)s has no %(algorithm)s manifest. Skipped."),
+                {"bag": bag_dir, "algorithm": self.digest_index.algorithm}
+            )
+            self.skipped.append(bag_dir)
+            self.results["skipped"] = True
+            self.successful = True
+            return
+
+        bag = grabbags.bags.Bag(bag_dir, load_manifests=False)
+        files = self.digest_index.add_bag(bag)
+        if files is None:
+            self.logger.info(
+                _("%s is unchanged since it was indexed"), bag_dir
+            )
+        else:
+            self.logger.info(_("Indexed %d files of %s"), files, bag_dir)
+            self.results["files_indexed"] = files
+        self.successes.append(bag_dir)
+        self.successful = True
+
+    def create_report(self, args, runner):
+        import grabbags.digests
+        summary = runner.summary()
+        report = [
+            SUMMARY_REPORT_HEADER,
+            f"{summary['successes']} bags indexed successfully",
+            f"{summary['failures']} failures",
+            f"{summary['skipped']} bags without a manifest to index",
+            f"{summary['not_a_bag']} directories are not bags",
+        ]
+        with grabbags.digests.DigestIndex(args.index_file) as digest_index:
+            totals = digest_index.summary()
+            overlaps = digest_index.overlaps(limit=REPORTED_OVERLAPS)
+        report += [
+            f"{totals.files} files ({totals.bytes} bytes) in {totals.bags}"
+            f" bags in the index",
+            f"{totals.duplicated} contents found in {totals.copies} files,"
+            f" with {totals.extra_bytes} bytes in extra copies",
+        ]
+        for overlap in overlaps:
+            report.append(
+                f"{overlap.files} files ({overlap.bytes} bytes) of"
+                f" {overlap.bag} are also in {overlap.other}"
+            )
+        report.append("")
+        return "\n".join(report)
+
+
+# Action class for each action type
+ACTIONS: typing.Dict[str, typing.Type[AbsAction]] = {
+    "validate": ValidateBag,
+    "clean": CleanBag,
+    "create": MakeBag,
+    "update": UpdateBag,
+    "index": IndexBag,
+}
+
+
 def main(
         argv: typing.List[str] = None,
         runner: typing.Callable[[argparse.Namespace], None] = None
@@ -733,10 +1951,61 @@ def main(
     argv = argv or sys.argv[1:]
     parser: argparse.ArgumentParser = _make_parser()
     args: argparse.Namespace = parser.parse_args(args=argv)
+    if args.index_file is not None:
+        args.action_type = "index"
 
-    if args.processes < 0:
+    if args.processes != "auto" and args.processes < 0:
         parser.error(_("The number of processes must be 0 or greater"))
 
+    if args.hash_threads < 0:
+        parser.error(_("The number of hash threads must be 0 or greater"))
+
+    if args.hash_threads and args.processes != 1:
+        parser.error(
+            _("Can't use --processes and --hash-threads at the same time")
+        )
+
+    if args.action_type == "clean" and args.hash_threads:
+        parser.error(
+            _("Can't run --clean and --hash-threads at the same time")
+        )
+
+    if args.read_threads < 0:
+        parser.error(_("The number of read threads must be 0 or greater"))
+
+    if args.read_threads and args.processes != 1:
+        parser.error(
+            _("Can't use --processes and --read-threads at the same time")
+        )
+
+    if args.action_type == "clean" and args.read_threads:
+        parser.error(
+            _("Can't run --clean and --read-threads at the same time")
+        )
+
+    if args.hash_memory < 1:
+        parser.error(_("--hash-memory must be 1 or greater"))
+
+    if args.bag_workers < 1:
+        parser.error(_("The number of bag workers must be 1 or greater"))
+
+    if args.largest_first and args.bag_workers < 2:
+        parser.error(_("--largest-first requires --bag-workers of 2 or more"))
+
+    if args.depth < 1:
+        parser.error(_("--depth must be 1 or greater"))
+
+    if args.split_directories and args.depth < 2:
+        parser.error(_("--split-directories requires --depth of 2 or more"))
+
+    if args.discovery_threads < 1:
+        parser.error(
+            _("The number of discovery threads must be 1 or greater")
+        )
+
+    if args.sweep_threads < 1:
+        parser.error(_("The number of sweep threads must be 1 or greater"))
+
     if args.no_checksums and args.action_type != "validate":
         parser.error(
             _("--no-checksums is only allowed as an option with --validate")
@@ -756,6 +2025,122 @@ def main(
     if args.fast and args.action_type != "validate":
         parser.error(_("--fast is only allowed as an option with --validate"))
 
+    if args.dry_run and args.action_type != "clean":
+        parser.error(_("--dry-run is only allowed as an option with --clean"))
+
+    if args.checksum_cache and args.action_type != "validate":
+        parser.error(
+            _("--checksum-cache is only allowed as an option with --validate")
+        )
+
+    if args.trust_cache and not args.checksum_cache:
+        parser.error(_("--trust-cache requires --checksum-cache"))
+
+    if args.journal and args.resume:
+        parser.error(_("Can't use --journal and --resume at the same time"))
+
+    if args.fixity_schedule and args.action_type != "validate":
+        parser.error(
+            _("--fixity-schedule is only allowed as an option with --validate")
+        )
+    budget = args.budget_bytes is not None or args.budget_time is not None
+    if budget and not args.fixity_schedule:
+        parser.error(
+            _("--budget-bytes and --budget-time require --fixity-schedule")
+        )
+    if args.budget_bytes is not None and args.budget_bytes < 1:
+        parser.error(_("--budget-bytes must be 1 or greater"))
+    if args.budget_time is not None and args.budget_time <= 0:
+        parser.error(_("--budget-time must be greater than 0"))
+    if args.cycle_days <= 0:
+        parser.error(_("--cycle-days must be greater than 0"))
+
+    trusting = args.trust_sidecars or args.checksum_csv is not None
+    if trusting and args.action_type != "create":
+        parser.error(
+            _("--trust-sidecars and --checksum-csv are only allowed when "
+              "creating bags")
+        )
+
+    sampling = args.sample is not None or args.sample_bytes is not None
+    if sampling and args.action_type != "validate" and not trusting:
+        parser.error(
+            _("--sample and --sample-bytes are only allowed as options with "
+              "--validate, --trust-sidecars or --checksum-csv")
+        )
+    if sampling and (args.fast or args.no_checksums):
+        parser.error(
+            _("Can't sample checksums with --fast or --no-checksums")
+        )
+    if args.sample is not None and not 0 < args.sample <= 1:
+        parser.error(_("--sample must be greater than 0 and at most 1"))
+    if args.sample_bytes is not None and args.sample_bytes < 1:
+        parser.error(_("--sample-bytes must be 1 or greater"))
+    if args.sample_seed is not None and not sampling:
+        parser.error(
+            _("--sample-seed requires --sample or --sample-bytes")
+        )
+
+    if args.verify_algorithm is not None:
+        if args.action_type != "validate":
+            parser.error(
+                _("--verify-algorithm is only allowed as an option with "
+                  "--validate")
+            )
+        if args.fast or args.no_checksums:
+            parser.error(
+                _("Can't use --verify-algorithm with --fast or "
+                  "--no-checksums")
+            )
+
+    if args.action_type == "update" and args.checksums is not None:
+        parser.error(_("Can't specify a checksum algorithm and "
+                       "run --update at the same time"))
+    if args.action_type == "update" and args.no_system_files:
+        parser.error(
+            _("Can't run --update and --no-system-files at the same time")
+        )
+
+    if args.index_algorithm is not None and args.action_type != "index":
+        parser.error(
+            _("--index-algorithm is only allowed as an option with --index")
+        )
+    if args.action_type == "index" and args.checksums is not None:
+        parser.error(_("Can't specify a checksum algorithm and "
+                       "run --index at the same time"))
+    if args.action_type == "index" and args.no_system_files:
+        parser.error(
+            _("Can't run --index and --no-system-files at the same time")
+        )
+    if args.action_type == "index" and os.path.isfile(args.index_file):
+        # an index keeps the algorithm it was created with
+        import sqlite3
+        import grabbags.digests
+        try:
+            grabbags.digests.DigestIndex(
+                args.index_file, args.index_algorithm
+            ).close()
+        except ValueError as error:
+            parser.error(
+                _("%s. Leave out --index-algorithm or use another index "
+                  "file") % error
+            )
+        except sqlite3.DatabaseError as error:
+            parser.error(
+                _("%(file)s is not a digest index: %(error)s")
+                % {"file": args.index_file, "error": error}
+            )
+
+    if args.cache_max_age < 0:
+        parser.error(_("--cache-max-age must be 0 or greater"))
+
+    if args.metrics_file is not None and \
+            not args.metrics_file.endswith(".prom"):
+        parser.error(_("--metrics-file must end with .prom"))
+
+    if args.quiet:
+        args.progress = False
+
     _configure_logging(args)
 
     runner = runner or run2
@@ -0,0 +1,821 @@
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import logging
+import os
+import queue
+import threading
+import time
+import typing
+
+import bagit
+
+if typing.TYPE_CHECKING:
+    from grabbags import metrics
+    from grabbags import progress
+
+LOGGER = logging.getLogger(__name__)
+
+# Size of the buffer each thread or process reads files into. hashlib
+# releases the GIL while it digests blocks this large, so threads hash in
+# parallel.
+BUFFER_SIZE = 1024 * 1024
+
+# Default memory used for the buffers of a HashPipeline, in bytes
+PIPELINE_MEMORY = 64 * 1024 * 1024
+
+# Algorithms from the weakest to the strongest, for choosing the strongest
+# algorithm of a bag. Others count as weaker than all of these.
+ALGORITHM_STRENGTH = [
+    "md5",
+    "sha1",
+    "sha224",
+    "sha3_224",
+    "sha256",
+    "sha3_256",
+    "blake2s",
+    "sha384",
+    "sha3_384",
+    "sha512",
+    "sha3_512",
+    "blake2b",
+]
+
+# Tasks sent to an executor ahead of the results being read, so that the
+# tasks for a bag with millions of files aren't all held at once
+MAX_PENDING_TASKS = 1024
+
+# How often an AdaptiveHashPool measures its throughput and adjusts its
+# number of workers, in seconds
+ADJUST_INTERVAL = 5.0
+
+# Changes in throughput smaller than this fraction count as no change
+THROUGHPUT_TOLERANCE = 0.05
+
+# Fraction of CPU time spent waiting for I/O above which the storage is
+# taken to be saturated
+IO_WAIT_LIMIT = 0.2
+
+# Most workers an AdaptiveHashPool grows to, whatever the number of CPUs
+MAX_ADAPTIVE_WORKERS = 64
+
+HashResult = typing.Tuple[str, int, typing.Dict[str, str]]
+VerifyResult = typing.Tuple[str, typing.Dict[str, str], typing.Dict[str, str]]
+
+_local = threading.local()
+
+
+def _get_buffer() -> bytearray:
+    buffer = getattr(_local, "buffer", None)
+    if buffer is None:
+        buffer = _local.buffer = bytearray(BUFFER_SIZE)
+    return buffer
+
+
+def calculate_file_hashes(
+        full_path: str,
+        algorithms: typing.Iterable[str],
+        recorder: "typing.Optional[metrics.BagMetrics]" = None,
+        tracker: "typing.Optional[progress.BagProgress]" = None
+) -> typing.Tuple[int, typing.Dict[str, str]]:
+    """Calculate the checksums of a file, reading it only once.
+
+    The file is read into a buffer which belongs to the calling thread and is
+    reused for every file it hashes, and each block is handed to all the
+    algorithms before the next one is read. When called by a reader thread of
+    a :py:class:`HashPipeline`, the hashing is handed over to the hasher
+    threads of the pipeline instead.
+
+    Args:
+        full_path: path to the file
+        algorithms: names of the hashlib algorithms to use
+        recorder: measurements of the bag the file belongs to, where the
+            time spent reading and hashing the file is added
+        tracker: progress of the bag the file belongs to, which is told
+            about every block read
+
+    Returns:
+        Number of bytes read and a dictionary of hex digests keyed by algorithm
+
+    """
+    hashers = list(bagit.get_hashers(algorithms).items())
+    adaptive: typing.Optional[AdaptiveHashPool] = \
+        getattr(_local, "adaptive", None)
+    pipeline: typing.Optional[HashPipeline] = getattr(_local, "pipeline", None)
+    if pipeline is not None:
+        total_bytes = pipeline.hash_stream(
+            full_path, hashers, recorder, tracker
+        )
+        return total_bytes, {
+            alg: hasher.hexdigest() for alg, hasher in hashers
+        }
+
+    buffer = _get_buffer()
+    total_bytes = 0
+    read_time = 0.0
+    hash_time = 0.0
+    started = time.perf_counter()
+    with memoryview(buffer) as view, open(full_path, "rb", buffering=0) as f:
+        while True:
+            size = f.readinto(buffer)
+            read = time.perf_counter()
+            read_time += read - started
+            if not size:
+                break
+            total_bytes += size
+            block = view[:size]
+            for _, hasher in hashers:
+                hasher.update(block)
+            block.release()
+            if tracker is not None:
+                tracker.add(size)
+            if adaptive is not None:
+                adaptive.add_bytes(size)
+            started = time.perf_counter()
+            hash_time += started - read
+    if recorder is not None:
+        recorder.add_file(total_bytes, read_time, hash_time)
+    return total_bytes, {alg: hasher.hexdigest() for alg, hasher in hashers}
+
+
+def hash_payload_file(
+        task: typing.Tuple[str, str, typing.List[str]],
+        recorder: "typing.Optional[metrics.BagMetrics]" = None,
+        tracker: "typing.Optional[progress.BagProgress]" = None
+) -> HashResult:
+    """Hash a single payload file of a bag, for writing its manifests.
+
+    This is a top level function so that it can be sent to a process pool.
+
+    Args:
+        task: bag root, path of the file relative to the bag root and the
+            algorithms to use
+        recorder: measurements of the bag, see :py:func:`calculate_file_hashes`
+        tracker: progress of the bag, see :py:func:`calculate_file_hashes`
+
+    Returns:
+        The relative path, size in bytes and the digests of the file
+
+    """
+    bag_dir, rel_path, algorithms = task
+    LOGGER.debug("Generating manifest lines for file %s", rel_path)
+    total_bytes, digests = calculate_file_hashes(
+        os.path.join(bag_dir, rel_path), algorithms, recorder, tracker
+    )
+    return rel_path, total_bytes, digests
+
+
+def verify_payload_file(
+        task: typing.Tuple[str, str, typing.Dict[str, str], typing.List[str]],
+        recorder: "typing.Optional[metrics.BagMetrics]" = None,
+        tracker: "typing.Optional[progress.BagProgress]" = None
+) -> VerifyResult:
+    """Hash a single file of a bag, for comparing with its manifests.
+
+    This works like bagit's own worker function, so the result can be checked
+    in the same way.
+
+    Args:
+        task: bag root, path of the file relative to the bag root, the
+            digests recorded in the manifests and the algorithms of the bag
+        recorder: measurements of the bag, see :py:func:`calculate_file_hashes`
+        tracker: progress of the bag, see :py:func:`calculate_file_hashes`
+
+    Returns:
+        The relative path, the digests found and the digests recorded. If the
+        file can't be read, the error message replaces each digest found.
+
+    """
+    bag_dir, rel_path, hashes, algorithms = task
+    full_path = os.path.join(bag_dir, rel_path)
+    LOGGER.debug("Verifying checksum for file %s", full_path)
+    wanted = [alg for alg in hashes if alg in algorithms]
+    try:
+        _, digests = calculate_file_hashes(
+            full_path, wanted, recorder, tracker
+        )
+    except OSError as error:
+        message = f"Could not read {full_path}: {error}"
+        digests = {alg: message for alg in wanted}
+    return rel_path, digests, hashes
+
+
+def reporting_to(
+        function: typing.Callable[..., typing.Any],
+        recorder: "typing.Optional[metrics.BagMetrics]" = None,
+        tracker: "typing.Optional[progress.BagProgress]" = None
+) -> typing.Callable[..., typing.Any]:
+    """Have a worker function report to the measurements and progress of a bag.
+
+    Args:
+        function: :py:func:`hash_payload_file` or
+            :py:func:`verify_payload_file`
+        recorder: measurements of the bag, if it is measured
+        tracker: progress of the bag, if progress is shown
+
+    Returns:
+        The function with recorder and tracker bound, or the function itself
+        if there is nothing to report to. Recorders and trackers can't be
+        sent to another process, so use :py:func:`map_reporting` with a
+        process pool.
+
+    """
+    if recorder is None and tracker is None:
+        return function
+    return functools.partial(function, recorder=recorder, tracker=tracker)
+
+
+class _Report:
+    """What a worker function hashed in another process, for the parent to
+    pass on to the recorder and tracker of the bag."""
+
+    __slots__ = ("files", "read_bytes")
+
+    def __init__(self) -> None:
+        self.files: typing.List[typing.Tuple[int, float, float]] = []
+        self.read_bytes = 0
+
+    def add_file(self, size: int, read_time: float, hash_time: float) -> None:
+        self.files.append((size, read_time, hash_time))
+
+    def add(self, size: int) -> None:
+        self.read_bytes += size
+
+    def replay(
+            self,
+            recorder: "typing.Optional[metrics.BagMetrics]",
+            tracker: "typing.Optional[progress.BagProgress]"
+    ) -> None:
+        if recorder is not None:
+            for size, read_time, hash_time in self.files:
+                recorder.add_file(size, read_time, hash_time)
+        if tracker is not None and self.read_bytes:
+            tracker.add(self.read_bytes)
+
+
+def _reported(
+        function: typing.Callable[..., typing.Any],
+        task: typing.Any
+) -> typing.Tuple[typing.Any, _Report]:
+    report = _Report()
+    return function(task, recorder=report, tracker=report), report
+
+
+def map_reporting(
+        executor: concurrent.futures.Executor,
+        function: typing.Callable[..., typing.Any],
+        tasks: typing.Iterable,
+        recorder: "typing.Optional[metrics.BagMetrics]" = None,
+        tracker: "typing.Optional[progress.BagProgress]" = None
+) -> typing.Iterator:
+    """Run a worker function over tasks, reporting to a bag, like map_bounded.
+
+    With a process pool, the recorder and tracker stay in this process: the
+    workers send back what they read and hashed with each result, and it is
+    reported here as the results come in.
+
+    Args:
+        executor: executor to run the function with
+        function: :py:func:`hash_payload_file` or
+            :py:func:`verify_payload_file`
+        tasks: arguments of each call
+        recorder: measurements of the bag, if it is measured
+        tracker: progress of the bag, if progress is shown
+
+    Yields:
+        The result of each call, in the order of the tasks
+
+    """
+    if not isinstance(executor, concurrent.futures.ProcessPoolExecutor):
+        yield from map_bounded(
+            executor, reporting_to(function, recorder, tracker), tasks
+        )
+        return
+    if recorder is None and tracker is None:
+        yield from map_bounded(executor, function, tasks)
+        return
+    for result, report in map_bounded(
+            executor, functools.partial(_reported, function), tasks
+    ):
+        report.replay(recorder, tracker)
+        yield result
+
+
+@functools.lru_cache(maxsize=None)
+def algorithm_speed(algorithm: str) -> float:
+    """Measure how fast an algorithm hashes on this machine.
+
+    The speed is measured once per process, by hashing a few megabytes.
+
+    Args:
+        algorithm: name of the algorithm
+
+    Returns:
+        Bytes hashed per second
+
+    """
+    block = bytes(BUFFER_SIZE)
+    hasher = hashlib.new(algorithm)
+    hasher.update(block)
+    started = time.perf_counter()
+    for _ in range(4):
+        hasher.update(block)
+    return 4 * len(block) / max(time.perf_counter() - started, 1e-9)
+
+
+def choose_algorithm(
+        choice: str,
+        algorithms: typing.Iterable[str]
+) -> typing.Optional[str]:
+    """Choose the one algorithm to verify the files of a bag with.
+
+    Args:
+        choice: name of an algorithm, "strongest" or "fastest"
+        algorithms: algorithms of the manifests of the bag
+
+    Returns:
+        The algorithm, or None if the bag has no manifest for the one named
+
+    """
+    algorithms = list(algorithms)
+    if not algorithms:
+        return None
+    if choice == "strongest":
+        return max(
+            algorithms,
+            key=lambda alg: ALGORITHM_STRENGTH.index(alg)
+            if alg in ALGORITHM_STRENGTH else -1
+        )
+    if choice == "fastest":
+        return max(algorithms, key=algorithm_speed)
+    return choice if choice in algorithms else None
+
+
+def create_thread_pool(threads: int) -> concurrent.futures.ThreadPoolExecutor:
+    """Create a pool of threads for hashing files.
+
+    Threads avoid the cost of starting processes and of sending every task
+    to them, which matters most for bags with many small files.
+
+    Args:
+        threads: number of hashing threads
+
+    """
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=threads,
+        thread_name_prefix="grabbags-hash"
+    )
+
+
+def map_bounded(
+        executor: concurrent.futures.Executor,
+        function: typing.Callable,
+        tasks: typing.Iterable
+) -> typing.Iterator:
+    """Run a function over tasks with an executor, like its map method.
+
+    Unlike map, tasks are only taken from the iterable as results are read,
+    so no more than MAX_PENDING_TASKS are waiting at any time.
+
+    Args:
+        executor: executor to run the function with
+        function: function to run on each task
+        tasks: arguments of each call
+
+    Yields:
+        The result of each call, in the order of the tasks
+
+    """
+    pending: typing.Deque[concurrent.futures.Future] = collections.deque()
+    for task in tasks:
+        if len(pending) >= MAX_PENDING_TASKS:
+            yield pending.popleft().result()
+        pending.append(executor.submit(function, task))
+    while pending:
+        yield pending.popleft().result()
+
+
+class _Stream:
+    """Blocks of one file waiting to be hashed, in the order they were read.
+    """
+
+    __slots__ = ("hashers", "recorder", "blocks", "scheduled", "lock", "done")
+
+    def __init__(self, hashers, recorder=None) -> None:
+        self.hashers = hashers
+        self.recorder = recorder
+        self.blocks: typing.Deque[
+            typing.Tuple[typing.Optional[bytearray], int]
+        ] = collections.deque()
+        self.scheduled = False
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+
+class HashPipeline(concurrent.futures.ThreadPoolExecutor):
+    """Executor which overlaps reading files with hashing them.
+
+    The worker threads of the executor are readers. They fill buffers taken
+    from a fixed ring with readinto and pass them to a separate group of
+    hasher threads, then go straight on to read the next block while the
+    previous one is hashed. Blocks of the same file are always hashed in
+    order, one at a time, while blocks of different files are hashed in
+    parallel. Memory use is capped by the size of the ring.
+    """
+
+    def __init__(
+            self,
+            read_threads: int,
+            hash_threads: int,
+            memory: int = PIPELINE_MEMORY
+    ) -> None:
+        """Create the pipeline and start its hasher threads.
+
+        Args:
+            read_threads: number of threads reading files
+            hash_threads: number of threads hashing the blocks read
+            memory: total size of the buffers in bytes. At least two buffers
+                per reader are always allocated, so that every reader can
+                fill one while the other is hashed.
+
+        """
+        buffer_count = max(2 * read_threads, memory // BUFFER_SIZE)
+        self._free_buffers: "queue.Queue[bytearray]" = queue.Queue()
+        for _ in range(buffer_count):
+            self._free_buffers.put(bytearray(BUFFER_SIZE))
+
+        self._ready_streams: "queue.Queue[typing.Optional[_Stream]]" = \
+            queue.Queue()
+        self._hash_threads = [
+            threading.Thread(
+                target=self._hash_worker,
+                name=f"grabbags-hash_{num}",
+                daemon=True
+            ) for num in range(hash_threads)
+        ]
+        for thread in self._hash_threads:
+            thread.start()
+
+        super().__init__(
+            max_workers=read_threads,
+            thread_name_prefix="grabbags-read",
+            initializer=self._register_reader
+        )
+
+    def _register_reader(self) -> None:
+        _local.pipeline = self
+
+    def _feed(
+            self,
+            stream: _Stream,
+            buffer: typing.Optional[bytearray],
+            size: int
+    ) -> None:
+        with stream.lock:
+            stream.blocks.append((buffer, size))
+            if stream.scheduled:
+                return
+            stream.scheduled = True
+        self._ready_streams.put(stream)
+
+    def _hash_worker(self) -> None:
+        while True:
+            stream = self._ready_streams.get()
+            if stream is None:
+                return
+            while True:
+                with stream.lock:
+                    if not stream.blocks:
+                        stream.scheduled = False
+                        break
+                    buffer, size = stream.blocks.popleft()
+                if buffer is None:
+                    stream.done.set()
+                    continue
+                started = time.perf_counter()
+                with memoryview(buffer) as view, view[:size] as block:
+                    for _, hasher in stream.hashers:
+                        hasher.update(block)
+                if stream.recorder is not None:
+                    stream.recorder.add_time(
+                        "hash_time", time.perf_counter() - started
+                    )
+                self._free_buffers.put(buffer)
+
+    def hash_stream(
+            self,
+            full_path: str,
+            hashers: typing.List[typing.Tuple[str, typing.Any]],
+            recorder: "typing.Optional[metrics.BagMetrics]" = None,
+            tracker: "typing.Optional[progress.BagProgress]" = None
+    ) -> int:
+        """Read a file and feed it to the hashers through the pipeline.
+
+        This blocks until every block of the file has been hashed.
+
+        Args:
+            full_path: path to the file
+            hashers: hashlib objects to update, paired with their algorithm
+            recorder: measurements of the bag the file belongs to. The
+                readers add the time spent reading and the hashers the time
+                spent hashing.
+            tracker: progress of the bag the file belongs to, which is told
+                about every block read
+
+        Returns:
+            Number of bytes read
+
+        """
+        stream = _Stream(hashers, recorder)
+        total_bytes = 0
+        read_time = 0.0
+        try:
+            with open(full_path, "rb", buffering=0) as file_handle:
+                while True:
+                    buffer = self._free_buffers.get()
+                    started = time.perf_counter()
+                    try:
+                        size = file_handle.readinto(buffer)
+                    except BaseException:
+                        self._free_buffers.put(buffer)
+                        raise
+                    read_time += time.perf_counter() - started
+                    if not size:
+                        self._free_buffers.put(buffer)
+                        break
+                    total_bytes += size
+                    self._feed(stream, buffer, size)
+                    if tracker is not None:
+                        tracker.add(size)
+        finally:
+            # the end of the stream is marked even when reading failed, so
+            # that its buffers are handed back before the error is raised
+            self._feed(stream, None, 0)
+            stream.done.wait()
+        if recorder is not None:
+            recorder.add_file(total_bytes, read_time, 0.0)
+        return total_bytes
+
+    def shutdown(self, wait: bool = True, **kwargs) -> None:
+        super().shutdown(wait, **kwargs)
+        for _ in self._hash_threads:
+            self._ready_streams.put(None)
+        if wait:
+            for thread in self._hash_threads:
+                thread.join()
+
+
+def cpu_times() -> typing.Optional[typing.Tuple[int, int]]:
+    """Read how much time the CPUs have spent waiting for I/O.
+
+    This is only available on Linux.
+
+    Returns:
+        Time spent waiting for I/O and total time since boot, in clock
+        ticks, or None if it can't be read
+
+    """
+    try:
+        with open("/proc/stat", "r") as stat_file:
+            fields = stat_file.readline().split()
+    except OSError:
+        return None
+    if len(fields) < 6 or fields[0] != "cpu":
+        return None
+    times = [int(field) for field in fields[1:]]
+    return times[4], sum(times)
+
+
+class AdaptiveHashPool(concurrent.futures.Executor):
+    """Thread pool which finds its best number of hashing workers.
+
+    The pool starts with one worker per CPU. Every ADJUST_INTERVAL seconds
+    it measures how many bytes its workers hashed and changes the number of
+    workers allowed to run by one, climbing towards the highest throughput:
+    a change that helped is repeated, one that hurt is undone. When the
+    throughput stays flat while the CPUs are mostly waiting for I/O, the
+    storage is saturated and a worker is taken away, as more readers only
+    make a spinning disk seek more. The first change is also down when the
+    storage is busy and up otherwise, since fast storage and slow
+    algorithms like sha512 keep many workers busy.
+
+    The pool runs its own worker threads, up to max_workers of them. A
+    worker only takes a task from the queue while fewer workers than
+    allowed are running one, so the number can change at any time without
+    stopping the pool, and tasks waiting for a worker can still be
+    cancelled. Time the pool spends without work, such as between bags, is
+    left out of the measurements.
+    """
+
+    def __init__(
+            self,
+            workers: typing.Optional[int] = None,
+            max_workers: typing.Optional[int] = None,
+            interval: float = ADJUST_INTERVAL
+    ) -> None:
+        """Create the pool.
+
+        Args:
+            workers: number of workers to start with. Defaults to the number
+                of CPUs.
+            max_workers: most workers to allow. Defaults to four per CPU, up
+                to MAX_ADAPTIVE_WORKERS.
+            interval: seconds between adjustments
+
+        """
+        cpus = os.cpu_count() or 1
+        if max_workers is None:
+            max_workers = min(4 * cpus, MAX_ADAPTIVE_WORKERS)
+        self.max_workers = max(max_workers, 1)
+        self.workers = min(workers or cpus, self.max_workers)
+        self.interval = interval
+        # tasks waiting for a worker, the worker threads, how many of them
+        # run a task or wait for one and whether the pool is shut down, all
+        # guarded by the gate
+        self._tasks: typing.Deque[typing.Tuple[
+            concurrent.futures.Future,
+            typing.Callable[..., typing.Any],
+            tuple,
+            typing.Dict[str, typing.Any]
+        ]] = collections.deque()
+        self._threads: typing.List[threading.Thread] = []
+        self._running = 0
+        self._waiting = 0
+        self._shutdown = False
+        self._gate = threading.Condition()
+        # time and CPU ticks spent without work, guarded by the gate
+        self._idle_since: typing.Optional[float] = time.monotonic()
+        self._idle_cpu = cpu_times()
+        self._idle_seconds = 0.0
+        self._idle_ticks = [0, 0]
+        # bytes hashed by each worker, which only its worker adds to
+        self._counters: typing.List[typing.List[int]] = []
+        self._measure_lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._window_due = self._window_start + interval
+        self._window_bytes = 0
+        self._window_cpu = cpu_times()
+        self._window_idle = (0.0, 0, 0)
+        self._last_throughput: typing.Optional[float] = None
+        self._step = 0
+
+    def submit(self, fn, *args, **kwargs) -> concurrent.futures.Future:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        with self._gate:
+            if self._shutdown:
+                raise RuntimeError(
+                    "cannot schedule new futures after shutdown"
+                )
+            self._end_idle()
+            self._tasks.append((future, fn, args, kwargs))
+            if self._waiting == 0 and len(self._threads) < self.max_workers:
+                thread = threading.Thread(
+                    target=self._work,
+                    name=f"grabbags-hash_{len(self._threads)}",
+                    daemon=True
+                )
+                self._threads.append(thread)
+                thread.start()
+            self._gate.notify()
+        return future
+
+    def _work(self) -> None:
+        _local.adaptive = self
+        _local.hashed = [0]
+        with self._measure_lock:
+            self._counters.append(_local.hashed)
+        while True:
+            with self._gate:
+                while not self._tasks or self._running >= self.workers:
+                    if self._shutdown and not self._tasks:
+                        return
+                    self._waiting += 1
+                    self._gate.wait()
+                    self._waiting -= 1
+                future, fn, args, kwargs = self._tasks.popleft()
+                self._running += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException as error:
+                        future.set_exception(error)
+                    else:
+                        future.set_result(result)
+                del future, fn, args, kwargs
+            finally:
+                with self._gate:
+                    self._running -= 1
+                    if self._running == 0 and not self._tasks:
+                        self._start_idle()
+                    self._gate.notify()
+
+    def shutdown(self, wait: bool = True, **kwargs) -> None:
+        with self._gate:
+            self._shutdown = True
+            if kwargs.get("cancel_futures"):
+                while self._tasks:
+                    self._tasks.popleft()[0].cancel()
+            self._gate.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def _start_idle(self) -> None:
+        self._idle_since = time.monotonic()
+        self._idle_cpu = cpu_times()
+
+    def _end_idle(self) -> None:
+        if self._idle_since is None:
+            return
+        self._idle_seconds += time.monotonic() - self._idle_since
+        cpu = cpu_times()
+        if cpu is not None and self._idle_cpu is not None:
+            self._idle_ticks[0] += cpu[0] - self._idle_cpu[0]
+            self._idle_ticks[1] += cpu[1] - self._idle_cpu[1]
+        self._idle_since = None
+
+    def add_bytes(self, size: int) -> None:
+        """Count bytes hashed by a worker, adjusting the pool when it's time.
+
+        Args:
+            size: number of bytes
+
+        """
+        _local.hashed[0] += size
+        if time.monotonic() < self._window_due:
+            return
+        with self._measure_lock:
+            now = time.monotonic()
+            if now < self._window_due:
+                return
+            with self._gate:
+                idle = (self._idle_seconds, *self._idle_ticks)
+            elapsed = now - self._window_start - \
+                (idle[0] - self._window_idle[0])
+            if elapsed < self.interval:
+                # the pool was idle for part of the window
+                self._window_due = now + self.interval - elapsed
+                return
+            hashed = sum(counter[0] for counter in self._counters)
+            throughput = (hashed - self._window_bytes) / elapsed
+            cpu = cpu_times()
+            io_wait = None
+            if cpu is not None and self._window_cpu is not None:
+                io_ticks = cpu[0] - self._window_cpu[0] - \
+                    (idle[1] - self._window_idle[1])
+                total_ticks = cpu[1] - self._window_cpu[1] - \
+                    (idle[2] - self._window_idle[2])
+                if total_ticks > 0:
+                    io_wait = io_ticks / total_ticks
+            self._window_start = now
+            self._window_due = now + self.interval
+            self._window_bytes = hashed
+            self._window_cpu = cpu
+            self._window_idle = idle
+            self.adjust(throughput, io_wait)
+
+    def adjust(
+            self,
+            throughput: float,
+            io_wait: typing.Optional[float] = None
+    ) -> int:
+        """Change the number of workers after a measurement.
+
+        Args:
+            throughput: bytes hashed per second since the last adjustment
+            io_wait: fraction of CPU time spent waiting for I/O over the same
+                time, or None if unknown
+
+        Returns:
+            The new number of workers
+
+        """
+        storage_busy = io_wait is not None and io_wait > IO_WAIT_LIMIT
+        last = self._last_throughput
+        self._last_throughput = throughput
+        if last is None:
+            step = -1 if storage_busy else 1
+        elif throughput > last * (1 + THROUGHPUT_TOLERANCE):
+            # keep going the way that helped
+            step = self._step or 1
+        elif throughput < last * (1 - THROUGHPUT_TOLERANCE):
+            # undo the change that hurt
+            step = -(self._step or 1)
+        elif storage_busy:
+            step = -1
+        else:
+            step = 0
+
+        workers = max(1, min(self.max_workers, self.workers + step))
+        self._step = workers - self.workers
+        if self._step:
+            LOGGER.info(
+                "Hashing with %d workers, at %.1f MB/s with %d",
+                workers, throughput / 1e6, self.workers
+            )
+            with self._gate:
+                self.workers = workers
+                self._gate.notify_all()
+        return workers
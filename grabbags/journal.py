@@ -0,0 +1,171 @@
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import typing
+
+# Options that only change how fast a run goes, where it reports or which
+# directories it looks in. Every other option can change what an action
+# does to a bag, so bags finished with different values for any of them are
+# processed again when resuming.
+UNFINGERPRINTED_OPTIONS = {
+    "processes",
+    "hash_threads",
+    "read_threads",
+    "hash_memory",
+    "bag_workers",
+    "largest_first",
+    "sweep_threads",
+    "discovery_threads",
+    "depth",
+    "directories",
+    "journal",
+    "resume",
+    "results_file",
+    "metrics_file",
+    "log",
+    "quiet",
+    "progress",
+    "log_system_files",
+    "checksum_cache",
+    "cache_max_age",
+}
+
+
+def options_fingerprint(args: argparse.Namespace) -> str:
+    """Summarize the user arguments that affect the outcome of a bag.
+
+    Args:
+        args: Parsed user arguments.
+
+    Returns:
+        A short hash which only matches another run with the same action and
+        options
+
+    """
+    options = {
+        option: value for option, value in vars(args).items()
+        if option not in UNFINGERPRINTED_OPTIONS
+    }
+    serialized = json.dumps(options, sort_keys=True, default=str)
+    return hashlib.sha1(serialized.encode("utf-8")).hexdigest()[:16]
+
+
+class JournalState(typing.NamedTuple):
+    """Bags recorded in a journal."""
+
+    #: bags that have finished with the same action and options
+    finished: typing.Set[str]
+
+    #: bags that were started but never finished, such as when the run
+    #: was killed while working on them, mapped to the action that was
+    #: interrupted
+    unfinished: typing.Dict[str, str]
+
+
+class Journal:
+    """Durable record of the progress of a run.
+
+    Every bag gets a line when it is started and another when it finishes.
+    Each line is flushed to disk before the bag is touched or the next bag
+    begins, so the journal survives the process being killed.
+    """
+
+    def __init__(self, path: str, fingerprint: str) -> None:
+        self.path = path
+        self.fingerprint = fingerprint
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __enter__(self) -> "Journal":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def _write(self, record: typing.Dict[str, typing.Any]) -> None:
+        record["options"] = self.fingerprint
+        record["time"] = time.time()
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def start(self, bag_dir: str, action_type: str) -> None:
+        """Record that work on a bag is about to begin.
+
+        Args:
+            bag_dir: path to the bag
+            action_type: action run on the bag
+
+        """
+        self._write({"event": "start", "path": bag_dir, "action": action_type})
+
+    def finish(self, bag_dir: str, action_type: str, outcome: str) -> None:
+        """Record that work on a bag is complete.
+
+        Args:
+            bag_dir: path to the bag
+            action_type: action run on the bag
+            outcome: what happened to the bag, such as "success" or "failure"
+
+        """
+        self._write(
+            {
+                "event": "finish",
+                "path": bag_dir,
+                "action": action_type,
+                "outcome": outcome
+            }
+        )
+
+    def close(self) -> None:
+        """Close the journal file."""
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def read(path: str, fingerprint: str) -> JournalState:
+        """Read which bags an earlier run got through.
+
+        Only bags finished with the same options fingerprint count as
+        finished. Failed bags are not counted either, so that they are tried
+        again. Unfinished bags are reported whatever options they were
+        started with. Lines which are not valid, such as one cut short by a
+        crash, are ignored.
+
+        Args:
+            path: path to the journal file
+            fingerprint: options fingerprint of the current run
+
+        Returns:
+            The finished and unfinished bags of the earlier run
+
+        """
+        started: typing.Dict[str, str] = {}
+        finished: typing.Set[str] = set()
+        if not os.path.exists(path):
+            return JournalState(finished=finished, unfinished=started)
+
+        with open(path, "r", encoding="utf-8") as journal_file:
+            for line in journal_file:
+                try:
+                    record = json.loads(line)
+                    event = record["event"]
+                    bag_dir = record["path"]
+                except (ValueError, KeyError, TypeError):
+                    continue
+
+                if event == "start":
+                    started[bag_dir] = record.get("action", "")
+                    finished.discard(bag_dir)
+                elif event == "finish":
+                    started.pop(bag_dir, None)
+                    if record.get("options") == fingerprint and \
+                            record.get("outcome") != "failure":
+                        finished.add(bag_dir)
+
+        return JournalState(finished=finished, unfinished=started)
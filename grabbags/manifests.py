@@ -0,0 +1,286 @@
+import array
+import codecs
+import collections.abc
+import hashlib
+import logging
+import typing
+
+import bagit
+
+LOGGER = logging.getLogger(__name__)
+
+# Slots in the hash table when the index is created. The table doubles
+# whenever it becomes half full.
+INITIAL_SLOTS = 1024
+
+
+def read_manifest(
+        path: str,
+        encoding: str = "utf-8"
+) -> typing.Iterator[typing.Tuple[str, str]]:
+    """Read the lines of a manifest one at a time.
+
+    Lines are parsed the way bagit does: blank lines and comments are
+    skipped, a byte order mark is skipped with a warning and invalid lines
+    are logged and skipped. Paths are not checked or normalized.
+
+    Args:
+        path: path to the manifest
+        encoding: Tag-File-Character-Encoding of the bag
+
+    Yields:
+        The digest and the path of each entry, as written in the manifest
+
+    """
+    with open(path, "r", encoding=encoding) as manifest_file:
+        first = manifest_file.read(1)
+        if first == bagit.UNICODE_BYTE_ORDER_MARK:
+            if codecs.lookup(encoding).name == "utf-8":
+                LOGGER.warning(
+                    "%s is encoded using UTF-8 but contains an unnecessary"
+                    " byte-order mark, which is not in compliance with the"
+                    " BagIt RFC",
+                    path
+                )
+        else:
+            manifest_file.seek(0)
+
+        for line in manifest_file:
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            entry = line.split(None, 1)
+            if len(entry) != 2:
+                LOGGER.error("%s: Invalid manifest entry: %s", path, line)
+                continue
+            yield entry[0], entry[1]
+
+
+class _Items(collections.abc.ItemsView):
+    # walks the index by position instead of looking up every path again
+
+    def __iter__(self):
+        index = self._mapping
+        for position in range(len(index)):
+            yield index.path_at(position), index.digests_at(position)
+
+
+class ManifestIndex(collections.abc.Mapping):
+    """The manifest entries of a bag, stored compactly.
+
+    This can stand in for the entries dictionary of a bagit.Bag: it maps
+    the path of each file to a dictionary of its digests by algorithm. The
+    paths and digests are not kept as Python objects, though. Paths are
+    stored after Unicode normalization, encoded as UTF-8, one after the
+    other in a single buffer. Digests are stored as binary in one buffer per
+    algorithm, in the same order. Paths are found through a hash table of
+    positions, so they are looked up after Unicode normalization, like
+    bagit compares manifests with the file system.
+
+    Each file takes about:
+
+    * the length of its path in UTF-8,
+    * 8 bytes for the position of its path,
+    * 8 to 16 bytes of hash table,
+    * the size of each of its digests in binary: 16 bytes for md5, 20 for
+      sha1, 32 for sha256 and 64 for sha512.
+
+    A file with a 60 byte path and sha256 and sha512 digests takes 172 to
+    180 bytes, where the dictionaries of bagit take about 660 bytes. The
+    buffers grow by small steps while the index is built, and the hash table
+    doubles in size while it is less than half full, so the peak is only
+    about 8 bytes per file higher than the final size.
+
+    Paths that change when normalized and digests that aren't valid hex are
+    kept separately, as strings.
+    """
+
+    def __init__(self) -> None:
+        self._paths = bytearray()
+        self._offsets = array.array("Q", [0])
+        self._slots = array.array("I", [0]) * INITIAL_SLOTS
+        self._digests: typing.Dict[str, bytearray] = {}
+        self._present: typing.Dict[str, bytearray] = {}
+        self._digest_sizes: typing.Dict[str, int] = {}
+        self._originals: typing.Dict[int, str] = {}
+        self._odd_digests: typing.Dict[typing.Tuple[str, int], str] = {}
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __iter__(self) -> typing.Iterator[str]:
+        for position in range(len(self)):
+            yield self.path_at(position)
+
+    def __getitem__(self, path: str) -> typing.Dict[str, str]:
+        position = self.position(path)
+        if position < 0:
+            raise KeyError(path)
+        return self.digests_at(position)
+
+    def __contains__(self, path) -> bool:
+        return isinstance(path, str) and self.position(path) >= 0
+
+    def items(self) -> _Items:
+        return _Items(self)
+
+    @property
+    def algorithms(self) -> typing.List[str]:
+        """Algorithms with digests in the index."""
+        return list(self._digests)
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the buffers holding the index, in bytes."""
+        return (
+            len(self._paths)
+            + self._offsets.itemsize * len(self._offsets)
+            + self._slots.itemsize * len(self._slots)
+            + sum(len(digests) for digests in self._digests.values())
+            + sum(len(present) for present in self._present.values())
+        )
+
+    @staticmethod
+    def _encode(path: str) -> bytes:
+        return bagit.normalize_unicode(path).encode(
+            "utf-8", "surrogateescape"
+        )
+
+    def _path_bytes(self, position: int) -> bytes:
+        return self._paths[
+            self._offsets[position]:self._offsets[position + 1]
+        ]
+
+    def _find(self, key: bytes) -> typing.Tuple[int, int]:
+        # the position of the path, or -1, and the slot it is or would be in
+        slots = self._slots
+        mask = len(slots) - 1
+        slot = hash(key) & mask
+        while True:
+            stored = slots[slot]
+            if not stored:
+                return -1, slot
+            if self._path_bytes(stored - 1) == key:
+                return stored - 1, slot
+            slot = (slot + 1) & mask
+
+    def _grow(self) -> None:
+        slots = array.array("I", [0]) * (2 * len(self._slots))
+        mask = len(slots) - 1
+        for position in range(len(self)):
+            slot = hash(bytes(self._path_bytes(position))) & mask
+            while slots[slot]:
+                slot = (slot + 1) & mask
+            slots[slot] = position + 1
+        self._slots = slots
+
+    def position(self, path: str) -> int:
+        """Find where a path is in the index.
+
+        Args:
+            path: path relative to the bag root, normalized or not
+
+        Returns:
+            Position of the path, or -1 if it isn't in the index
+
+        """
+        return self._find(self._encode(path))[0]
+
+    def path_at(self, position: int) -> str:
+        """Get a path as it was written in the manifest.
+
+        Args:
+            position: position of the path in the index
+
+        Returns:
+            The path
+
+        """
+        original = self._originals.get(position)
+        if original is not None:
+            return original
+        return self._path_bytes(position).decode("utf-8", "surrogateescape")
+
+    def digests_at(self, position: int) -> typing.Dict[str, str]:
+        """Get the digests of a file.
+
+        Args:
+            position: position of the file in the index
+
+        Returns:
+            Digests in lower case hex, keyed by algorithm, for every manifest
+            which lists the file
+
+        """
+        digests = {}
+        for algorithm, stored in self._digests.items():
+            present = self._present[algorithm]
+            if len(present) <= position >> 3 or \
+                    not present[position >> 3] & (1 << (position & 7)):
+                continue
+            if self._odd_digests and \
+                    (algorithm, position) in self._odd_digests:
+                digests[algorithm] = self._odd_digests[algorithm, position]
+                continue
+            size = self._digest_sizes[algorithm]
+            digests[algorithm] = \
+                stored[position * size:(position + 1) * size].hex()
+        return digests
+
+    def add(
+            self,
+            path: str,
+            algorithm: str,
+            digest: str
+    ) -> typing.Optional[str]:
+        """Add a manifest entry.
+
+        Args:
+            path: path of the file relative to the bag root
+            algorithm: algorithm of the manifest
+            digest: digest in hex
+
+        Returns:
+            The digest already recorded for the file with the same
+            algorithm, which is left in place, or None if there was none
+
+        """
+        key = self._encode(path)
+        position, slot = self._find(key)
+        if position < 0:
+            position = len(self)
+            self._paths += key
+            self._offsets.append(len(self._paths))
+            self._slots[slot] = position + 1
+            if key.decode("utf-8", "surrogateescape") != path:
+                self._originals[position] = path
+            if 2 * len(self) > len(self._slots):
+                self._grow()
+
+        if algorithm not in self._digests:
+            self._digests[algorithm] = bytearray()
+            self._present[algorithm] = bytearray()
+            self._digest_sizes[algorithm] = \
+                hashlib.new(algorithm).digest_size
+        present = self._present[algorithm]
+        byte, bit = position >> 3, 1 << (position & 7)
+        if byte >= len(present):
+            present.extend(bytes(byte + 1 - len(present)))
+        elif present[byte] & bit:
+            return self.digests_at(position)[algorithm]
+        present[byte] |= bit
+
+        stored = self._digests[algorithm]
+        size = self._digest_sizes[algorithm]
+        end = (position + 1) * size
+        if end > len(stored):
+            stored.extend(bytes(end - len(stored)))
+        try:
+            value = bytes.fromhex(digest)
+        except ValueError:
+            value = b""
+        if len(value) == size:
+            stored[end - size:end] = value
+        else:
+            self._odd_digests[algorithm, position] = digest
+        return None
@@ -0,0 +1,238 @@
+import os
+import threading
+import time
+import typing
+
+# Names of the times a bag spends on each kind of work, in seconds
+TIMERS = ["stat_time", "read_time", "hash_time"]
+
+
+class BagMetrics:
+    """Measurements of the work done on a single bag.
+
+    Read and hash time are added up over every file, by whichever threads
+    read and hash them, so for a bag hashed by several threads they can add
+    up to more than the wall time. Files hashed by the process pool shared
+    by bag workers are measured in the workers and added with their results;
+    those hashed by a pool of processes of a single bag are not measured.
+    """
+
+    __slots__ = (
+        "path",
+        "bytes_read",
+        "files_hashed",
+        "stat_time",
+        "read_time",
+        "hash_time",
+        "wall_time",
+        "_started",
+        "_lock",
+    )
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.bytes_read = 0
+        self.files_hashed = 0
+        self.stat_time = 0.0
+        self.read_time = 0.0
+        self.hash_time = 0.0
+        self.wall_time = 0.0
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add_file(self, size: int, read_time: float, hash_time: float) -> None:
+        """Record a file that was read and hashed.
+
+        Args:
+            size: number of bytes read
+            read_time: time spent reading the file, in seconds
+            hash_time: time spent hashing the file, in seconds
+
+        """
+        with self._lock:
+            self.bytes_read += size
+            self.files_hashed += 1
+            self.read_time += read_time
+            self.hash_time += hash_time
+
+    def add_time(self, timer: str, seconds: float) -> None:
+        """Add to one of the TIMERS.
+
+        Args:
+            timer: name of the timer
+            seconds: time to add
+
+        """
+        with self._lock:
+            setattr(self, timer, getattr(self, timer) + seconds)
+
+    def stop(self) -> None:
+        """Record the wall time of the bag."""
+        self.wall_time = time.perf_counter() - self._started
+
+    @property
+    def throughput(self) -> float:
+        """Bytes read per second of wall time."""
+        return self.bytes_read / self.wall_time if self.wall_time else 0.0
+
+    def as_dict(self) -> typing.Dict[str, typing.Union[int, float]]:
+        """Get the measurements as a dictionary.
+
+        Returns:
+            Bytes read, files hashed, each of TIMERS and the wall time in
+            seconds, and the throughput in MB/s
+
+        """
+        return {
+            "bytes_read": self.bytes_read,
+            "files_hashed": self.files_hashed,
+            "stat_time": round(self.stat_time, 6),
+            "read_time": round(self.read_time, 6),
+            "hash_time": round(self.hash_time, 6),
+            "wall_time": round(self.wall_time, 6),
+            "mb_per_second": round(self.throughput / 1e6, 3),
+        }
+
+
+class RunMetrics:
+    """Measurements of a whole run, added up from each bag as it finishes.
+    """
+
+    def __init__(self, bag_workers: int = 1) -> None:
+        """Start measuring a run.
+
+        Args:
+            bag_workers: number of bags processed at the same time
+
+        """
+        self.bag_workers = max(bag_workers, 1)
+        self.bags = 0
+        self.bytes_read = 0
+        self.files_hashed = 0
+        self.stat_time = 0.0
+        self.read_time = 0.0
+        self.hash_time = 0.0
+        self.busy_time = 0.0
+        self.outcomes: typing.Dict[str, int] = {}
+        self._started = time.perf_counter()
+        self.wall_time = 0.0
+        self._lock = threading.Lock()
+
+    def start(self, bag_dir: str) -> BagMetrics:
+        """Start measuring a bag.
+
+        Args:
+            bag_dir: path to the bag
+
+        Returns:
+            Measurements of the bag, to be passed to whatever processes it
+            and filled in while it is
+
+        """
+        return BagMetrics(os.path.abspath(bag_dir))
+
+    def finish(self, bag_metrics: BagMetrics, outcome: str) -> None:
+        """Stop measuring a bag and add its measurements to the run.
+
+        Args:
+            bag_metrics: measurements returned by :py:meth:`start`
+            outcome: what happened to the bag, such as "success"
+
+        """
+        bag_metrics.stop()
+        with self._lock:
+            self.bags += 1
+            self.bytes_read += bag_metrics.bytes_read
+            self.files_hashed += bag_metrics.files_hashed
+            self.stat_time += bag_metrics.stat_time
+            self.read_time += bag_metrics.read_time
+            self.hash_time += bag_metrics.hash_time
+            self.busy_time += bag_metrics.wall_time
+            self.outcomes[outcome] = self.outcomes.get(outcome, 0) + 1
+
+    def stop(self) -> None:
+        """Record the wall time of the run."""
+        self.wall_time = time.perf_counter() - self._started
+
+    @property
+    def throughput(self) -> float:
+        """Bytes read per second of wall time."""
+        return self.bytes_read / self.wall_time if self.wall_time else 0.0
+
+    @property
+    def utilisation(self) -> float:
+        """Fraction of the time the bag workers spent processing bags."""
+        if not self.wall_time:
+            return 0.0
+        return min(self.busy_time / (self.wall_time * self.bag_workers), 1.0)
+
+    def report(self) -> typing.List[str]:
+        """Describe the measurements for the summary report.
+
+        Returns:
+            Lines of the report
+
+        """
+        return [
+            f"Read {self.bytes_read} bytes in {self.files_hashed} files"
+            f" in {self.wall_time:.1f} seconds"
+            f" ({self.throughput / 1e6:.1f} MB/s)",
+            f"Time spent on metadata {self.stat_time:.1f}s,"
+            f" reading {self.read_time:.1f}s,"
+            f" hashing {self.hash_time:.1f}s",
+            f"Bag workers were busy {self.utilisation:.0%} of the time",
+        ]
+
+    def write_textfile(self, path: str, action: str) -> None:
+        """Export the measurements for the Prometheus node exporter.
+
+        The file is written in the text format read by the textfile
+        collector of the node exporter. It is replaced in one step, so the
+        collector never reads half a file.
+
+        Args:
+            path: file to write, ending with .prom
+            action: action of the run, used as a label
+
+        """
+        label = f'{{action="{action}"}}'
+        metrics = [
+            ("bags", "counter", "Bags processed", None),
+            ("bytes_read", "counter", "Bytes read while hashing", None),
+            ("files_hashed", "counter", "Files hashed", None),
+            ("stat_seconds", "counter",
+             "Time spent reading file system metadata", self.stat_time),
+            ("read_seconds", "counter", "Time spent reading files",
+             self.read_time),
+            ("hash_seconds", "counter", "Time spent hashing files",
+             self.hash_time),
+            ("wall_seconds", "gauge", "Wall time of the run",
+             self.wall_time),
+            ("throughput_bytes_per_second", "gauge",
+             "Bytes read per second of wall time", self.throughput),
+            ("worker_utilisation_ratio", "gauge",
+             "Fraction of the time the bag workers were busy",
+             self.utilisation),
+            ("last_run_timestamp_seconds", "gauge",
+             "Time the run finished", time.time()),
+        ]
+        lines = []
+        for name, kind, description, value in metrics:
+            name = f"grabbags_{name}"
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+            if name == "grabbags_bags":
+                for outcome, count in sorted(self.outcomes.items()):
+                    lines.append(
+                        f'{name}{{action="{action}",outcome="{outcome}"}}'
+                        f" {count}"
+                    )
+                continue
+            if value is None:
+                value = getattr(self, name[len("grabbags_"):])
+            lines.append(f"{name}{label} {value}")
+
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as textfile:
+            textfile.write("\n".join(lines) + "\n")
+        os.replace(temp_path, path)
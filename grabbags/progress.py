@@ -0,0 +1,235 @@
+import logging
+import os
+import sys
+import threading
+import time
+import typing
+
+LOGGER = logging.getLogger(__name__)
+
+# Seconds between updates of a progress line on a terminal
+TTY_INTERVAL = 0.5
+
+# Seconds between progress messages in the log
+LOG_INTERVAL = 60.0
+
+
+def format_bytes(count: float) -> str:
+    """Write a number of bytes for people to read.
+
+    Args:
+        count: number of bytes
+
+    Returns:
+        The number with a unit, such as "1.5 GB"
+
+    """
+    for unit in ["B", "KB", "MB", "GB", "TB"]:
+        if abs(count) < 1000 or unit == "TB":
+            break
+        count /= 1000
+    return f"{count:.0f} {unit}" if unit == "B" else f"{count:.1f} {unit}"
+
+
+def format_duration(seconds: float) -> str:
+    """Write a duration as hours, minutes and seconds.
+
+    Args:
+        seconds: duration in seconds
+
+    Returns:
+        The duration, such as "1:02:03"
+
+    """
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class BagProgress:
+    """Bytes hashed so far in a single bag."""
+
+    __slots__ = ("progress", "path", "expected", "done")
+
+    def __init__(self, progress: "Progress", path: str, expected: int) -> None:
+        self.progress = progress
+        self.path = path
+        self.expected = expected
+        self.done = 0
+
+    def add(self, size: int) -> None:
+        """Record that a block of a file of the bag was read and hashed.
+
+        Args:
+            size: size of the block in bytes
+
+        """
+        self.progress.advance(self, size)
+
+
+class Progress:
+    """Progress of a whole run, with its speed and the time left.
+
+    The work is estimated before the run starts, from the Payload-Oxum of
+    existing bags and the size of the files in new ones. Every block hashed
+    moves the progress on, so it keeps moving inside very large files. When
+    a bag finishes, whatever was not hashed of its estimate is counted as
+    done, which covers bags checked without hashing and files hashed by a
+    pool of processes of a single bag. Files hashed by the process pool
+    shared by bag workers move it on as each one is done.
+
+    Progress is shown at most every TTY_INTERVAL seconds as a line that is
+    redrawn in place on a terminal, or as a message every LOG_INTERVAL
+    seconds in the log otherwise. Between updates, recording a block only
+    adds to a counter.
+    """
+
+    def __init__(
+            self,
+            stream: typing.Optional[typing.TextIO] = None,
+            interval: typing.Optional[float] = None
+    ) -> None:
+        """Start tracking progress.
+
+        Args:
+            stream: terminal to draw the progress line on. Defaults to
+                stderr. If it isn't a terminal, progress goes to the log.
+            interval: seconds between updates, instead of the default for
+                a terminal or the log
+
+        """
+        self.stream = stream or sys.stderr
+        self.tty = hasattr(self.stream, "isatty") and self.stream.isatty()
+        if interval is None:
+            interval = TTY_INTERVAL if self.tty else LOG_INTERVAL
+        self.interval = interval
+        self.sizes: typing.Dict[str, int] = {}
+        self.total_bytes = 0
+        self.total_bags = 0
+        self.done_bytes = 0
+        self.done_bags = 0
+        self._started = time.monotonic()
+        self._next_update = self._started + interval
+        self._lock = threading.Lock()
+
+    def set_work(self, sizes: typing.Dict[str, int]) -> None:
+        """Set the work of the run, before it starts.
+
+        Args:
+            sizes: estimated number of bytes to hash in each bag directory,
+                keyed by its path
+
+        """
+        self.sizes = sizes
+        self.total_bytes = sum(sizes.values())
+        self.total_bags = len(sizes)
+        self._started = time.monotonic()
+        self._next_update = self._started + self.interval
+        LOGGER.info(
+            "Found %d directories holding %s",
+            self.total_bags, format_bytes(self.total_bytes)
+        )
+
+    def start_bag(self, bag_dir: str) -> BagProgress:
+        """Start tracking a bag.
+
+        Args:
+            bag_dir: path to the bag
+
+        Returns:
+            Progress of the bag, to be passed to whatever hashes its files
+
+        """
+        return BagProgress(
+            self, os.path.abspath(bag_dir), self.sizes.get(bag_dir, 0)
+        )
+
+    def finish_bag(self, bag_progress: BagProgress) -> None:
+        """Stop tracking a bag and count all of it as done.
+
+        Args:
+            bag_progress: progress returned by :py:meth:`start_bag`
+
+        """
+        with self._lock:
+            self.done_bytes += max(
+                bag_progress.expected - bag_progress.done, 0
+            )
+            self.done_bags += 1
+        self.update()
+
+    def skip_bag(self, bag_dir: str) -> None:
+        """Take a bag that won't be processed out of the work of the run.
+
+        Args:
+            bag_dir: path to the bag
+
+        """
+        with self._lock:
+            self.total_bytes -= self.sizes.get(bag_dir, 0)
+            self.total_bags -= 1
+
+    def advance(self, bag_progress: BagProgress, size: int) -> None:
+        """Record bytes hashed in a bag.
+
+        Args:
+            bag_progress: progress of the bag
+            size: number of bytes
+
+        """
+        with self._lock:
+            bag_progress.done += size
+            self.done_bytes += size
+        if time.monotonic() >= self._next_update:
+            self.update()
+
+    def message(self) -> str:
+        """Describe the progress so far.
+
+        Returns:
+            The bytes and bags done out of the total, the speed and the
+            time left
+
+        """
+        elapsed = time.monotonic() - self._started
+        # the estimate leaves out tag files, so don't go over the total
+        done = min(self.done_bytes, self.total_bytes)
+        rate = done / elapsed if elapsed > 0 else 0.0
+        percent = done / self.total_bytes if self.total_bytes else 1.0
+        if self.done_bags >= self.total_bags:
+            eta = "0:00:00"
+        elif rate > 0:
+            eta = format_duration((self.total_bytes - done) / rate)
+        else:
+            eta = "unknown"
+        return (
+            f"{format_bytes(done)} of {format_bytes(self.total_bytes)}"
+            f" ({percent:.0%}), {self.done_bags} of {self.total_bags} bags,"
+            f" {format_bytes(rate)}/s, ETA {eta}"
+        )
+
+    def update(self, force: bool = False) -> None:
+        """Show the progress, unless it was shown too recently.
+
+        Args:
+            force: show it anyway
+
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and now < self._next_update:
+                return
+            self._next_update = now + self.interval
+            message = self.message()
+        if self.tty:
+            self.stream.write(f"\r\x1b[K{message}")
+            self.stream.flush()
+        else:
+            LOGGER.info("Progress: %s", message)
+
+    def close(self) -> None:
+        """Show the final progress and end the progress line."""
+        if self.tty:
+            self.update(force=True)
+            self.stream.write("\n")
+            self.stream.flush()
@@ -0,0 +1,238 @@
+import enum
+import json
+import threading
+import typing
+
+# Flags of the results of an action that are counted for the summary report
+SUMMARY_FLAGS = ["not_a_bag", "empty_dir", "already_a_bag"]
+
+# Numbers in the results of an action that are added up for the summary
+# report
+SUMMARY_TOTALS = [
+    "files_checked",
+    "files_total",
+    "bytes_checked",
+    "bytes_total",
+]
+
+
+class Outcome(enum.Enum):
+    """What happened to a directory an action was run on."""
+
+    SUCCESS = "success"
+    FAILURE = "failure"
+    SKIPPED = "skipped"
+    NOT_A_BAG = "not_a_bag"
+
+
+# Counter of the summary report for each outcome
+_OUTCOME_COUNTERS = {
+    Outcome.SUCCESS: "successes",
+    Outcome.FAILURE: "failures",
+    Outcome.SKIPPED: "skipped",
+    Outcome.NOT_A_BAG: "not_a_bag",
+}
+
+
+class BagResult:
+    """The part of the results of an action that the summary report needs.
+
+    Only the outcome, the path and a few flags and numbers are kept, instead
+    of the whole results dictionary of the action.
+    """
+
+    __slots__ = ("path", "outcome", "empty_dir", "already_a_bag", "sample")
+
+    def __init__(
+            self,
+            path: str,
+            outcome: typing.Optional[Outcome],
+            empty_dir: bool = False,
+            already_a_bag: bool = False,
+            sample: typing.Optional[typing.Tuple[int, int, int, int]] = None
+    ) -> None:
+        """Create a result.
+
+        Args:
+            path: path to the directory
+            outcome: what happened to the directory, if known
+            empty_dir: whether the directory was skipped for being empty
+            already_a_bag: whether the directory was skipped for already
+                being a bag
+            sample: each of SUMMARY_TOTALS, if the bag was spot checked
+
+        """
+        self.path = path
+        self.outcome = outcome
+        self.empty_dir = empty_dir
+        self.already_a_bag = already_a_bag
+        self.sample = sample
+
+    @classmethod
+    def from_results(
+            cls,
+            results: typing.Mapping[str, typing.Any],
+            outcome: typing.Optional[Outcome] = None
+    ) -> "BagResult":
+        """Keep what the summary report needs from the results of an action.
+
+        Args:
+            results: results dictionary of an action
+            outcome: what happened to the directory. If not given, only a
+                directory that is not a bag has a known outcome.
+
+        Returns:
+            Compact result
+
+        """
+        if outcome is None and results.get("not_a_bag") is True:
+            outcome = Outcome.NOT_A_BAG
+        sample = None
+        if "files_checked" in results:
+            sample = tuple(results.get(total, 0) for total in SUMMARY_TOTALS)
+        return cls(
+            results.get("path"),
+            outcome,
+            empty_dir=results.get("empty_dir") is True,
+            already_a_bag=results.get("already_a_bag") is True,
+            sample=sample
+        )
+
+
+class ResultCounters:
+    """Running counts for the summary report.
+
+    Each result is counted as soon as it comes in, so that the report of a
+    run costs the same no matter how many bags were processed. Counts are
+    looked up by name, like a dictionary: "successes", "failures",
+    "skipped", each of SUMMARY_FLAGS and SUMMARY_TOTALS, and "sampled" for
+    the bags that were spot checked.
+
+    The paths of the empty directories and of the directories that were
+    already bags are kept as well, as they are listed after the report.
+    """
+
+    __slots__ = (
+        "successes",
+        "failures",
+        "skipped",
+        "not_a_bag",
+        "empty_dir",
+        "already_a_bag",
+        "sampled",
+        "files_checked",
+        "files_total",
+        "bytes_checked",
+        "bytes_total",
+        "empty_dirs",
+        "already_bags",
+    )
+
+    def __init__(self) -> None:
+        self.successes = 0
+        self.failures = 0
+        self.skipped = 0
+        self.not_a_bag = 0
+        self.empty_dir = 0
+        self.already_a_bag = 0
+        self.sampled = 0
+        for total in SUMMARY_TOTALS:
+            setattr(self, total, 0)
+        self.empty_dirs: typing.List[str] = []
+        self.already_bags: typing.List[str] = []
+
+    def __getitem__(self, name: str) -> int:
+        return getattr(self, name)
+
+    def add(self, result: BagResult) -> None:
+        """Count the result of one directory.
+
+        Args:
+            result: result to count
+
+        """
+        if result.outcome is not None:
+            counter = _OUTCOME_COUNTERS[result.outcome]
+            setattr(self, counter, getattr(self, counter) + 1)
+        if result.empty_dir:
+            self.empty_dir += 1
+            self.empty_dirs.append(result.path)
+        if result.already_a_bag:
+            self.already_a_bag += 1
+            self.already_bags.append(result.path)
+        if result.sample is not None:
+            self.sampled += 1
+            for total, value in zip(SUMMARY_TOTALS, result.sample):
+                setattr(self, total, getattr(self, total) + value)
+
+
+class ResultSink:
+    """Stream the outcome of each bag to a file of JSON lines.
+
+    Each bag gets one line as soon as it finishes, with its path, the action,
+    the outcome, the size and number of files of its payload and the time
+    the action took. Nothing is kept in memory, so runs over any number of
+    bags use the same amount.
+    """
+
+    def __init__(self, path: str, append: bool = False) -> None:
+        """Open the results file.
+
+        Args:
+            path: location of the file
+            append: add to the lines already in the file, as when a run is
+                resumed, instead of starting it over
+
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def __enter__(self) -> "ResultSink":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def write(
+            self,
+            bag_dir: str,
+            action_type: str,
+            outcome: str,
+            payload: typing.Optional[typing.Tuple[int, int]],
+            duration: float,
+            measurements: typing.Optional[typing.Dict[str, typing.Any]] = None
+    ) -> None:
+        """Write the outcome of a bag.
+
+        Args:
+            bag_dir: path to the bag
+            action_type: action run on the bag
+            outcome: what happened to the bag, such as "success" or "failure"
+            payload: size in bytes and number of files of the payload of the
+                bag, if known
+            duration: time the action took, in seconds
+            measurements: throughput measurements of the bag to add to the
+                line, from :py:meth:`grabbags.metrics.BagMetrics.as_dict`
+
+        """
+        total_bytes, total_files = payload if payload else (None, None)
+        record = {
+            "path": bag_dir,
+            "action": action_type,
+            "outcome": outcome,
+            "bytes": total_bytes,
+            "files": total_files,
+            "duration": round(duration, 6),
+        }
+        if measurements:
+            record.update(measurements)
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        """Close the results file."""
+        with self._lock:
+            self._file.close()
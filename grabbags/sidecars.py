@@ -0,0 +1,187 @@
+import csv
+import hashlib
+import logging
+import os
+import posixpath
+import typing
+
+import bagit
+
+LOGGER = logging.getLogger(__name__)
+
+# Header of the column holding the paths in a checksum CSV, in lower case.
+# The first one found is used.
+PATH_COLUMNS = ["path", "filename", "file", "name"]
+
+Digests = typing.Dict[str, typing.Dict[str, str]]
+
+
+def _is_digest(value: str, algorithm: str) -> bool:
+    try:
+        return len(bytes.fromhex(value)) == \
+            hashlib.new(algorithm).digest_size
+    except ValueError:
+        return False
+
+
+def _column_algorithm(header: str) -> typing.Optional[str]:
+    # vendors write SHA-256, SHA256 or sha256
+    name = header.strip().lower().replace("-", "").replace("_", "")
+    for algorithm in bagit.CHECKSUM_ALGOS:
+        if algorithm.replace("_", "") == name:
+            return algorithm
+    return None
+
+
+def read_sidecar(path: str, algorithm: str) -> typing.Optional[str]:
+    """Read the digest in a sidecar checksum file.
+
+    The digest is the first word of the first line that isn't blank, which
+    covers files holding only the digest as well as the output of md5sum and
+    similar tools.
+
+    Args:
+        path: path to the sidecar file
+        algorithm: algorithm named by the extension of the sidecar file
+
+    Returns:
+        The digest, or None if the file doesn't hold a valid digest
+
+    """
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as sidecar:
+            for line in sidecar:
+                words = line.split()
+                if words:
+                    digest = words[0].lstrip("\\")
+                    if _is_digest(digest, algorithm):
+                        return digest.lower()
+                    break
+    except OSError as error:
+        LOGGER.warning("Can't read %s: %s", path, error)
+        return None
+    LOGGER.warning("%s doesn't hold a valid %s checksum", path, algorithm)
+    return None
+
+
+def read_checksum_csv(path: str) -> Digests:
+    """Read the digests listed in a checksum CSV.
+
+    The first row names the columns. Paths are taken from the first column
+    named in PATH_COLUMNS, in any case, and are relative to the directory
+    of the CSV. Every column named after a checksum algorithm, such as md5
+    or SHA-256, is read as digests. Invalid digests are logged and left
+    out.
+
+    Args:
+        path: path to the CSV file
+
+    Returns:
+        Digests by algorithm, keyed by path relative to the directory of the
+        CSV, with "/" as separator
+
+    """
+    digests: Digests = {}
+    with open(path, "r", encoding="utf-8-sig", newline="") as csv_file:
+        reader = csv.reader(csv_file)
+        header = next(reader, [])
+        names = [column.strip().lower() for column in header]
+        path_column = next(
+            (names.index(name) for name in PATH_COLUMNS if name in names),
+            None
+        )
+        if path_column is None:
+            LOGGER.warning("%s has no column of paths", path)
+            return digests
+        algorithms = {
+            column: _column_algorithm(name)
+            for column, name in enumerate(header)
+            if _column_algorithm(name) is not None
+        }
+        for row in reader:
+            if len(row) <= path_column or not row[path_column].strip():
+                continue
+            rel_path = posixpath.normpath(
+                row[path_column].strip().replace("\\", "/")
+            )
+            for column, algorithm in algorithms.items():
+                value = row[column].strip() if column < len(row) else ""
+                if not value:
+                    continue
+                if not _is_digest(value, algorithm):
+                    LOGGER.warning(
+                        "%s: invalid %s checksum for %s: %s",
+                        path, algorithm, rel_path, value
+                    )
+                    continue
+                digests.setdefault(rel_path, {})[algorithm] = value.lower()
+    return digests
+
+
+def collect_digests(
+        files: typing.Iterable[typing.Tuple[str, int]],
+        bag_dir: str,
+        use_sidecars: bool = True,
+        csv_name: typing.Optional[str] = None
+) -> Digests:
+    """Gather the digests written next to the files of a directory.
+
+    A sidecar file is named after the file it describes with the name of the
+    algorithm added as an extension, such as image.tif.md5 or
+    image.tif.sha256. Checksum CSVs named csv_name are read wherever they
+    are in the directory. Sidecar files and CSVs are left in place, so they
+    become part of the payload like any other file. When a file has a digest
+    in both, the sidecar file wins.
+
+    Args:
+        files: payload files of the directory, as found by
+            :py:func:`grabbags.bags.prepare_tree`
+        bag_dir: path to the directory
+        use_sidecars: read sidecar files
+        csv_name: name of the checksum CSVs to read, if any
+
+    Returns:
+        Digests by algorithm, keyed by the path each file will have once
+        bagged
+
+    """
+    payload_prefix = "data/"
+    rel_paths = [rel_path for rel_path, _ in files]
+    by_normalized = {
+        bagit.normalize_unicode(rel_path): rel_path for rel_path in rel_paths
+    }
+    digests: Digests = {}
+    if csv_name is not None:
+        for rel_path in rel_paths:
+            if posixpath.basename(rel_path) != csv_name:
+                continue
+            csv_dir = posixpath.dirname(rel_path)
+            listed = read_checksum_csv(
+                os.path.join(bag_dir, rel_path[len(payload_prefix):])
+            )
+            for listed_path, listed_digests in listed.items():
+                target = by_normalized.get(bagit.normalize_unicode(
+                    posixpath.normpath(posixpath.join(csv_dir, listed_path))
+                ))
+                if target is None:
+                    LOGGER.warning(
+                        "%s lists %s, which isn't in %s",
+                        rel_path, listed_path, bag_dir
+                    )
+                    continue
+                digests.setdefault(target, {}).update(listed_digests)
+
+    if use_sidecars:
+        present = set(rel_paths)
+        for rel_path in rel_paths:
+            for algorithm in bagit.CHECKSUM_ALGOS:
+                sidecar_path = f"{rel_path}.{algorithm}"
+                if sidecar_path not in present:
+                    continue
+                digest = read_sidecar(
+                    os.path.join(bag_dir, sidecar_path[len(payload_prefix):]),
+                    algorithm
+                )
+                if digest is not None:
+                    digests.setdefault(rel_path, {})[algorithm] = digest
+    return digests
@@ -2,9 +2,9 @@ import os
 import re
 import logging
 import abc
+import concurrent.futures
 import shutil
 import typing
-import subprocess
 try:
     from importlib import metadata
 except ImportError:
@@ -22,6 +22,27 @@ SYSTEM_FILES = [
 
 APPLE_DOUBLE_REGEX = re.compile(r"^\._.*$")
 
+# Precomputed forms of the patterns above, for checking names quickly
+_SYSTEM_FILE_NAMES = frozenset(SYSTEM_FILES)
+APPLE_DOUBLE_PREFIX = "._"
+
+
+def is_system_file_name(filename: str) -> bool:
+    """Check if a file name belongs to a system file, without touching disk.
+
+    Use this instead of :py:func:`is_system_file` when it is already known
+    that the name belongs to a file and not a directory.
+
+    Args:
+        filename: name of the file, without any directories
+
+    Returns:
+        True if the name is one of a system file, False if it's not
+
+    """
+    return filename in _SYSTEM_FILE_NAMES or \
+        filename.startswith(APPLE_DOUBLE_PREFIX)
+
 
 def is_system_file(file_path) -> bool:
     """Check if a given file is a system file
@@ -47,18 +68,116 @@ def is_system_file(file_path) -> bool:
         return False
 
     root_path, filename = os.path.split(file_path)
+    return is_system_file_name(filename)
+
+
+class SweepResult(typing.NamedTuple):
+    """System files removed from a directory tree."""
+
+    #: number of files removed
+    files_removed: int
+
+    #: total size of the files removed in bytes
+    bytes_removed: int
 
-    if filename in SYSTEM_FILES:
-        return True
 
-    res = APPLE_DOUBLE_REGEX.findall(filename)
-    if len(res) > 0:
-        return True
+ScanResult = typing.TypeVar("ScanResult")
 
-    return False
 
+def scan_tree(
+        scan: typing.Callable[
+            [str], typing.Tuple[ScanResult, typing.List[str]]
+        ],
+        root: str,
+        threads: int = 1
+) -> typing.Dict[str, ScanResult]:
+    """Scan a directory and all of its subdirectories, one task per directory.
 
-def remove_system_files(root) -> None:
+    Args:
+        scan: function which scans a single directory and returns its result
+            with the subdirectories that should be scanned next
+        root: directory to start from
+        threads: number of threads scanning directories in parallel
+
+    Returns:
+        The result of each directory scanned, keyed by its path
+
+    """
+    results: typing.Dict[str, ScanResult] = {}
+    if threads <= 1:
+        pending = [root]
+        while pending:
+            path = pending.pop()
+            results[path], subdirs = scan(path)
+            pending.extend(subdirs)
+        return results
+
+    with concurrent.futures.ThreadPoolExecutor(
+            max_workers=threads,
+            thread_name_prefix="grabbags-scan"
+    ) as executor:
+        running = {executor.submit(scan, root): root}
+        while running:
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                path = running.pop(future)
+                results[path], subdirs = future.result()
+                for subdir in subdirs:
+                    running[executor.submit(scan, subdir)] = subdir
+    return results
+
+
+def remove_system_file(entry: os.DirEntry, log_each: bool = False) -> int:
+    """Remove a file which is known to be a system file.
+
+    Args:
+        entry: directory entry of the file
+        log_each: log a warning for the file instead of a debug message
+
+    Returns:
+        The size of the file removed in bytes
+
+    """
+    size = entry.stat(follow_symlinks=False).st_size
+    LOGGER.log(
+        logging.WARNING if log_each else logging.DEBUG,
+        "Removing %s", entry.path
+    )
+    os.remove(entry.path)
+    return size
+
+
+def _sweep_directory(
+        path: str,
+        log_each: bool
+) -> typing.Tuple[typing.Tuple[int, int], typing.List[str]]:
+    files_removed = 0
+    bytes_removed = 0
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                # classify like os.walk does: symlinks to directories are
+                # neither followed nor treated as files
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                if is_system_file_name(entry.name):
+                    bytes_removed += remove_system_file(entry, log_each)
+                    files_removed += 1
+    except OSError as error:
+        LOGGER.warning("Unable to read %s: %s", path, error)
+    return (files_removed, bytes_removed), subdirs
+
+
+def remove_system_files(
+        root: str,
+        threads: int = 1,
+        log_each: bool = False
+) -> SweepResult:
     """
     Remove system nested within a directory. Files such as DS_Store & Thumbs.db
 
@@ -68,15 +187,21 @@ def remove_system_files(root) -> None:
 
     Args:
         root: path to a folder
+        threads: number of threads sweeping subdirectories in parallel
+        log_each: log a warning for every file removed, instead of only
+            logging them at debug level
 
-    """
-    for root, dirs, files in os.walk(root):
-        for file_ in files:
-            full_path = os.path.join(root, file_)
+    Returns:
+        The number of files removed and the space reclaimed
 
-            if is_system_file(full_path):
-                LOGGER.warn("Removing {}".format(full_path))
-                os.remove(full_path)
+    """
+    results = scan_tree(
+        lambda path: _sweep_directory(path, log_each), root, threads
+    )
+    return SweepResult(
+        files_removed=sum(count for count, _ in results.values()),
+        bytes_removed=sum(size for _, size in results.values())
+    )
 
 
 class InvalidStrategy(Exception):
@@ -130,6 +255,8 @@ class VersionFromGitCommit(VersionStrategy):
         Returns: Returns a hash value from the head
 
         """
+        # only needed here, so it isn't imported every time grabbags starts
+        import subprocess
         try:
             git_commit_hash_command = [
                 git_exec,
@@ -1,9 +1,12 @@
+import hashlib
 import os
 
+import bagit
 import pytest
 import shutil
 import grabbags.bags
 import pathlib
+from unittest.mock import Mock
 
 
 @pytest.fixture()
@@ -67,3 +70,567 @@ def test_validate_bag(sample_bags):
         bag_dir = os.path.join(data_dir, invalid['root'])
         assert os.path.exists(bag_dir)
         assert grabbags.bags.is_bag(bag_dir) is False
+
+
+def test_make_bag_is_valid(tmpdir):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "somefile.txt").ensure().write_text(
+        "some data", encoding="utf-8"
+    )
+    (bag_dir / "subdir" / "otherfile.txt").ensure()
+
+    bag = grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+
+    assert (bag_dir / "data" / "subdir" / "otherfile.txt").exists()
+    assert bag.info["Payload-Oxum"] == "9.2"
+    assert bag.validate() is True
+
+
+def test_make_bag_matches_bagit(tmpdir):
+    for name in ["bagit", "grabbags"]:
+        bag_dir = tmpdir / name
+        (bag_dir / "somefile.txt").write_text(
+            "some data", encoding="utf-8", ensure=True
+        )
+        (bag_dir / "subdir" / "otherfile.txt").write_binary(
+            b"other", ensure=True
+        )
+        (bag_dir / "subdir" / "empty.txt").ensure()
+        (bag_dir / "sp\u00e4ce name.txt").write_binary(b"x")
+    bag_info = {"Source-Organization": "Somewhere", "Contact-Name": "Someone"}
+    bagit.make_bag(
+        (tmpdir / "bagit").strpath, bag_info=dict(bag_info),
+        checksums=["md5", "sha512"]
+    )
+    grabbags.bags.make_bag(
+        (tmpdir / "grabbags").strpath, bag_info=dict(bag_info),
+        checksums=["md5", "sha512"]
+    )
+
+    expected = sorted(
+        path.relto(tmpdir / "bagit") for path in (tmpdir / "bagit").visit()
+    )
+    assert sorted(
+        path.relto(tmpdir / "grabbags")
+        for path in (tmpdir / "grabbags").visit()
+    ) == expected
+    for rel_path in expected:
+        expected_path = tmpdir / "bagit" / rel_path
+        if expected_path.isdir():
+            continue
+        lines = (tmpdir / "grabbags" / rel_path).read_binary().splitlines()
+        expected_lines = expected_path.read_binary().splitlines()
+        if rel_path.startswith("tagmanifest-"):
+            # bagit lists the tag files in the order the directory has them
+            lines.sort()
+            expected_lines.sort()
+        assert lines == expected_lines, rel_path
+
+
+def test_make_bag_trusted_digests(tmpdir, monkeypatch):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "a.txt").ensure().write_text("aaa", encoding="utf-8")
+    (bag_dir / "b.txt").ensure().write_text("bbb", encoding="utf-8")
+    trusted = {"data/a.txt": {"md5": hashlib.md5(b"aaa").hexdigest()}}
+    hash_payload_file = Mock(
+        side_effect=grabbags.bags.hashing.hash_payload_file
+    )
+    monkeypatch.setattr(
+        grabbags.bags.hashing, "hash_payload_file", hash_payload_file
+    )
+
+    bag = grabbags.bags.make_bag(
+        bag_dir.strpath, checksums=["md5"], trusted=trusted
+    )
+
+    hash_payload_file.assert_called_once_with(
+        (bag.path, "data/b.txt", ["md5"])
+    )
+    assert bag.info["Payload-Oxum"] == "6.2"
+    assert bag.validate() is True
+
+
+def test_verify_trusted_digests(tmpdir):
+    bag_dir = tmpdir / "bag"
+    for num in range(4):
+        (bag_dir / f"file{num}.txt").ensure().write_text(
+            str(num), encoding="utf-8"
+        )
+    prepared = grabbags.bags.prepare_tree(bag_dir.strpath)
+    trusted = {
+        f"data/file{num}.txt": {
+            "md5": hashlib.md5(str(num).encode()).hexdigest()
+        }
+        for num in range(4)
+    }
+    summary = grabbags.bags.verify_trusted_digests(
+        prepared, trusted, grabbags.bags.SamplePolicy(fraction=0.5)
+    )
+    assert summary == (2, 4, 2, 4)
+
+    trusted["data/file3.txt"]["md5"] = "0" * 32
+    with pytest.raises(grabbags.bags.bagit.BagError):
+        grabbags.bags.verify_trusted_digests(
+            prepared, trusted, grabbags.bags.SamplePolicy(fraction=1)
+        )
+    assert not (bag_dir / "data").exists()
+
+
+def test_update_bag(tmpdir, monkeypatch):
+    bag_dir = tmpdir / "bag"
+    for name in ["keep.txt", "change.txt", "remove.txt"]:
+        (bag_dir / name).ensure().write_text(name, encoding="utf-8")
+    grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5", "sha256"])
+    # the payload was written well before the manifests
+    for path in (bag_dir / "data").visit(fil=lambda p: p.isfile()):
+        os.utime(path.strpath, (0, 0))
+    assert grabbags.bags.update_bag(bag_dir.strpath) == ([], [], [], 3)
+
+    (bag_dir / "data" / "change.txt").write_text("changed", encoding="utf-8")
+    (bag_dir / "data" / "remove.txt").remove()
+    (bag_dir / "data" / "sub" / "new.txt").ensure().write_text(
+        "new", encoding="utf-8"
+    )
+    hash_payload_file = Mock(
+        side_effect=grabbags.bags.hashing.hash_payload_file
+    )
+    monkeypatch.setattr(
+        grabbags.bags.hashing, "hash_payload_file", hash_payload_file
+    )
+
+    result = grabbags.bags.update_bag(bag_dir.strpath)
+
+    assert result == (
+        [os.path.join("data", "sub", "new.txt")],
+        [os.path.join("data", "change.txt")],
+        [os.path.join("data", "remove.txt")],
+        1
+    )
+    assert hash_payload_file.call_count == 2
+    bag = grabbags.bags.bagit.Bag(bag_dir.strpath)
+    assert bag.info["Payload-Oxum"] == "18.3"
+    assert bag.validate() is True
+    assert not [
+        name for name in os.listdir(bag_dir.strpath)
+        if name.endswith(grabbags.bags.TEMP_FILE_SUFFIX)
+    ]
+
+
+def test_update_bag_size_changed_with_same_mtime(tmpdir, monkeypatch):
+    bag_dir = tmpdir / "bag"
+    for name in ["keep.txt", "change.txt"]:
+        (bag_dir / name).ensure().write_text(name, encoding="utf-8")
+    grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    # an algorithm only used for the tag files doesn't need the payload
+    # hashed again
+    grabbags.bags.write_tagmanifests(bag_dir.strpath, ["md5", "sha256"])
+    for path in (bag_dir / "data").visit(fil=lambda p: p.isfile()):
+        os.utime(path.strpath, (0, 0))
+    hash_payload_file = Mock(
+        side_effect=grabbags.bags.hashing.hash_payload_file
+    )
+    monkeypatch.setattr(
+        grabbags.bags.hashing, "hash_payload_file", hash_payload_file
+    )
+    assert grabbags.bags.update_bag(bag_dir.strpath) == ([], [], [], 2)
+    assert hash_payload_file.call_count == 0
+
+    (bag_dir / "data" / "change.txt").write_text(
+        "changed and longer", encoding="utf-8"
+    )
+    os.utime((bag_dir / "data" / "change.txt").strpath, (0, 0))
+
+    result = grabbags.bags.update_bag(bag_dir.strpath)
+
+    assert result == ([], [os.path.join("data", "change.txt")], [], 1)
+    assert hash_payload_file.call_count == 2
+    bag = grabbags.bags.bagit.Bag(bag_dir.strpath)
+    assert bag.algorithms == ["md5", "sha256"]
+    assert bag.validate() is True
+
+
+def test_update_bag_interrupted_before_swap(tmpdir, monkeypatch):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "file.txt").ensure().write_text("file", encoding="utf-8")
+    grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    (bag_dir / "data" / "new.txt").write_text("new", encoding="utf-8")
+    with monkeypatch.context() as patch:
+        patch.setattr(
+            grabbags.bags, "write_tagmanifests", Mock(side_effect=OSError)
+        )
+        with pytest.raises(OSError):
+            grabbags.bags.update_bag(bag_dir.strpath)
+    assert (bag_dir / ("manifest-md5.txt" + grabbags.bags.TEMP_FILE_SUFFIX))\
+        .exists()
+
+    # the incomplete update is dropped and done again
+    result = grabbags.bags.update_bag(bag_dir.strpath)
+    assert result.added == [os.path.join("data", "new.txt")]
+    assert grabbags.bags.bagit.Bag(bag_dir.strpath).validate() is True
+    assert not [
+        name for name in os.listdir(bag_dir.strpath)
+        if name.endswith(grabbags.bags.TEMP_FILE_SUFFIX)
+    ]
+
+
+def test_update_bag_interrupted_during_swap(tmpdir, monkeypatch):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "file.txt").ensure().write_text("file", encoding="utf-8")
+    grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    for path in (bag_dir / "data").visit(fil=lambda p: p.isfile()):
+        os.utime(path.strpath, (0, 0))
+    (bag_dir / "data" / "new.txt").write_text("new", encoding="utf-8")
+    replace = os.replace
+    replaced = []
+
+    def replace_once(src, dst):
+        if replaced:
+            raise OSError("interrupted")
+        replaced.append(dst)
+        replace(src, dst)
+
+    with monkeypatch.context() as patch:
+        patch.setattr(os, "replace", replace_once)
+        with pytest.raises(OSError):
+            grabbags.bags.update_bag(bag_dir.strpath)
+    assert (bag_dir / grabbags.bags.UPDATE_MARKER).exists()
+    os.utime((bag_dir / "data" / "new.txt").strpath, (0, 0))
+
+    # the complete update is finished before the bag is looked at
+    assert grabbags.bags.update_bag(bag_dir.strpath) == ([], [], [], 2)
+    assert grabbags.bags.bagit.Bag(bag_dir.strpath).validate() is True
+    assert not (bag_dir / grabbags.bags.UPDATE_MARKER).exists()
+
+
+def test_make_bag_failure_restores_directory(tmpdir, monkeypatch):
+    from grabbags import hashing
+
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "somefile.txt").write_text(
+        "some data", encoding="utf-8", ensure=True
+    )
+    (bag_dir / "subdir" / "otherfile.txt").write_binary(b"x", ensure=True)
+    before = sorted(path.relto(bag_dir) for path in bag_dir.visit())
+
+    def fail(task, recorder=None, tracker=None):
+        raise OSError("disk went away")
+
+    monkeypatch.setattr(hashing, "hash_payload_file", fail)
+    with pytest.raises(OSError):
+        grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    assert sorted(path.relto(bag_dir) for path in bag_dir.visit()) == before
+
+    monkeypatch.undo()
+    bag = grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    assert bag.validate() is True
+
+
+def test_make_bag_keeps_working_directory(tmpdir, monkeypatch):
+    (tmpdir / "bag" / "somefile.txt").ensure()
+    monkeypatch.chdir(tmpdir)
+    chdir = Mock()
+    monkeypatch.setattr(os, "chdir", chdir)
+
+    grabbags.bags.make_bag((tmpdir / "bag").strpath)
+
+    chdir.assert_not_called()
+
+
+def test_estimate_size_uses_payload_oxum(tmpdir):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "data").ensure_dir()
+    (bag_dir / "bagit.txt").ensure()
+    (bag_dir / "bag-info.txt").write_text(
+        "Payload-Oxum: 12345.6\n", encoding="utf-8"
+    )
+    assert grabbags.bags.payload_oxum(bag_dir.strpath) == (12345, 6)
+    assert grabbags.bags.estimate_size(bag_dir.strpath) == 12345
+
+
+def test_estimate_size_new_bag(tmpdir):
+    (tmpdir / "somefile.txt").write_binary(b"x" * 10)
+    (tmpdir / "subdir" / "otherfile.txt").ensure().write_binary(b"x" * 5)
+    assert grabbags.bags.payload_oxum(tmpdir.strpath) is None
+    assert grabbags.bags.estimate_size(tmpdir.strpath) == 15
+
+
+def test_bag_validates_with_executor(tmpdir):
+    import concurrent.futures
+    import bagit
+    (tmpdir / "bag" / "somefile.txt").ensure().write_text(
+        "some data", encoding="utf-8"
+    )
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        grabbags.bags.make_bag(
+            (tmpdir / "bag").strpath, executor=executor
+        )
+        bag = grabbags.bags.Bag((tmpdir / "bag").strpath, executor=executor)
+        assert bag.validate() is True
+
+        (tmpdir / "bag" / "data" / "somefile.txt").write_text(
+            "changed!!", encoding="utf-8"
+        )
+        with pytest.raises(bagit.BagValidationError):
+            bag.validate()
+
+
+def test_bag_trusts_checksum_cache(tmpdir, monkeypatch):
+    from grabbags import hashing
+    from grabbags.cache import ChecksumCache
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "somefile.txt").ensure().write_text(
+        "some data", encoding="utf-8"
+    )
+    grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+
+    calc_hashes = Mock(wraps=hashing.verify_payload_file)
+    monkeypatch.setattr(hashing, "verify_payload_file", calc_hashes)
+    with ChecksumCache((tmpdir / "cache.db").strpath) as checksum_cache:
+        grabbags.bags.Bag(
+            bag_dir.strpath, checksum_cache=checksum_cache, trust_cache=True
+        ).validate()
+        assert calc_hashes.call_count > 0
+
+        calc_hashes.reset_mock()
+        grabbags.bags.Bag(
+            bag_dir.strpath, checksum_cache=checksum_cache, trust_cache=True
+        ).validate()
+        calc_hashes.assert_not_called()
+
+        os.utime((bag_dir / "data" / "somefile.txt").strpath, (0, 0))
+        grabbags.bags.Bag(
+            bag_dir.strpath, checksum_cache=checksum_cache, trust_cache=True
+        ).validate()
+        assert calc_hashes.call_count == 1
+
+
+def test_restore_unfinished_bag_temp_dir(tmpdir):
+    temp_dir = tmpdir / (grabbags.bags.TEMP_DATA_PREFIX + "abc")
+    (temp_dir / "moved.txt").ensure()
+    (tmpdir / "not_moved.txt").ensure()
+    (tmpdir / grabbags.bags.UNFINISHED_MARKER).ensure()
+
+    assert grabbags.bags.restore_unfinished_bag(tmpdir.strpath) is True
+    assert sorted(os.listdir(tmpdir.strpath)) == ["moved.txt", "not_moved.txt"]
+
+
+def test_restore_unfinished_bag_data_dir(tmpdir):
+    (tmpdir / "data" / "somefile.txt").ensure()
+    (tmpdir / "data" / "data" / "nested.txt").ensure()
+    (tmpdir / "manifest-md5.txt").ensure()
+    (tmpdir / "bagit.txt").ensure()
+    (tmpdir / grabbags.bags.UNFINISHED_MARKER).ensure()
+
+    assert grabbags.bags.restore_unfinished_bag(tmpdir.strpath) is True
+    assert sorted(os.listdir(tmpdir.strpath)) == ["data", "somefile.txt"]
+    assert (tmpdir / "data" / "nested.txt").exists()
+
+
+def test_restore_unfinished_bag_unmarked(tmpdir):
+    (tmpdir / "notes.txt").write_text("top", encoding="utf-8")
+    (tmpdir / "data" / "notes.txt").write_text("nested", encoding="utf-8",
+                                               ensure=True)
+    (tmpdir / "manifest-md5.txt").ensure()
+    (tmpdir / (grabbags.bags.TEMP_DATA_PREFIX + "abc") / "x.txt").ensure()
+
+    assert grabbags.bags.restore_unfinished_bag(tmpdir.strpath) is False
+    assert (tmpdir / "notes.txt").read_text(encoding="utf-8") == "top"
+    assert (tmpdir / "data" / "notes.txt").read_text(encoding="utf-8") == \
+        "nested"
+    assert (tmpdir / "manifest-md5.txt").exists()
+
+
+def test_restore_unfinished_bag_conflict(tmpdir):
+    (tmpdir / "notes.txt").write_text("top", encoding="utf-8")
+    (tmpdir / "data" / "notes.txt").write_text("nested", encoding="utf-8",
+                                               ensure=True)
+    (tmpdir / grabbags.bags.UNFINISHED_MARKER).ensure()
+
+    with pytest.raises(bagit.BagError):
+        grabbags.bags.restore_unfinished_bag(tmpdir.strpath)
+    assert (tmpdir / "notes.txt").read_text(encoding="utf-8") == "top"
+    assert (tmpdir / grabbags.bags.UNFINISHED_MARKER).exists()
+
+
+def test_restore_unfinished_bag_complete(tmpdir):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "somefile.txt").ensure()
+    grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    assert not (bag_dir / grabbags.bags.UNFINISHED_MARKER).exists()
+
+    assert grabbags.bags.restore_unfinished_bag(bag_dir.strpath) is False
+    assert grabbags.bags.is_bag(bag_dir.strpath)
+
+    # a valid bag without tagmanifests is left alone
+    for tagmanifest in bag_dir.listdir("tagmanifest-*"):
+        tagmanifest.remove()
+    assert grabbags.bags.restore_unfinished_bag(bag_dir.strpath) is False
+    assert grabbags.bags.is_bag(bag_dir.strpath)
+
+
+@pytest.mark.parametrize("dry_run", [False, True])
+def test_clean_payload(tmpdir, dry_run):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "somefile.txt").ensure()
+    (bag_dir / ".DS_Store").ensure()
+    bag = grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    (bag_dir / "data" / "subdir" / "Thumbs.db").ensure().write_text(
+        "thumbs", encoding="utf-8"
+    )
+    (bag_dir / "data" / "extra.txt").ensure()
+
+    result = grabbags.bags.clean_payload(bag, dry_run=dry_run)
+
+    assert result.removed == [os.path.join("data", "subdir", "Thumbs.db")]
+    assert result.unexpected == [os.path.join("data", "extra.txt")]
+    assert result.bytes_removed == 6
+    assert (bag_dir / "data" / ".DS_Store").exists()
+    assert (bag_dir / "data" / "subdir" / "Thumbs.db").exists() is dry_run
+
+
+def test_clean_payload_normalizes_unicode(tmpdir):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "caf\u00e9.txt").ensure()
+    bag = grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    os.rename(
+        (bag_dir / "data" / "caf\u00e9.txt").strpath,
+        (bag_dir / "data" / "cafe\u0301.txt").strpath
+    )
+
+    result = grabbags.bags.clean_payload(bag)
+
+    assert result.removed == []
+    assert result.unexpected == []
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_prepare_tree(tmpdir, threads):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "b.txt").ensure().write_text("bb", encoding="utf-8")
+    (bag_dir / "a" / "z.txt").ensure().write_text("z", encoding="utf-8")
+    (bag_dir / "a" / "b" / "c.txt").ensure()
+    (bag_dir / "a" / "Thumbs.db").ensure().write_text("123", encoding="utf-8")
+    (bag_dir / "._b.txt").ensure()
+
+    prepared = grabbags.bags.prepare_tree(
+        bag_dir.strpath, remove_system_files=True, threads=threads
+    )
+
+    assert sorted(prepared.entries) == ["a", "b.txt"]
+    assert prepared.system_files == (2, 3)
+    assert prepared.total_bytes == 3
+    assert not (bag_dir / "a" / "Thumbs.db").exists()
+
+    grabbags.bags.make_bag(
+        bag_dir.strpath, checksums=["md5"], prepared=prepared
+    )
+    assert [path for path, _ in prepared.files] == \
+        list(grabbags.bags.payload_files(bag_dir.strpath))
+
+
+def test_prepare_tree_skips_bags(tmpdir):
+    bag_dir = tmpdir / "bag"
+    (bag_dir / "somefile.txt").ensure()
+    grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+    (bag_dir / "data" / "Thumbs.db").ensure()
+
+    prepared = grabbags.bags.prepare_tree(
+        bag_dir.strpath, remove_system_files=True
+    )
+
+    assert prepared.already_a_bag is True
+    assert (bag_dir / "data" / "Thumbs.db").exists()
+    with pytest.raises(grabbags.bags.bagit.BagError):
+        grabbags.bags.make_bag(bag_dir.strpath, prepared=prepared)
+
+
+def test_prepare_tree_empty(tmpdir):
+    prepared = grabbags.bags.prepare_tree(tmpdir.strpath)
+    assert prepared.empty is True
+    assert prepared.already_a_bag is False
+
+
+def make_sample_bag(bag_dir, files=10):
+    for num in range(files):
+        (bag_dir / f"file{num}.txt").ensure().write_text(
+            "x" * num, encoding="utf-8"
+        )
+    return grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5"])
+
+
+def test_bag_sample_fraction(tmpdir):
+    make_sample_bag(tmpdir / "bag")
+    policy = grabbags.bags.SamplePolicy(fraction=0.25, seed="abc")
+
+    bag = grabbags.bags.Bag((tmpdir / "bag").strpath, sample=policy)
+    bag.validate()
+    again = grabbags.bags.Bag((tmpdir / "bag").strpath, sample=policy)
+    again.validate()
+
+    assert bag.stage == "payload fixity"
+    assert bag.sample_summary.files_checked == 3
+    assert bag.sample_summary.files_total == 10
+    assert bag.sample_summary.bytes_total == 45
+    assert bag.sample_summary == again.sample_summary
+
+
+def test_bag_sample_bytes(tmpdir):
+    make_sample_bag(tmpdir / "bag")
+    bag = grabbags.bags.Bag(
+        (tmpdir / "bag").strpath,
+        sample=grabbags.bags.SamplePolicy(max_bytes=20)
+    )
+    bag.validate()
+    assert bag.sample_summary.bytes_checked >= 20
+    assert bag.sample_summary.files_checked < 10
+
+
+def test_bag_sample_checks_tags_first(tmpdir, monkeypatch):
+    make_sample_bag(tmpdir / "bag")
+    with open((tmpdir / "bag" / "bag-info.txt").strpath, "a") as bag_info:
+        bag_info.write("Extra-Field: changed\n")
+    verify = Mock(wraps=grabbags.bags.hashing.verify_payload_file)
+    monkeypatch.setattr(grabbags.bags.hashing, "verify_payload_file", verify)
+
+    bag = grabbags.bags.Bag(
+        (tmpdir / "bag").strpath,
+        sample=grabbags.bags.SamplePolicy(fraction=1)
+    )
+    with pytest.raises(grabbags.bags.bagit.BagValidationError):
+        bag.validate()
+    assert bag.stage == "tag fixity"
+    assert not any(
+        call[0][0][1].startswith("data") for call in verify.call_args_list
+    )
+
+
+def test_corruption_bound():
+    assert grabbags.bags.corruption_bound(0) == 1.0
+    assert grabbags.bags.corruption_bound(300) == pytest.approx(0.00994, 0.01)
+
+
+def test_bag_verify_algorithm(tmpdir, monkeypatch):
+    bag_dir = tmpdir / "bag"
+    make_sample_bag(bag_dir)
+    verify = Mock(wraps=grabbags.bags.hashing.verify_payload_file)
+    monkeypatch.setattr(grabbags.bags.hashing, "verify_payload_file", verify)
+    with open((bag_dir / "manifest-sha256.txt").strpath, "w") as manifest:
+        for num in range(5):
+            rel_path = f"data/file{num}.txt"
+            with open((bag_dir / rel_path).strpath, "rb") as payload:
+                digest = hashlib.sha256(payload.read()).hexdigest()
+            manifest.write(f"{digest}  {rel_path}\n")
+
+    bag = grabbags.bags.Bag(bag_dir.strpath, verify_algorithm="strongest")
+    assert bag.validate() is True
+    assert bag.verified_algorithm == "sha256"
+    algorithms = {
+        call[0][0][1]: call[0][0][3] for call in verify.call_args_list
+    }
+    assert algorithms[os.path.join("data", "file0.txt")] == ["sha256"]
+    assert sorted(algorithms[os.path.join("data", "file9.txt")]) == \
+        ["md5", "sha256"]
+
+    bag = grabbags.bags.Bag(bag_dir.strpath, verify_algorithm="sha1")
+    assert bag.validate() is True
+    assert bag.verified_algorithm is None
@@ -0,0 +1,45 @@
+import os
+
+from grabbags import cache
+
+
+def test_lookup_after_store(tmpdir):
+    sample = tmpdir / "sample.txt"
+    sample.write_text("data", encoding="utf-8")
+    with cache.ChecksumCache((tmpdir / "cache.db").strpath) as checksums:
+        stat_result = os.stat(sample.strpath)
+        assert checksums.lookup(stat_result, "md5") is None
+        checksums.store([(stat_result, {"md5": "abc"})])
+        assert checksums.lookup(stat_result, "md5") == "abc"
+        assert checksums.lookup(stat_result, "sha256") is None
+
+
+def test_lookup_changed_file(tmpdir):
+    sample = tmpdir / "sample.txt"
+    sample.write_text("data", encoding="utf-8")
+    with cache.ChecksumCache((tmpdir / "cache.db").strpath) as checksums:
+        checksums.store([(os.stat(sample.strpath), {"md5": "abc"})])
+        sample.write_text("more data", encoding="utf-8")
+        assert checksums.lookup(os.stat(sample.strpath), "md5") is None
+
+
+def test_lookup_expired(tmpdir):
+    sample = tmpdir / "sample.txt"
+    sample.write_text("data", encoding="utf-8")
+    database = (tmpdir / "cache.db").strpath
+    with cache.ChecksumCache(database) as checksums:
+        checksums.store([(os.stat(sample.strpath), {"md5": "abc"})])
+
+    with cache.ChecksumCache(database, max_age=0) as checksums:
+        assert checksums.lookup(os.stat(sample.strpath), "md5") is None
+
+
+def test_cache_persists(tmpdir):
+    sample = tmpdir / "sample.txt"
+    sample.write_text("data", encoding="utf-8")
+    database = (tmpdir / "cache.db").strpath
+    with cache.ChecksumCache(database) as checksums:
+        checksums.store([(os.stat(sample.strpath), {"md5": "abc"})])
+
+    with cache.ChecksumCache(database, max_age=60) as checksums:
+        assert checksums.lookup(os.stat(sample.strpath), "md5") == "abc"
@@ -0,0 +1,136 @@
+import os
+
+import bagit
+import pytest
+
+import grabbags.bags
+from grabbags import completeness
+
+
+def test_external_sort():
+    records = [(f"{num % 7}\n{num}", str(num)) for num in range(20)]
+    assert list(completeness.external_sort(records, max_in_memory=3)) == \
+        sorted(records)
+    assert list(completeness.external_sort(records)) == sorted(records)
+    assert list(completeness.external_sort([], max_in_memory=3)) == []
+    # names that aren't valid UTF-8 come back as they went in
+    undecodable = [("b\udcff", "1"), ("a\udcfe", "2"), ("c", "3")]
+    assert list(completeness.external_sort(undecodable, max_in_memory=1)) \
+        == sorted(undecodable)
+
+
+def test_compare_sorted():
+    in_manifest = [("a", "a"), ("b", "b"), ("b", "b"), ("d", "d")]
+    on_fs = [("b", "b"), ("c", "c"), ("d", "d"), ("e", "e")]
+    assert list(completeness.compare_sorted(in_manifest, on_fs)) == [
+        (completeness.MISSING, "a"),
+        (completeness.UNEXPECTED, "c"),
+        (completeness.UNEXPECTED, "e"),
+    ]
+
+
+def make_bag(bag_dir):
+    for num in range(10):
+        (bag_dir / f"dir{num % 3}" / f"file{num}.txt").ensure().write_text(
+            "x" * num, encoding="utf-8"
+        )
+    (bag_dir / "caf\u00e9.txt").ensure()
+    bagit.make_bag(bag_dir.strpath, checksums=["md5", "sha256"])
+    os.rename(
+        (bag_dir / "data" / "caf\u00e9.txt").strpath,
+        (bag_dir / "data" / "cafe\u0301.txt").strpath
+    )
+
+
+@pytest.mark.parametrize("max_in_memory", [2, None])
+def test_compare_manifests_with_fs(tmpdir, max_in_memory):
+    bag_dir = tmpdir / "bag"
+    make_bag(bag_dir)
+    os.remove((bag_dir / "data" / "dir1" / "file4.txt").strpath)
+    (bag_dir / "data" / "extra.txt").ensure()
+    (bag_dir / "data" / "dir2" / "extra.txt").ensure()
+    with open((bag_dir / "tagmanifest-md5.txt").strpath, "a") as tagmanifest:
+        tagmanifest.write("0123  missing-tag.txt\n")
+
+    only_in_manifest, only_on_fs = \
+        bagit.Bag(bag_dir.strpath).compare_manifests_with_fs()
+    bag = grabbags.bags.Bag(bag_dir.strpath, load_manifests=False)
+    assert bag.entries == {}
+    assert completeness.compare_manifests_with_fs(bag, max_in_memory) == (
+        sorted(only_in_manifest), sorted(only_on_fs)
+    )
+    assert sorted(only_in_manifest) == [
+        os.path.join("data", "dir1", "file4.txt"), "missing-tag.txt"
+    ]
+    assert len(only_on_fs) == 2
+
+
+def test_compare_manifests_with_fs_duplicates(tmpdir):
+    bag_dir = tmpdir / "bag"
+    make_bag(bag_dir)
+    with open((bag_dir / "manifest-md5.txt").strpath, "a") as manifest:
+        manifest.write("0123  data/dir0/file0.txt\n")
+
+    bag = grabbags.bags.Bag(bag_dir.strpath, load_manifests=False)
+    with pytest.raises(bagit.BagError, match="conflicting values"):
+        completeness.compare_manifests_with_fs(bag, max_in_memory=2)
+
+
+def test_bag_without_manifests(tmpdir):
+    bag_dir = tmpdir / "bag"
+    make_bag(bag_dir)
+    bag = grabbags.bags.Bag(bag_dir.strpath, load_manifests=False)
+    assert bag.validate(completeness_only=True) is True
+    assert bag.entries == {}
+
+    (bag_dir / "data" / "dir1" / "file1.txt").write_text(
+        "y", encoding="utf-8"
+    )
+    with pytest.raises(bagit.BagValidationError):
+        bag.validate()
+    assert bag.stage == "payload fixity"
+    assert len(bag.entries) > 0
+
+    os.rename(
+        (bag_dir / "data" / "dir0" / "file3.txt").strpath,
+        (bag_dir / "data" / "dir0" / "renamed.txt").strpath
+    )
+    bag = grabbags.bags.Bag(bag_dir.strpath, load_manifests=False)
+    with pytest.raises(bagit.BagValidationError) as error:
+        bag.validate(completeness_only=True)
+    assert bag.stage == "completeness"
+    assert [str(detail) for detail in error.value.details] == [
+        str(bagit.FileMissing(os.path.join("data", "dir0", "file3.txt"))),
+        str(bagit.UnexpectedFile(os.path.join("data", "dir0", "renamed.txt"))),
+    ]
+
+
+def test_validate_oxum_without_manifests(tmpdir):
+    bag_dir = tmpdir / "bag"
+    make_bag(bag_dir)
+    bag = grabbags.bags.Bag(bag_dir.strpath, load_manifests=False)
+    assert bag.validate(fast=True) is True
+    assert bag.validate(completeness_only=True) is True
+    assert bag.compact_manifests is None
+    assert bag.normalized_filesystem_names == {}
+
+    (bag_dir / "data" / "extra.txt").write_text("x", encoding="utf-8")
+    with pytest.raises(bagit.BagValidationError, match="Payload-Oxum"):
+        bag.validate(fast=True)
+
+
+def test_clean_payload_without_manifests(tmpdir):
+    bag_dir = tmpdir / "bag"
+    make_bag(bag_dir)
+    (bag_dir / "data" / "dir1" / "Thumbs.db").ensure().write_text(
+        "thumbs", encoding="utf-8"
+    )
+    (bag_dir / "data" / "extra.txt").ensure()
+    bag = grabbags.bags.Bag(bag_dir.strpath, load_manifests=False)
+
+    result = grabbags.bags.clean_payload(bag)
+
+    assert result.removed == [os.path.join("data", "dir1", "Thumbs.db")]
+    assert result.unexpected == [os.path.join("data", "extra.txt")]
+    assert result.bytes_removed == 6
+    assert not (bag_dir / "data" / "dir1" / "Thumbs.db").exists()
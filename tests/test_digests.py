@@ -0,0 +1,124 @@
+import hashlib
+import os
+
+import bagit
+import pytest
+
+import grabbags.bags
+from grabbags import digests
+
+
+def make_bag(bag_dir, contents):
+    for name, content in contents.items():
+        (bag_dir / name).write_binary(content, ensure=True)
+    bagit.make_bag(bag_dir.strpath, checksums=["md5", "sha256"])
+    return grabbags.bags.Bag(bag_dir.strpath, load_manifests=False)
+
+
+def test_index_duplicates_and_overlaps(tmpdir):
+    bag1 = make_bag(tmpdir / "bag1", {
+        "a.txt": b"shared", "b.txt": b"shared", "c.txt": b"one",
+        "empty1.txt": b"", "empty2.txt": b"",
+    })
+    bag2 = make_bag(tmpdir / "bag2", {
+        "copy.txt": b"shared", "d.txt": b"two", "empty.txt": b"",
+    })
+    with digests.DigestIndex((tmpdir / "digests.db").strpath) as index:
+        assert index.add_bag(bag1) == 5
+        assert index.add_bag(bag2) == 3
+        index.summarize()
+
+        shared = hashlib.sha256(b"shared").hexdigest()
+        assert index.lookup(shared) == [
+            (bag1.path, os.path.join("data", "a.txt"), 6),
+            (bag1.path, os.path.join("data", "b.txt"), 6),
+            (bag2.path, os.path.join("data", "copy.txt"), 6),
+        ]
+        assert index.lookup(hashlib.sha256(b"none").hexdigest()) == []
+        assert list(index.duplicates()) == [(shared, 3, 6)]
+        assert index.overlaps() == [
+            (bag1.path, bag2.path, 2, 12),
+            (bag2.path, bag1.path, 1, 6),
+        ]
+        assert index.overlaps(bag2.path) == [(bag2.path, bag1.path, 1, 6)]
+        assert index.summary() == (2, 8, 24, 1, 3, 12)
+
+
+def test_index_unchanged_and_updated_bags(tmpdir):
+    bag = make_bag(tmpdir / "bag", {"a.txt": b"a", "b.txt": b"b"})
+    index_path = (tmpdir / "digests.db").strpath
+    with digests.DigestIndex(index_path) as index:
+        assert index.add_bag(bag) == 2
+        assert index.add_bag(bag) is None
+
+    os.remove((tmpdir / "bag" / "data" / "b.txt").strpath)
+    bagit.Bag(bag.path).save(manifests=True)
+    with digests.DigestIndex(index_path, "sha256") as index:
+        assert index.add_bag(bag) == 1
+        assert index.lookup(hashlib.sha256(b"b").hexdigest()) == []
+        assert index.summary().files == 1
+
+
+def test_index_algorithm(tmpdir):
+    bag = make_bag(tmpdir / "bag", {"a.txt": b"a"})
+    index_path = (tmpdir / "digests.db").strpath
+    with digests.DigestIndex(index_path, "md5") as index:
+        assert index.algorithm == "md5"
+        index.add_bag(bag)
+        assert len(index.lookup(hashlib.md5(b"a").hexdigest())) == 1
+    with digests.DigestIndex(index_path) as index:
+        assert index.algorithm == "md5"
+    with pytest.raises(ValueError):
+        digests.DigestIndex(index_path, "sha256")
+
+
+def test_index_summary_follows_changes(tmpdir):
+    bag1 = make_bag(tmpdir / "bag1", {"a.txt": b"shared", "b.txt": b"one"})
+    bag2 = make_bag(tmpdir / "bag2", {"copy.txt": b"shared"})
+    with digests.DigestIndex((tmpdir / "digests.db").strpath) as index:
+        index.add_bag(bag1)
+        index.add_bag(bag2)
+        index.summarize()
+        assert index.summary() == (2, 3, 15, 1, 2, 6)
+
+        bag3 = make_bag(tmpdir / "bag3", {"c.txt": b"one", "d.txt": b"two"})
+        index.add_bag(bag3)
+        index.summarize()
+        assert index.summary() == (3, 5, 21, 2, 4, 9)
+        assert index.overlaps() == [
+            (bag1.path, bag2.path, 1, 6),
+            (bag2.path, bag1.path, 1, 6),
+            (bag1.path, bag3.path, 1, 3),
+            (bag3.path, bag1.path, 1, 3),
+        ]
+
+        os.remove((tmpdir / "bag2" / "data" / "copy.txt").strpath)
+        (tmpdir / "bag2" / "data" / "new.txt").write_binary(b"two")
+        bagit.Bag(bag2.path).save(manifests=True)
+        index.add_bag(bag2)
+        index.summarize()
+        assert list(index.duplicates()) == sorted([
+            (hashlib.sha256(b"one").hexdigest(), 2, 3),
+            (hashlib.sha256(b"two").hexdigest(), 2, 3),
+        ])
+        assert index.overlaps(bag1.path) == [(bag1.path, bag3.path, 1, 3)]
+        assert index.overlaps(bag2.path) == [(bag2.path, bag3.path, 1, 3)]
+
+
+def test_index_remove_missing(tmpdir):
+    bag1 = make_bag(tmpdir / "bag1", {"a.txt": b"shared"})
+    bag2 = make_bag(tmpdir / "bag2", {"copy.txt": b"shared"})
+    with digests.DigestIndex((tmpdir / "digests.db").strpath) as index:
+        index.add_bag(bag1)
+        index.add_bag(bag2)
+        index.summarize()
+        assert len(index.overlaps()) == 2
+
+        (tmpdir / "bag2").remove()
+        assert index.remove_missing() == [bag2.path]
+        index.summarize()
+        assert index.summary() == (1, 1, 6, 0, 0, 0)
+        assert index.overlaps() == []
+        assert index.lookup(hashlib.sha256(b"shared").hexdigest()) == [
+            (bag1.path, os.path.join("data", "a.txt"), 6)
+        ]
@@ -0,0 +1,62 @@
+import os
+
+import pytest
+
+from grabbags import bags, discovery
+
+
+@pytest.fixture()
+def collection(tmpdir):
+    (tmpdir / "bag1" / "file.txt").ensure()
+    bags.make_bag((tmpdir / "bag1").strpath, checksums=["md5"])
+    (tmpdir / "box" / "bag2" / "file.txt").ensure()
+    bags.make_bag((tmpdir / "box" / "bag2").strpath, checksums=["md5"])
+    (tmpdir / "box" / "folder" / "nested" / "file.txt").ensure()
+    (tmpdir / "box" / "empty").ensure_dir()
+    (tmpdir / "loose.txt").ensure()
+    return tmpdir
+
+
+def found(roots, **kwargs):
+    return sorted(
+        (os.path.relpath(i.path, roots[0]), i.kind)
+        for i in discovery.discover_bag_dirs(roots, **kwargs)
+    )
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_discover_top_level(collection, threads):
+    assert found([collection.strpath], threads=threads) == [
+        ("bag1", discovery.BAG),
+        ("box", discovery.NOT_A_BAG),
+    ]
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_discover_nested(collection, threads):
+    assert found([collection.strpath], depth=3, threads=threads) == [
+        ("bag1", discovery.BAG),
+        (os.path.join("box", "bag2"), discovery.BAG),
+        (os.path.join("box", "empty"), discovery.EMPTY),
+        (os.path.join("box", "folder", "nested"), discovery.NOT_A_BAG),
+    ]
+
+
+@pytest.mark.parametrize("threads", [1, 4])
+def test_discover_directory_with_files(tmpdir, threads):
+    (tmpdir / "box" / "item" / "file.txt").ensure()
+    (tmpdir / "box" / "item" / "sub" / "nested.txt").ensure()
+    (tmpdir / "box" / "Thumbs.db").ensure()
+    assert found([tmpdir.strpath], depth=3, threads=threads) == [
+        (os.path.join("box", "item"), discovery.NOT_A_BAG),
+    ]
+    assert found(
+        [tmpdir.strpath], depth=3, threads=threads, split_directories=True
+    ) == [
+        (os.path.join("box", "item", "sub"), discovery.NOT_A_BAG),
+    ]
+
+
+def test_discover_missing_root(tmpdir):
+    with pytest.raises(OSError):
+        list(discovery.discover_bag_dirs([(tmpdir / "missing").strpath]))
@@ -0,0 +1,62 @@
+from unittest.mock import Mock
+
+from grabbags import fixity
+
+
+def bag_dirs(tmpdir, *names):
+    return [Mock(path=(tmpdir / name).strpath) for name in names]
+
+
+def test_plan_most_overdue_first(tmpdir):
+    old, recent, new, not_a_bag = bag_dirs(
+        tmpdir, "old", "recent", "new", "not_a_bag"
+    )
+    (tmpdir / "new" / "bagit.txt").ensure()
+    (tmpdir / "new" / "data" / "file.txt").write_binary(b"abc", ensure=True)
+    (tmpdir / "not_a_bag" / "file.txt").write_binary(b"x" * 100, ensure=True)
+    with fixity.FixitySchedule((tmpdir / "fixity.db").strpath) as schedule:
+        schedule.record(old.path, 10, valid=True, duration=1)
+        schedule.record(recent.path, 10, valid=True, duration=1)
+
+        sizes = {}
+        planned = schedule.plan([not_a_bag, recent, old, new], sizes=sizes)
+
+    # directories that aren't bags go last, and are left out of the sizes
+    assert planned == [new, old, recent, not_a_bag]
+    assert sizes == {new.path: 3, old.path: 10, recent.path: 10}
+
+
+def test_plan_budget_skips_not_a_bag(tmpdir):
+    bag, not_a_bag = bag_dirs(tmpdir, "bag", "not_a_bag")
+    (tmpdir / "not_a_bag" / "file.txt").write_binary(b"x" * 100, ensure=True)
+    with fixity.FixitySchedule((tmpdir / "fixity.db").strpath) as schedule:
+        schedule.record(bag.path, 5, valid=True, duration=1)
+
+        assert schedule.plan([not_a_bag, bag], budget_bytes=10) == \
+            [bag, not_a_bag]
+
+
+def test_plan_budget(tmpdir):
+    large, small, other = bag_dirs(tmpdir, "large", "small", "other")
+    with fixity.FixitySchedule((tmpdir / "fixity.db").strpath) as schedule:
+        schedule.record(large.path, 100, valid=False, duration=1)
+        schedule.record(small.path, 5, valid=False, duration=1)
+        schedule.record(other.path, 5, valid=True, duration=1)
+
+        assert schedule.plan([other, small, large], budget_bytes=10) == \
+            [large]
+        assert schedule.plan([other, small], budget_bytes=10) == \
+            [small, other]
+
+
+def test_failure_keeps_last_validated(tmpdir):
+    (bag,) = bag_dirs(tmpdir, "bag")
+    with fixity.FixitySchedule((tmpdir / "fixity.db").strpath) as schedule:
+        schedule.record(bag.path, 10, valid=True, duration=2)
+        validated = schedule.records()[bag.path].last_validated
+        schedule.record(bag.path, 30, valid=False, duration=1)
+
+        assert schedule.records()[bag.path] == (30, validated)
+        assert schedule.throughput() == 30
+        assert schedule.overdue() == 0
+        assert schedule.overdue(now=validated + 91 * 24 * 60 * 60) == 1
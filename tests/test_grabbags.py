@@ -78,6 +78,19 @@ class TestCliArgs:
             grabbags.main(['somedir', '--fast'])
         assert e.value.args[0] != 0
 
+    def test_version_looked_up_only_when_asked(self, monkeypatch, capsys):
+        from grabbags import grabbags
+        current_version = Mock(return_value="1.2.3\n")
+        monkeypatch.setattr(
+            grabbags.grabbags.utils, "current_version", current_version
+        )
+        grabbags._make_parser()
+        current_version.assert_not_called()
+
+        with pytest.raises(SystemExit):
+            grabbags.main(["--version"], runner=Mock())
+        assert capsys.readouterr().out == "1.2.3\n"
+
     def test_main_calls_callback(self):
         from grabbags import grabbags
         run = Mock()
@@ -85,6 +98,39 @@ class TestCliArgs:
         assert run.called is True
 
 
+def test_startup_import_budget():
+    # starting grabbags for a single bag shouldn't load the optional
+    # features, and only a few modules on top of bagit
+    import subprocess
+    import sys
+    script = (
+        "import sys\n"
+        "import bagit\n"
+        "before = set(sys.modules)\n"
+        "from grabbags import grabbags\n"
+        "grabbags._make_parser()\n"
+        "print(' '.join(set(sys.modules) - before))\n"
+    )
+    imported = set(
+        subprocess.check_output([sys.executable, "-c", script]).split()
+    )
+    assert not imported & {
+        b"sqlite3",
+        b"subprocess",
+        b"grabbags.cache",
+        b"grabbags.completeness",
+        b"grabbags.digests",
+        b"grabbags.discovery",
+        b"grabbags.fixity",
+        b"grabbags.journal",
+        b"grabbags.manifests",
+        b"grabbags.metrics",
+        b"grabbags.progress",
+    }
+    # json is loaded by grabbags.results to write the results file
+    assert len(imported) <= 20
+
+
 @pytest.mark.parametrize("system_file",
                          [
                              'Thumbs.db',
@@ -102,6 +148,38 @@ def test_clean_bags_system_files(tmpdir, system_file):
     assert (tmpdir / "bag" / "data" / "text.txt").exists()
 
 
+@pytest.mark.parametrize("manifest_limit", [16 * 1024 * 1024, 0])
+def test_clean_bags_by_manifest_size(tmpdir, monkeypatch, manifest_limit):
+    from grabbags import bags, completeness, grabbags
+
+    (tmpdir / "bag" / "text.txt").ensure()
+    grabbags.main([tmpdir.strpath])
+    (tmpdir / "bag" / "data" / "Thumbs.db").ensure()
+    (tmpdir / "bag" / "data" / "extra.txt").ensure()
+    monkeypatch.setattr(bags, "COMPACT_MANIFEST_BYTES", manifest_limit)
+    sorted_compared = []
+    differences = completeness.differences
+    monkeypatch.setattr(
+        completeness, "differences",
+        lambda bag: sorted_compared.append(bag.path) or differences(bag)
+    )
+    grabbags.main([tmpdir.strpath, "--clean"])
+    assert (tmpdir / "bag" / "data" / "Thumbs.db").exists() is False
+    assert (tmpdir / "bag" / "data" / "extra.txt").exists()
+    # only bags with huge manifests are compared in sorted order
+    assert bool(sorted_compared) == (manifest_limit == 0)
+
+
+def test_clean_bags_dry_run(tmpdir):
+    from grabbags import grabbags
+
+    (tmpdir / "bag" / "text.txt").ensure()
+    grabbags.main([tmpdir.strpath])
+    (tmpdir / "bag" / "data" / "Thumbs.db").ensure()
+    grabbags.main([tmpdir.strpath, "--clean", "--dry-run"])
+    assert (tmpdir / "bag" / "data" / "Thumbs.db").exists()
+
+
 def test_clean_bags_no_system_files(tmpdir):
     from grabbags import grabbags
 
@@ -124,6 +202,46 @@ def test_clean_bags_no_system_files(tmpdir):
         ['--clean', '--no-system-files', "fakepath"],
         ['--clean', '--md5', "fakepath"],
         ['--clean'],
+        ['--bag-workers', '0', "fakepath"],
+        ['--largest-first', "fakepath"],
+        ['--checksum-cache', 'cache.db', "fakepath"],
+        ['--validate', '--trust-cache', "fakepath"],
+        ['--journal', 'a.ndjson', '--resume', 'a.ndjson', "fakepath"],
+        ['--hash-threads', '2', '--processes', '2', "fakepath"],
+        ['--clean', '--hash-threads', '2', "fakepath"],
+        ['--read-threads', '2', '--processes', '2', "fakepath"],
+        ['--validate', '--read-threads', '2', '--hash-memory', '0',
+         "fakepath"],
+        ['--validate', '--dry-run', "fakepath"],
+        ['--no-system-files', '--sweep-threads', '0', "fakepath"],
+        ['--depth', '0', "fakepath"],
+        ['--split-directories', "fakepath"],
+        ['--sample', '0.1', "fakepath"],
+        ['--fixity-schedule', 'fixity.db', "fakepath"],
+        ['--validate', '--budget-bytes', '100', "fakepath"],
+        ['--validate', '--fixity-schedule', 'fixity.db', '--budget-time',
+         '0', "fakepath"],
+        ['--validate', '--sample', '0', "fakepath"],
+        ['--validate', '--sample', '0.1', '--sample-bytes', '10',
+         "fakepath"],
+        ['--validate', '--fast', '--sample', '0.1', "fakepath"],
+        ['--validate', '--sample-seed', 'abc', "fakepath"],
+        ['--discovery-threads', '0', "fakepath"],
+        ['--metrics-file', 'metrics.txt', "fakepath"],
+        ['--verify-algorithm', 'sha256', "fakepath"],
+        ['--validate', '--verify-algorithm', 'crc32', "fakepath"],
+        ['--validate', '--no-checksums', '--verify-algorithm', 'fastest',
+         "fakepath"],
+        ['--validate', '--index', 'digests.db', "fakepath"],
+        ['--index-algorithm', 'md5', "fakepath"],
+        ['--index', 'digests.db', '--sha256', "fakepath"],
+        ['--index', 'digests.db', '--index-algorithm', 'crc32', "fakepath"],
+        ['--validate', '--trust-sidecars', "fakepath"],
+        ['--clean', '--checksum-csv', 'checksums.csv', "fakepath"],
+        ['--update', '--validate', "fakepath"],
+        ['--processes', 'auto', '--hash-threads', '2', "fakepath"],
+        ['--update', '--md5', "fakepath"],
+        ['--update', '--no-system-files', "fakepath"],
     ])
 def test_invalid_cli_args(arguments):
     from grabbags import grabbags
@@ -133,9 +251,57 @@ def test_invalid_cli_args(arguments):
         run.assert_not_called()
 
 
+def test_index_algorithm_mismatch(tmpdir, capsys):
+    from grabbags import digests, grabbags
+    index_file = (tmpdir / "digests.db").strpath
+    digests.DigestIndex(index_file, "md5").close()
+    run = Mock()
+    with pytest.raises(SystemExit) as error:
+        grabbags.main(
+            ['--index', index_file, '--index-algorithm', 'sha256',
+             tmpdir.strpath],
+            runner=run
+        )
+    assert error.value.args[0] != 0
+    run.assert_not_called()
+    assert "is an index of md5 digests, not sha256" in capsys.readouterr().err
+
+    grabbags.main(
+        ['--index', index_file, '--index-algorithm', 'md5', tmpdir.strpath],
+        runner=run
+    )
+    run.assert_called()
+
+    (tmpdir / "other.db").write_text("not a database", encoding="utf-8")
+    with pytest.raises(SystemExit):
+        grabbags.main(
+            ['--index', (tmpdir / "other.db").strpath, tmpdir.strpath],
+            runner=run
+        )
+    assert "is not a digest index" in capsys.readouterr().err
+
+
 @pytest.mark.parametrize("arguments", [
     ['--validate', 'fakepath'],
     ['--validate', '--fast', 'fakepath'],
+    ['--validate', '--checksum-cache', 'cache.db', '--trust-cache',
+     'fakepath'],
+    ['--validate', '--sample', '0.05', '--sample-seed', 'daily',
+     'fakepath'],
+    ['--validate', '--sample-bytes', '1000000', 'fakepath'],
+    ['--validate', '--fixity-schedule', 'fixity.db', '--budget-bytes',
+     '1000000000', '--budget-time', '480', 'fakepath'],
+    ['--validate', '--metrics-file', 'grabbags.prom', 'fakepath'],
+    ['--progress', 'fakepath'],
+    ['--validate', '--verify-algorithm', 'sha256', 'fakepath'],
+    ['--validate', '--verify-algorithm', 'strongest', 'fakepath'],
+    ['--index', 'digests.db', '--index-algorithm', 'md5', 'fakepath'],
+    ['--trust-sidecars', '--sample', '0.1', 'fakepath'],
+    ['--checksum-csv', 'checksums.csv', '--md5', 'fakepath'],
+    ['--update', '--processes', '4', 'fakepath'],
+    ['--validate', '--processes', 'auto', 'fakepath'],
+    ['--depth', '2', '--split-directories', 'fakepath'],
+    ['--bag-workers', '4', '--largest-first', 'fakepath'],
     ["fakepath"],
 ])
 def test_valid_cli_args(tmpdir, arguments):
@@ -349,6 +515,20 @@ def test_run_clean_not_found(monkeypatch, tmpdir, caplog):
     assert any("Found file not in manifest" in m for m in caplog.messages)
 
 
+def _record(runner, successes=(), failures=(), skipped=(), results=()):
+    """Record outcomes on a runner the way finished bags are recorded."""
+    from grabbags.results import BagResult, Outcome
+    for outcome, paths in [
+        (Outcome.SUCCESS, successes),
+        (Outcome.FAILURE, failures),
+        (Outcome.SKIPPED, skipped),
+    ]:
+        for path in paths:
+            runner._add_result(BagResult(path, outcome), {"path": path})
+    for result in results:
+        runner._add_result(BagResult.from_results(result), result)
+
+
 class TestGrabbagsRunner:
     def test_run_validate(self, fake_bag_path, monkeypatch):
         from grabbags import grabbags
@@ -642,6 +822,656 @@ class TestGrabbagsRunner:
         ]
         assert len(not_a_bag) == 1
 
+    def test_run_bag_workers(self, tmpdir):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        for num in range(6):
+            (tmpdir / f"bag{num}" / "text.txt").ensure()
+        (tmpdir / "empty_bag").ensure_dir()
+
+        run_args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            processes=1,
+            checksums=["md5"],
+            bag_workers=3,
+            directories=[
+                tmpdir.strpath
+            ]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(run_args)
+        assert len(runner.successes) == 6
+        assert len(runner.skipped) == 1
+        assert len(runner.results) == 7
+
+        validate_args = Namespace(
+            action_type='validate',
+            processes=1,
+            fast=False,
+            no_checksums=False,
+            bag_workers=3,
+            directories=[
+                tmpdir.strpath
+            ]
+        )
+        validate_runner = grabbags.GrabbagsRunner()
+        validate_runner.run(validate_args)
+        assert len(validate_runner.successes) == 6
+        assert len(validate_runner.failures) == 0
+
+    def test_run_validate_nested(self, tmpdir):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        (tmpdir / "box" / "bag1" / "text.txt").ensure()
+        (tmpdir / "box" / "bag2" / "text.txt").ensure()
+        grabbags.GrabbagsRunner().run(
+            Namespace(
+                action_type='create',
+                no_system_files=False,
+                bag_info={},
+                processes=1,
+                checksums=["md5"],
+                depth=2,
+                directories=[tmpdir.strpath]
+            )
+        )
+        validate_runner = grabbags.GrabbagsRunner()
+        validate_runner.run(
+            Namespace(
+                action_type='validate',
+                processes=1,
+                fast=False,
+                no_checksums=False,
+                depth=2,
+                discovery_threads=2,
+                directories=[tmpdir.strpath]
+            )
+        )
+        assert sorted(validate_runner.successes) == [
+            (tmpdir / "box" / "bag1").strpath,
+            (tmpdir / "box" / "bag2").strpath,
+        ]
+
+    def test_run_create_nested_keeps_files(self, tmpdir, monkeypatch):
+        from grabbags import bags, grabbags
+        from argparse import Namespace
+
+        (tmpdir / "box" / "item" / "text.txt").ensure()
+        (tmpdir / "box" / "item" / "sub" / "nested.txt").ensure()
+        (tmpdir / "box" / "bag" / "text.txt").ensure()
+        bags.make_bag((tmpdir / "box" / "bag").strpath)
+        # directories found at depth are already classified
+        monkeypatch.setattr(
+            grabbags, "is_bag", Mock(side_effect=AssertionError)
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(
+            Namespace(
+                action_type='create',
+                no_system_files=False,
+                bag_info={},
+                processes=1,
+                checksums=["md5"],
+                depth=2,
+                directories=[tmpdir.strpath]
+            )
+        )
+        assert runner.successes == [(tmpdir / "box" / "item").strpath]
+        assert runner.skipped == [(tmpdir / "box" / "bag").strpath]
+        assert (tmpdir / "box" / "item" / "data" / "text.txt").exists()
+        assert (tmpdir / "box" / "item" / "data" / "sub" / "nested.txt") \
+            .exists()
+
+    def test_run_validate_fixity_schedule(self, tmpdir):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        for num in range(3):
+            (tmpdir / "bags" / f"bag{num}" / "text.txt").write_binary(
+                b"x" * (num + 1), ensure=True
+            )
+        grabbags.GrabbagsRunner().run(
+            Namespace(
+                action_type='create',
+                no_system_files=False,
+                bag_info={},
+                processes=1,
+                checksums=["md5"],
+                directories=[(tmpdir / "bags").strpath]
+            )
+        )
+        args = Namespace(
+            action_type='validate',
+            processes=1,
+            fast=False,
+            no_checksums=False,
+            fixity_schedule=(tmpdir / "fixity.db").strpath,
+            budget_bytes=3,
+            cycle_days=90,
+            directories=[(tmpdir / "bags").strpath]
+        )
+
+        validated = []
+        for _ in range(3):
+            runner = grabbags.GrabbagsRunner()
+            runner.run(args)
+            validated.append(
+                [os.path.basename(path) for path in runner.successes]
+            )
+        assert validated == [["bag2"], ["bag1", "bag0"], ["bag2"]]
+
+    def test_run_validate_fixity_schedule_not_a_bag(self, tmpdir, monkeypatch):
+        from grabbags import bags, grabbags
+        from argparse import Namespace
+
+        (tmpdir / "bags" / "bag" / "text.txt").write_binary(
+            b"abc", ensure=True
+        )
+        grabbags.main([(tmpdir / "bags").strpath])
+        (tmpdir / "bags" / "notbag" / "big.bin").write_binary(
+            b"x" * 1000, ensure=True
+        )
+        args = Namespace(
+            action_type='validate',
+            processes=1,
+            fast=False,
+            no_checksums=False,
+            fixity_schedule=(tmpdir / "fixity.db").strpath,
+            budget_bytes=100,
+            cycle_days=90,
+            directories=[(tmpdir / "bags").strpath]
+        )
+        measured = []
+        estimate_size = bags.estimate_size
+        monkeypatch.setattr(
+            bags, "estimate_size",
+            lambda path: measured.append(path) or estimate_size(path)
+        )
+        for _ in range(2):
+            runner = grabbags.GrabbagsRunner()
+            runner.run(args)
+            assert runner.successes == [(tmpdir / "bags" / "bag").strpath]
+            assert runner.deferred == 0
+        # the bag was measured once, when it was first planned
+        assert measured == [(tmpdir / "bags" / "bag").strpath]
+
+    def test_run_update(self, tmpdir):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        for name in ["bag1", "bag2"]:
+            (tmpdir / "bags" / name / "text.txt").write_binary(
+                b"abc", ensure=True
+            )
+        grabbags.main([(tmpdir / "bags").strpath])
+        for name in ["bag1", "bag2"]:
+            os.utime(
+                (tmpdir / "bags" / name / "data" / "text.txt").strpath, (0, 0)
+            )
+        (tmpdir / "bags" / "bag2" / "data" / "new.txt").write_binary(b"new")
+        args = Namespace(
+            action_type='update',
+            processes=1,
+            directories=[(tmpdir / "bags").strpath]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+
+        assert runner.successes == [(tmpdir / "bags" / "bag2").strpath]
+        assert runner.get_report(args) == """Summary Report:
+1 bags updated successfully
+0 failures
+1 bags are already up to date
+0 directories are not bags
+"""
+
+    def test_run_index(self, tmpdir):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        for name in ["bag1", "bag2"]:
+            (tmpdir / "bags" / name / "same.txt").write_binary(
+                b"same", ensure=True
+            )
+            (tmpdir / "bags" / name / "own.txt").write_binary(
+                name.encode(), ensure=True
+            )
+        grabbags.main([(tmpdir / "bags").strpath])
+        (tmpdir / "bags" / "not_a_bag").ensure_dir()
+        args = Namespace(
+            action_type='index',
+            index_file=(tmpdir / "digests.db").strpath,
+            directories=[(tmpdir / "bags").strpath]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+
+        bag1 = (tmpdir / "bags" / "bag1").strpath
+        bag2 = (tmpdir / "bags" / "bag2").strpath
+        report = runner.get_report(args)
+        assert report.startswith("""Summary Report:
+2 bags indexed successfully
+0 failures
+0 bags without a manifest to index
+1 directories are not bags
+4 files (16 bytes) in 2 bags in the index
+1 contents found in 2 files, with 4 bytes in extra copies
+""")
+        assert f"1 files (4 bytes) of {bag1} are also in {bag2}" in report
+
+        (tmpdir / "bags" / "bag2").remove()
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+        assert "2 files (8 bytes) in 1 bags in the index\n" \
+            "0 contents found in 0 files" in runner.get_report(args)
+
+    def test_run_create_trusting_sidecars(self, tmpdir):
+        import hashlib
+        from grabbags import grabbags
+
+        (tmpdir / "bags" / "bag" / "a.txt").write_binary(b"a", ensure=True)
+        (tmpdir / "bags" / "bag" / "a.txt.md5").write_text(
+            hashlib.md5(b"a").hexdigest(), encoding="utf-8"
+        )
+        grabbags.main([
+            "--trust-sidecars", "--md5", "--sample", "1",
+            (tmpdir / "bags").strpath
+        ])
+
+        sidecar = tmpdir / "bags" / "bag" / "data" / "a.txt.md5"
+        manifest = tmpdir / "bags" / "bag" / "manifest-md5.txt"
+        assert manifest.read_text(encoding="utf-8").splitlines() == [
+            f"{hashlib.md5(b'a').hexdigest()}  data/a.txt",
+            f"{hashlib.md5(sidecar.read_binary()).hexdigest()}"
+            f"  data/a.txt.md5",
+        ]
+
+    def test_run_create_trusting_sidecars_default_algorithms(self, tmpdir):
+        import hashlib
+        from grabbags import grabbags
+
+        (tmpdir / "bags" / "bag" / "a.txt").write_binary(b"a", ensure=True)
+        (tmpdir / "bags" / "bag" / "a.txt.md5").write_text(
+            hashlib.md5(b"a").hexdigest(), encoding="utf-8"
+        )
+        grabbags.main(["--trust-sidecars", (tmpdir / "bags").strpath])
+
+        bag = tmpdir / "bags" / "bag"
+        assert sorted(path.basename for path in bag.listdir("manifest-*")) \
+            == ["manifest-sha256.txt", "manifest-sha512.txt"]
+        assert f"{hashlib.sha256(b'a').hexdigest()}  data/a.txt" in \
+            (bag / "manifest-sha256.txt").read_text(encoding="utf-8")
+
+    def test_run_results_file(self, tmpdir):
+        import json
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        (tmpdir / "bags" / "bag" / "text.txt").write_binary(
+            b"abc", ensure=True
+        )
+        (tmpdir / "bags" / "empty").ensure_dir()
+        results_file = tmpdir / "results.ndjson"
+        args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            processes=1,
+            checksums=["md5"],
+            results_file=results_file.strpath,
+            directories=[(tmpdir / "bags").strpath]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+
+        assert runner.successes == [] and runner.results == []
+        assert runner.get_report(args) == """Summary Report:
+1 bags created successfully
+0 failures
+1 empty directories skipped
+0 directories are already a bag
+"""
+        records = sorted(
+            (json.loads(line) for line in results_file.readlines()),
+            key=lambda record: record["path"]
+        )
+        assert [
+            (record["outcome"], record["bytes"], record["files"])
+            for record in records
+        ] == [("success", 3, 1), ("skipped", None, None)]
+
+    def test_run_counts_skipped_paths(self, tmpdir):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        (tmpdir / "bags" / "bag" / "text.txt").write_binary(
+            b"abc", ensure=True
+        )
+        (tmpdir / "bags" / "empty").ensure_dir()
+        args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            processes=1,
+            checksums=["md5"],
+            directories=[(tmpdir / "bags").strpath]
+        )
+        grabbags.GrabbagsRunner().run(args)
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+
+        summary = runner.summary()
+        assert summary["already_a_bag"] == 1
+        assert summary.already_bags == [(tmpdir / "bags" / "bag").strpath]
+        assert summary.empty_dirs == [(tmpdir / "bags" / "empty").strpath]
+
+    def test_run_counts_failures_to_bag(self, tmpdir, monkeypatch):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        (tmpdir / "bags" / "bag" / "text.txt").write_binary(
+            b"abc", ensure=True
+        )
+
+        def make_bag(*args, **kwargs):
+            raise bagit.BagError("no")
+
+        monkeypatch.setattr("grabbags.bags.make_bag", make_bag)
+        args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            processes=1,
+            checksums=["md5"],
+            directories=[(tmpdir / "bags").strpath]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+        assert runner.failures == [(tmpdir / "bags" / "bag").strpath]
+        assert runner.summary()["failures"] == 1
+
+    @pytest.mark.parametrize("action_type", ["create", "validate"])
+    def test_run_metrics_file(self, tmpdir, action_type):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        (tmpdir / "bags" / "bag" / "text.txt").write_binary(
+            b"abc", ensure=True
+        )
+        if action_type == "validate":
+            bagit.make_bag(
+                (tmpdir / "bags" / "bag").strpath, checksums=["md5"]
+            )
+        metrics_file = tmpdir / "grabbags.prom"
+        args = Namespace(
+            action_type=action_type,
+            no_system_files=False,
+            bag_info={},
+            processes=1,
+            fast=False,
+            no_checksums=False,
+            checksums=["md5"],
+            metrics_file=metrics_file.strpath,
+            directories=[(tmpdir / "bags").strpath]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+
+        # validation hashes the tag files as well as the payload
+        files_hashed = runner.run_metrics.files_hashed
+        assert files_hashed == (1 if action_type == "create" else 4)
+        assert f"bytes in {files_hashed} files" in runner.get_report(args)
+        assert f'grabbags_files_hashed{{action="{action_type}"}}' \
+               f' {files_hashed}' in \
+            metrics_file.read_text("utf-8").splitlines()
+
+    def test_run_progress(self, tmpdir, caplog):
+        import logging
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        caplog.set_level(logging.INFO)
+        for num in range(2):
+            (tmpdir / f"bag{num}" / "text.txt").write_binary(
+                b"x" * 10, ensure=True
+            )
+        args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            processes=1,
+            checksums=["md5"],
+            progress=True,
+            directories=[tmpdir.strpath]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+
+        assert "Found 2 directories holding 20 B" in caplog.messages
+        assert runner.progress.done_bags == 2
+        assert runner.progress.done_bytes == 20
+
+    def test_schedule_largest_first(self, tmpdir):
+        from grabbags import grabbags
+        (tmpdir / "small" / "file.txt").write_binary(b"x", ensure=True)
+        (tmpdir / "large" / "file.txt").write_binary(b"x" * 100, ensure=True)
+        (tmpdir / "medium" / "file.txt").write_binary(b"x" * 10, ensure=True)
+
+        runner = grabbags.GrabbagsRunner()
+        scheduled = runner.schedule(runner.find_bag_dirs(tmpdir.strpath), 2)
+        assert [os.path.basename(i.path) for i in scheduled] == \
+               ["large", "medium", "small"]
+
+    def test_run_bag_workers_order(self, tmpdir, monkeypatch):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        for root in ["found", "largest"]:
+            for name, size in [("a", 1), ("b", 100), ("c", 10)]:
+                (tmpdir / root / name / "file.txt").write_binary(
+                    b"x" * size, ensure=True
+                )
+        measured = []
+        estimate_sizes = grabbags.GrabbagsRunner.estimate_sizes
+        monkeypatch.setattr(
+            grabbags.GrabbagsRunner, "estimate_sizes",
+            staticmethod(
+                lambda bag_dirs, workers=1: measured.append(len(bag_dirs))
+                or estimate_sizes(bag_dirs, workers)
+            )
+        )
+        args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            processes=1,
+            checksums=["md5"],
+            bag_workers=2,
+            directories=[(tmpdir / "found").strpath]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+        # bags are started as they are found, without measuring them first
+        assert len(runner.successes) == 3 and measured == []
+
+        args.directories = [(tmpdir / "largest").strpath]
+        args.largest_first = True
+        runner = grabbags.GrabbagsRunner()
+        runner.run(args)
+        assert len(runner.successes) == 3 and measured == [3]
+
+    def test_run_bag_workers_shared_processes(self, tmpdir):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        for num in range(3):
+            (tmpdir / f"bag{num}" / "text.txt").write_binary(
+                b"x" * num, ensure=True
+            )
+
+        run_args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            processes=2,
+            checksums=["md5"],
+            bag_workers=2,
+            directories=[
+                tmpdir.strpath
+            ]
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(run_args)
+        assert len(runner.successes) == 3
+        assert runner.hash_executor is None
+
+        validate_args = Namespace(
+            action_type='validate',
+            processes=2,
+            fast=False,
+            no_checksums=False,
+            bag_workers=2,
+            directories=[
+                tmpdir.strpath
+            ]
+        )
+        validate_runner = grabbags.GrabbagsRunner()
+        validate_runner.run(validate_args)
+        assert len(validate_runner.successes) == 3
+
+    def test_run_bag_workers_processes_measured(self, tmpdir):
+        from grabbags import grabbags
+
+        for num in range(3):
+            (tmpdir / "bags" / f"bag{num}" / "text.txt").write_binary(
+                b"abc", ensure=True
+            )
+        metrics_file = tmpdir / "metrics.prom"
+        bags_dir = (tmpdir / "bags").strpath
+        for action in [[], ["--validate"]]:
+            grabbags.main(action + [
+                "--bag-workers", "2", "--processes", "2",
+                "--metrics-file", metrics_file.strpath, bags_dir
+            ])
+            lines = metrics_file.read_text(encoding="utf-8").splitlines()
+            name = "validate" if action else "create"
+            assert f'grabbags_bags{{action="{name}",outcome="success"}} 3' \
+                in lines
+            # validating also reads the tag files
+            assert int(next(
+                line for line in lines
+                if line.startswith(f'grabbags_bytes_read{{action="{name}"}}')
+            ).split()[-1]) >= 9
+        for num in range(3):
+            assert (tmpdir / "bags" / f"bag{num}" / "bagit.txt").exists()
+
+    def test_run_bag_workers_processes_progress(self, tmpdir):
+        from grabbags import grabbags
+
+        for num in range(3):
+            (tmpdir / "bags" / f"bag{num}" / "text.txt").write_binary(
+                b"abc", ensure=True
+            )
+        bags_dir = (tmpdir / "bags").strpath
+        for action in [[], ["--validate"]]:
+            grabbags.main(action + [
+                "--bag-workers", "2", "--processes", "2", "--progress",
+                bags_dir
+            ])
+        for num in range(3):
+            assert (tmpdir / "bags" / f"bag{num}" / "bagit.txt").exists()
+            assert not (
+                tmpdir / "bags" / f"bag{num}" / "grabbags-unfinished.txt"
+            ).exists()
+
+
+    def test_run_resume(self, tmpdir):
+        from grabbags import grabbags, journal
+        from argparse import Namespace
+
+        for name in ["finished", "interrupted", "new"]:
+            (tmpdir / "bags" / name / "text.txt").ensure()
+        journal_file = (tmpdir / "journal.ndjson").strpath
+        run_args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            processes=1,
+            checksums=["md5"],
+            resume=journal_file,
+            directories=[
+                (tmpdir / "bags").strpath
+            ]
+        )
+        fingerprint = journal.options_fingerprint(run_args)
+        with journal.Journal(journal_file, fingerprint) as progress:
+            progress.start((tmpdir / "bags" / "finished").strpath, "create")
+            progress.finish(
+                (tmpdir / "bags" / "finished").strpath, "create", "success"
+            )
+            progress.start((tmpdir / "bags" / "interrupted").strpath, "create")
+        (tmpdir / "bags" / "interrupted" / "data" / "text.txt").ensure()
+        (tmpdir / "bags" / "interrupted" / "text.txt").remove()
+        (tmpdir / "bags" / "interrupted" / "manifest-md5.txt").ensure()
+        (tmpdir / "bags" / "interrupted" / "grabbags-unfinished.txt").ensure()
+
+        runner = grabbags.GrabbagsRunner()
+        runner.run(run_args)
+
+        assert sorted(os.path.basename(i) for i in runner.successes) == \
+               ["interrupted", "new"]
+        assert not (tmpdir / "bags" / "finished" / "data").exists()
+        assert (tmpdir / "bags" / "interrupted" / "data" / "text.txt").exists()
+        state = journal.Journal.read(journal_file, fingerprint)
+        assert len(state.finished) == 3 and not state.unfinished
+
+    @pytest.mark.parametrize("engine", [
+        {"hash_threads": 2},
+        {"hash_threads": 2, "read_threads": 2, "hash_memory": 1},
+        {"processes": "auto"},
+    ])
+    def test_run_hash_threads(self, tmpdir, engine):
+        from grabbags import grabbags
+        from argparse import Namespace
+
+        for num in range(3):
+            (tmpdir / f"bag{num}" / "text.txt").write_binary(
+                b"x" * num, ensure=True
+            )
+
+        run_args = Namespace(
+            action_type='create',
+            no_system_files=False,
+            bag_info={},
+            checksums=["md5", "sha256"],
+            directories=[
+                tmpdir.strpath
+            ],
+            **{"processes": 1, **engine}
+        )
+        runner = grabbags.GrabbagsRunner()
+        runner.run(run_args)
+        assert len(runner.successes) == 3
+
+        (tmpdir / "bag1" / "data" / "text.txt").write_binary(b"y")
+        validate_args = Namespace(
+            action_type='validate',
+            fast=False,
+            no_checksums=False,
+            directories=[
+                tmpdir.strpath
+            ],
+            **{"processes": 1, **engine}
+        )
+        validate_runner = grabbags.GrabbagsRunner()
+        validate_runner.run(validate_args)
+        assert len(validate_runner.successes) == 2
+        assert validate_runner.failures == [(tmpdir / "bag1").strpath]
+
 
 class TestValidateBag:
     def test_fails_is_bag(self, monkeypatch):
@@ -786,24 +1616,60 @@ class TestValidateBag:
             ]
         )
         runner = grabbags.GrabbagsRunner()
-        runner.successes = []
-        runner.failures = []
-        runner.results = [
-            {
-                'not_a_bag': True,
-                "path": "directory1",
-            },
-            {
-                'not_a_bag': True,
-                "path": "directory2",
-            }
-        ]
+        _record(
+            runner,
+            results=[
+                {
+                    'not_a_bag': True,
+                    "path": "directory1",
+                },
+                {
+                    'not_a_bag': True,
+                    "path": "directory2",
+                }
+            ],
+        )
 
         report = runner.get_report(args)
         assert report == """Summary Report:
 0 bags validated successfully
 0 failures
 2 directories are not bags
+"""
+
+    def test_report_sampled(self):
+        from argparse import Namespace
+        from grabbags import grabbags
+        args = Namespace(action_type='validate', directories=["root"])
+        runner = grabbags.GrabbagsRunner()
+        _record(
+            runner,
+            successes=["root/bag1", "root/bag2"],
+            results=[
+                {
+                    "path": "root/bag1",
+                    "files_checked": 100,
+                    "files_total": 1000,
+                    "bytes_checked": 10,
+                    "bytes_total": 200,
+                },
+                {
+                    "path": "root/bag2",
+                    "files_checked": 200,
+                    "files_total": 2000,
+                    "bytes_checked": 20,
+                    "bytes_total": 200,
+                }
+            ],
+        )
+
+        report = runner.get_report(args)
+        assert report == """Summary Report:
+2 bags validated successfully
+0 failures
+0 directories are not bags
+Spot check covered 300 of 3000 files (10.0%) and 30 of 400 bytes (7.5%)
+With 95% confidence, fewer than 0.99% of the files are corrupt
 """
 
     def test_report_basic(self):
@@ -817,15 +1683,15 @@ class TestValidateBag:
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = [
-            "directory1",
-            "directory2",
-            "directory3",
-            "directory4",
-        ]
-        runner.failures = []
-        runner.skipped = []
-        runner.results = []
+        _record(
+            runner,
+            successes=[
+                "directory1",
+                "directory2",
+                "directory3",
+                "directory4",
+            ],
+        )
         report = runner.get_report(args)
         assert report == """Summary Report:
 4 bags validated successfully
@@ -844,27 +1710,27 @@ class TestValidateBag:
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = []
-        runner.failures = []
-        runner.skipped = []
-        runner.results = [
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory1",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory2",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory3",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory4",
-            # }
-        ]
+        _record(
+            runner,
+            results=[
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory1",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory2",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory3",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory4",
+                # }
+            ],
+        )
         report = runner.get_report(args)
         assert report == """Summary Report:
 0 bags validated successfully
@@ -883,33 +1749,33 @@ class TestValidateBag:
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = []
-        runner.failures = [
-            "directory1",
-            "directory2",
-            "directory3",
-            "directory4",
-        ]
-
-        runner.skipped = []
-        runner.results = [
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory1",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory2",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory3",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory4",
-            # }
-        ]
+        _record(
+            runner,
+            failures=[
+                "directory1",
+                "directory2",
+                "directory3",
+                "directory4",
+            ],
+            results=[
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory1",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory2",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory3",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory4",
+                # }
+            ],
+        )
         report = runner.get_report(args)
         assert report == """Summary Report:
 0 bags validated successfully
@@ -1085,32 +1951,33 @@ Tag-File-Character-Encoding: UTF-8
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = [
-            "directory1",
-            "directory2",
-            "directory3",
-            "directory4",
-        ]
-        runner.failures = []
-        runner.skipped = []
-        runner.results = [
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory1",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory2",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory3",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory4",
-            # }
-        ]
+        _record(
+            runner,
+            successes=[
+                "directory1",
+                "directory2",
+                "directory3",
+                "directory4",
+            ],
+            results=[
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory1",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory2",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory3",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory4",
+                # }
+            ],
+        )
         report = runner.get_report(args)
         assert report == """Summary Report:
 4 bags cleaned successfully
@@ -1130,33 +1997,34 @@ Tag-File-Character-Encoding: UTF-8
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = []
-        runner.failures = [
-            "directory1",
-            "directory2",
-            "directory3",
-            "directory4",
-        ]
-        runner.skipped = []
-        runner.results = [
-
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory1",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory2",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory3",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory4",
-            # }
-        ]
+        _record(
+            runner,
+            failures=[
+                "directory1",
+                "directory2",
+                "directory3",
+                "directory4",
+            ],
+            results=[
+
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory1",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory2",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory3",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory4",
+                # }
+            ],
+        )
         report = runner.get_report(args)
         assert report == """Summary Report:
 0 bags cleaned successfully
@@ -1176,34 +2044,36 @@ Tag-File-Character-Encoding: UTF-8
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = []
-        runner.failures = [
-        ]
-        runner.skipped = [
-            "directory1",
-            "directory2",
-            "directory3",
-            "directory4",
-        ]
-        runner.results = [
-
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory1",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory2",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory3",
-            # },
-            # {
-            #     "not_a_bag": False,
-            #     "path": "directory4",
-            # }
-        ]
+        _record(
+            runner,
+            failures=[
+            ],
+            skipped=[
+                "directory1",
+                "directory2",
+                "directory3",
+                "directory4",
+            ],
+            results=[
+
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory1",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory2",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory3",
+                # },
+                # {
+                #     "not_a_bag": False,
+                #     "path": "directory4",
+                # }
+            ],
+        )
         report = runner.get_report(args)
         assert report == """Summary Report:
 0 bags cleaned successfully
@@ -1223,27 +2093,27 @@ Tag-File-Character-Encoding: UTF-8
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = []
-        runner.failures = []
-        runner.skipped = []
-        runner.results = [
-            {
-                "not_a_bag": True,
-                "path": "directory1",
-            },
-            {
-                "not_a_bag": True,
-                "path": "directory2",
-            },
-            {
-                "not_a_bag": True,
-                "path": "directory3",
-            },
-            {
-                "not_a_bag": True,
-                "path": "directory4",
-            }
-        ]
+        _record(
+            runner,
+            results=[
+                {
+                    "not_a_bag": True,
+                    "path": "directory1",
+                },
+                {
+                    "not_a_bag": True,
+                    "path": "directory2",
+                },
+                {
+                    "not_a_bag": True,
+                    "path": "directory3",
+                },
+                {
+                    "not_a_bag": True,
+                    "path": "directory4",
+                }
+            ],
+        )
         report = runner.get_report(args)
         assert report == """Summary Report:
 0 bags cleaned successfully
@@ -1369,15 +2239,15 @@ class TestMakeBag:
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = [
-            "directory1",
-            "directory2",
-            "directory3",
-            "directory4",
-        ]
-        runner.failures = []
-        runner.skipped = []
-        runner.results = []
+        _record(
+            runner,
+            successes=[
+                "directory1",
+                "directory2",
+                "directory3",
+                "directory4",
+            ],
+        )
 
         report = runner.get_report(args)
         assert report == """Summary Report:
@@ -1402,26 +2272,27 @@ class TestMakeBag:
         )
 
         runner = grabbags.GrabbagsRunner()
-        runner.successes = [
-            "directory1",
-            "directory2",
-            "directory3",
-            "directory4",
-        ]
-        runner.failures = []
-        runner.skipped = []
-        runner.results = [
-            {
-                "already_a_bag": True,
-                "path": "directory5",
-                "skipped": True
-            },
-            {
-                "empty_dir": True,
-                "path": "directory6",
-                "skipped": True
-            }
-        ]
+        _record(
+            runner,
+            successes=[
+                "directory1",
+                "directory2",
+                "directory3",
+                "directory4",
+            ],
+            results=[
+                {
+                    "already_a_bag": True,
+                    "path": "directory5",
+                    "skipped": True
+                },
+                {
+                    "empty_dir": True,
+                    "path": "directory6",
+                    "skipped": True
+                }
+            ],
+        )
 
         report = runner.get_report(args)
         assert report == """Summary Report:
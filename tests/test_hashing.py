@@ -0,0 +1,293 @@
+import hashlib
+import threading
+import time
+
+import pytest
+
+from grabbags import hashing
+
+
+def test_calculate_file_hashes(tmpdir, monkeypatch):
+    data = b"0123456789" * 1000
+    sample = tmpdir / "sample.bin"
+    sample.write_binary(data)
+    monkeypatch.setattr(hashing, "BUFFER_SIZE", 64)
+    results = []
+
+    def run():
+        # a new thread so that it gets a buffer of the patched size
+        results.append(
+            hashing.calculate_file_hashes(sample.strpath, ["md5", "sha256"])
+        )
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+
+    assert results == [(
+        len(data),
+        {
+            "md5": hashlib.md5(data).hexdigest(),
+            "sha256": hashlib.sha256(data).hexdigest()
+        }
+    )]
+
+
+def test_verify_payload_file(tmpdir):
+    (tmpdir / "data" / "sample.txt").write_binary(b"abc", ensure=True)
+    expected = {"md5": hashlib.md5(b"abc").hexdigest()}
+    rel_path, found, recorded = hashing.verify_payload_file(
+        (tmpdir.strpath, "data/sample.txt", expected, ["md5"])
+    )
+    assert rel_path == "data/sample.txt"
+    assert found == expected and recorded == expected
+
+
+def test_verify_payload_file_missing(tmpdir):
+    expected = {"md5": hashlib.md5(b"abc").hexdigest()}
+    _, found, _ = hashing.verify_payload_file(
+        (tmpdir.strpath, "data/missing.txt", expected, ["md5"])
+    )
+    assert found["md5"].startswith("Could not read")
+
+
+def test_hash_pipeline(tmpdir, monkeypatch):
+    monkeypatch.setattr(hashing, "BUFFER_SIZE", 7)
+    files = {}
+    for num in range(20):
+        data = bytes(range(num * 3))
+        sample = tmpdir / f"sample{num}.bin"
+        sample.write_binary(data)
+        files[sample.strpath] = data
+
+    pipeline = hashing.HashPipeline(read_threads=3, hash_threads=2, memory=0)
+    with pipeline:
+        results = list(
+            pipeline.map(
+                lambda path: hashing.calculate_file_hashes(
+                    path, ["md5", "sha1"]
+                ),
+                files.keys()
+            )
+        )
+
+    for data, result in zip(files.values(), results):
+        assert result == (
+            len(data),
+            {
+                "md5": hashlib.md5(data).hexdigest(),
+                "sha1": hashlib.sha1(data).hexdigest()
+            }
+        )
+
+
+def test_hash_pipeline_missing_file(tmpdir):
+    with hashing.HashPipeline(read_threads=1, hash_threads=1) as pipeline:
+        _, found, _ = pipeline.submit(
+            hashing.verify_payload_file,
+            (tmpdir.strpath, "missing.txt", {"md5": "abc"}, ["md5"])
+        ).result()
+    assert found["md5"].startswith("Could not read")
+
+
+def test_verify_payload_file_measured(tmpdir):
+    from grabbags import metrics
+
+    (tmpdir / "data" / "sample.txt").write_binary(b"abc", ensure=True)
+    run_metrics = metrics.RunMetrics()
+    bag_metrics = run_metrics.start(tmpdir.strpath)
+    verify = hashing.reporting_to(hashing.verify_payload_file, bag_metrics)
+    verify((tmpdir.strpath, "data/sample.txt", {"md5": "0"}, ["md5"]))
+    run_metrics.finish(bag_metrics, "success")
+    assert bag_metrics.bytes_read == 3 and bag_metrics.files_hashed == 1
+    assert hashing.reporting_to(hashing.verify_payload_file) is \
+        hashing.verify_payload_file
+
+
+def test_pipeline_measured(tmpdir):
+    from grabbags import metrics
+
+    sample = tmpdir / "sample.bin"
+    sample.write_binary(b"x" * 100)
+    bag_metrics = metrics.BagMetrics(tmpdir.strpath)
+    pipeline = hashing.HashPipeline(1, 1, memory=0)
+    try:
+        pipeline.submit(
+            hashing.calculate_file_hashes, sample.strpath, ["md5"],
+            bag_metrics
+        ).result()
+    finally:
+        pipeline.shutdown()
+    assert bag_metrics.bytes_read == 100 and bag_metrics.files_hashed == 1
+
+
+def test_calculate_file_hashes_progress(tmpdir):
+    from grabbags import progress
+
+    sample = tmpdir / "sample.bin"
+    sample.write_binary(b"x" * 100)
+    run_progress = progress.Progress(interval=3600)
+    run_progress.set_work({tmpdir.strpath: 100})
+    bag_progress = run_progress.start_bag(tmpdir.strpath)
+    hashing.calculate_file_hashes(
+        sample.strpath, ["md5"], tracker=bag_progress
+    )
+    run_progress.finish_bag(bag_progress)
+    assert bag_progress.done == 100 and run_progress.done_bytes == 100
+
+
+def test_map_bounded(monkeypatch):
+    monkeypatch.setattr(hashing, "MAX_PENDING_TASKS", 3)
+    taken = []
+
+    def tasks():
+        for num in range(10):
+            taken.append(num)
+            yield num
+
+    with hashing.create_thread_pool(2) as executor:
+        results = hashing.map_bounded(executor, lambda num: num * 2, tasks())
+        assert next(results) == 0
+        assert len(taken) == 4
+        assert list(results) == [num * 2 for num in range(1, 10)]
+
+
+def test_map_reporting_process_pool(tmpdir):
+    import concurrent.futures
+    from grabbags import metrics
+    from grabbags import progress
+
+    for num in range(3):
+        (tmpdir / "data" / f"file{num}.txt").write_binary(
+            b"x" * num, ensure=True
+        )
+    tasks = [
+        (tmpdir.strpath, f"data/file{num}.txt", ["md5"]) for num in range(3)
+    ]
+    bag_metrics = metrics.BagMetrics(tmpdir.strpath)
+    run_progress = progress.Progress(interval=3600)
+    run_progress.set_work({tmpdir.strpath: 3})
+    bag_progress = run_progress.start_bag(tmpdir.strpath)
+    # neither can be pickled, so they must stay in this process
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        results = list(hashing.map_reporting(
+            executor, hashing.hash_payload_file, tasks,
+            bag_metrics, bag_progress
+        ))
+    assert [size for _, size, _ in results] == [0, 1, 2]
+    assert results[1][2] == {"md5": hashlib.md5(b"x").hexdigest()}
+    assert bag_metrics.bytes_read == 3 and bag_metrics.files_hashed == 3
+    assert bag_progress.done == 3
+
+
+def test_choose_algorithm():
+    algorithms = ["sha256", "md5", "sha512"]
+    assert hashing.choose_algorithm("strongest", algorithms) == "sha512"
+    assert hashing.choose_algorithm("fastest", algorithms) in algorithms
+    assert hashing.choose_algorithm("md5", algorithms) == "md5"
+    assert hashing.choose_algorithm("sha1", algorithms) is None
+    assert hashing.choose_algorithm("strongest", []) is None
+
+
+def test_adaptive_hash_pool_adjust():
+    with hashing.AdaptiveHashPool(workers=4, max_workers=8) as pool:
+        # the first change goes up unless the storage is busy
+        assert pool.adjust(100.0, io_wait=0.0) == 5
+        # more workers helped, so one more
+        assert pool.adjust(200.0, io_wait=0.0) == 6
+        # that one hurt, so it is taken back
+        assert pool.adjust(150.0, io_wait=0.0) == 5
+        # flat with idle storage stays
+        assert pool.adjust(151.0, io_wait=0.0) == 5
+        # flat with busy storage goes down
+        assert pool.adjust(150.0, io_wait=0.5) == 4
+        assert pool.adjust(150.0, io_wait=0.5) == 3
+
+    with hashing.AdaptiveHashPool(workers=1, max_workers=2) as pool:
+        assert pool.adjust(100.0, io_wait=0.9) == 1
+        assert pool.adjust(100.0) == 1
+
+
+def test_adaptive_hash_pool(tmpdir, monkeypatch):
+    monkeypatch.setattr(hashing, "BUFFER_SIZE", 4)
+    paths = []
+    for num in range(20):
+        (tmpdir / f"file{num}.txt").write_binary(b"x" * num)
+        paths.append((tmpdir / f"file{num}.txt").strpath)
+    adjust = []
+    with hashing.AdaptiveHashPool(workers=2, interval=0) as pool:
+        monkeypatch.setattr(
+            pool, "adjust",
+            lambda throughput, io_wait=None: adjust.append(throughput)
+        )
+        results = list(pool.map(
+            lambda path: hashing.calculate_file_hashes(path, ["md5"]), paths
+        ))
+    assert [size for size, _ in results] == list(range(20))
+    assert results[3][1] == {"md5": hashlib.md5(b"xxx").hexdigest()}
+    # with no interval, the pool adjusts after every block
+    assert len(adjust) == sum(-(-num // 4) for num in range(20))
+
+
+def test_adaptive_hash_pool_gate():
+    release = threading.Event()
+    with hashing.AdaptiveHashPool(workers=1, max_workers=2) as pool:
+        first = pool.submit(release.wait)
+        second = pool.submit(lambda: None)
+        # the idle worker doesn't take the task while the other one runs
+        assert second.cancel()
+        third = pool.submit(lambda: "third")
+        pool.adjust(100.0, io_wait=0.0)
+        assert third.result(timeout=5) == "third"
+        assert not first.done()
+        release.set()
+    assert first.result()
+
+
+def test_adaptive_hash_pool_shutdown():
+    release = threading.Event()
+    pool = hashing.AdaptiveHashPool(workers=1, max_workers=2)
+    first = pool.submit(release.wait)
+    second = pool.submit(lambda: "second")
+    failed = pool.submit(lambda: 1 / 0)
+    release.set()
+    pool.shutdown()
+    # tasks queued before the shutdown still run
+    assert second.result() == "second"
+    assert isinstance(failed.exception(), ZeroDivisionError)
+    assert first.result()
+    assert len(pool._threads) <= 2
+    assert not any(thread.is_alive() for thread in pool._threads)
+    with pytest.raises(RuntimeError):
+        pool.submit(lambda: None)
+
+
+def test_adaptive_hash_pool_idle(monkeypatch):
+    clock = [0.0]
+    monkeypatch.setattr(hashing.time, "monotonic", lambda: clock[0])
+    adjust = []
+
+    def work(now):
+        clock[0] = now
+        hashing._local.adaptive.add_bytes(100)
+
+    with hashing.AdaptiveHashPool(workers=1, interval=10) as pool:
+        monkeypatch.setattr(
+            pool, "adjust",
+            lambda throughput, io_wait=None: adjust.append(throughput)
+        )
+        pool.submit(work, 4).result()
+        while pool._idle_since is None:
+            time.sleep(0.001)
+        # a long gap between bags isn't counted
+        clock[0] = 1004
+        pool.submit(work, 1008).result()
+        assert adjust == []
+        pool.submit(work, 1010).result()
+    assert adjust == [30.0]
+
+
+def test_cpu_times():
+    times = hashing.cpu_times()
+    if times is not None:
+        assert 0 <= times[0] <= times[1]
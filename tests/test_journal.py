@@ -0,0 +1,70 @@
+import argparse
+
+from grabbags import journal
+
+
+def test_fingerprint_depends_on_options():
+    validate = argparse.Namespace(action_type="validate", fast=False)
+    fast_validate = argparse.Namespace(action_type="validate", fast=True)
+    assert journal.options_fingerprint(validate) == \
+        journal.options_fingerprint(argparse.Namespace(**vars(validate)))
+    assert journal.options_fingerprint(validate) != \
+        journal.options_fingerprint(fast_validate)
+
+
+def test_fingerprint_ignores_output_options():
+    create = argparse.Namespace(
+        action_type="create", trust_sidecars=False, checksum_csv=None,
+        processes=1, results_file=None
+    )
+    faster = argparse.Namespace(**vars(create))
+    faster.processes = 8
+    faster.results_file = "results.ndjson"
+    trusting = argparse.Namespace(**vars(create))
+    trusting.trust_sidecars = True
+    assert journal.options_fingerprint(create) == \
+        journal.options_fingerprint(faster)
+    assert journal.options_fingerprint(create) != \
+        journal.options_fingerprint(trusting)
+
+
+def test_read_finished_and_unfinished(tmpdir):
+    journal_file = (tmpdir / "journal.ndjson").strpath
+    with journal.Journal(journal_file, "abc") as progress:
+        progress.start("bag1", "create")
+        progress.finish("bag1", "create", "success")
+        progress.start("bag2", "create")
+        progress.finish("bag2", "create", "failure")
+        progress.start("bag3", "create")
+
+    state = journal.Journal.read(journal_file, "abc")
+    assert state.finished == {"bag1"}
+    assert state.unfinished == {"bag3": "create"}
+
+
+def test_read_other_options(tmpdir):
+    journal_file = (tmpdir / "journal.ndjson").strpath
+    with journal.Journal(journal_file, "abc") as progress:
+        progress.start("bag1", "validate")
+        progress.finish("bag1", "validate", "success")
+
+    state = journal.Journal.read(journal_file, "other")
+    assert state.finished == set()
+    assert state.unfinished == {}
+
+
+def test_read_truncated_line(tmpdir):
+    journal_file = tmpdir / "journal.ndjson"
+    with journal.Journal(journal_file.strpath, "abc") as progress:
+        progress.start("bag1", "validate")
+        progress.finish("bag1", "validate", "success")
+    with open(journal_file.strpath, "a", encoding="utf-8") as handle:
+        handle.write('{"event": "fin')
+
+    state = journal.Journal.read(journal_file.strpath, "abc")
+    assert state.finished == {"bag1"}
+
+
+def test_read_missing_journal(tmpdir):
+    state = journal.Journal.read((tmpdir / "missing").strpath, "abc")
+    assert state.finished == set() and state.unfinished == {}
@@ -0,0 +1,132 @@
+import hashlib
+import os
+
+import bagit
+import pytest
+
+import grabbags.bags
+from grabbags import manifests
+
+
+def test_manifest_index(monkeypatch):
+    monkeypatch.setattr(manifests, "INITIAL_SLOTS", 4)
+    index = manifests.ManifestIndex()
+    paths = [os.path.join("data", f"file{num}.txt") for num in range(100)]
+    for path in paths:
+        assert index.add(path, "md5", hashlib.md5(path.encode()).hexdigest()) \
+            is None
+    for path in paths[::2]:
+        index.add(path, "sha256", hashlib.sha256(path.encode()).hexdigest())
+
+    assert len(index) == 100
+    assert list(index) == paths
+    assert paths[1] in index
+    assert "data/missing.txt" not in index
+    assert index[paths[0]] == {
+        "md5": hashlib.md5(paths[0].encode()).hexdigest(),
+        "sha256": hashlib.sha256(paths[0].encode()).hexdigest(),
+    }
+    assert index[paths[1]] == {
+        "md5": hashlib.md5(paths[1].encode()).hexdigest()
+    }
+    assert dict(index.items()) == {path: index[path] for path in paths}
+    assert index.algorithms == ["md5", "sha256"]
+    assert index.nbytes < 100 * 100
+    with pytest.raises(KeyError):
+        index["data/missing.txt"]
+
+
+def test_manifest_index_duplicates_and_odd_digests():
+    index = manifests.ManifestIndex()
+    assert index.add("data/a.txt", "md5", "0" * 32) is None
+    assert index.add("data/a.txt", "md5", "1" * 32) == "0" * 32
+    assert index["data/a.txt"] == {"md5": "0" * 32}
+
+    index.add("data/b.txt", "md5", "not a digest")
+    assert index["data/b.txt"] == {"md5": "not a digest"}
+
+
+def test_manifest_index_normalizes_unicode():
+    index = manifests.ManifestIndex()
+    index.add("data/cafe\u0301.txt", "md5", "0" * 32)
+    assert "data/caf\u00e9.txt" in index
+    assert "data/cafe\u0301.txt" in index
+    assert list(index) == ["data/cafe\u0301.txt"]
+
+
+def test_read_manifest(tmpdir):
+    manifest = tmpdir / "manifest-md5.txt"
+    manifest.write_text(
+        "\ufeff# comment\n\n0123  data/a b.txt\nbroken\n", encoding="utf-8"
+    )
+    assert list(manifests.read_manifest(manifest.strpath)) == [
+        ("0123", "data/a b.txt")
+    ]
+
+
+def make_bag(bag_dir):
+    for num in range(5):
+        (bag_dir / f"file{num}.txt").ensure().write_text(
+            "x" * num, encoding="utf-8"
+        )
+    (bag_dir / "caf\u00e9.txt").ensure()
+    grabbags.bags.make_bag(bag_dir.strpath, checksums=["md5", "sha256"])
+    os.rename(
+        (bag_dir / "data" / "caf\u00e9.txt").strpath,
+        (bag_dir / "data" / "cafe\u0301.txt").strpath
+    )
+
+
+def test_compact_bag_validates(tmpdir):
+    make_bag(tmpdir / "bag")
+    bag = grabbags.bags.Bag((tmpdir / "bag").strpath, compact_manifests=True)
+    assert isinstance(bag.entries, manifests.ManifestIndex)
+    assert bag.validate() is True
+
+    (tmpdir / "bag" / "data" / "file1.txt").write_text("y", encoding="utf-8")
+    with pytest.raises(bagit.BagValidationError) as error:
+        bag.validate()
+    assert bag.stage == "payload fixity"
+    assert {(e.path, e.algorithm) for e in error.value.details} == {
+        (os.path.join("data", "file1.txt"), "md5"),
+        (os.path.join("data", "file1.txt"), "sha256"),
+    }
+
+
+def test_compact_bag_completeness(tmpdir):
+    make_bag(tmpdir / "bag")
+    os.remove((tmpdir / "bag" / "data" / "file2.txt").strpath)
+    (tmpdir / "bag" / "data" / "extra.txt").ensure()
+
+    expected = bagit.Bag((tmpdir / "bag").strpath).compare_manifests_with_fs()
+    bag = grabbags.bags.Bag((tmpdir / "bag").strpath, compact_manifests=True)
+    assert bag.compare_manifests_with_fs() == expected
+    assert expected == (
+        [os.path.join("data", "file2.txt")],
+        [os.path.join("data", "extra.txt")]
+    )
+
+
+def test_compact_bag_chosen_by_manifest_size(tmpdir, monkeypatch):
+    make_bag(tmpdir / "bag")
+    assert isinstance(
+        grabbags.bags.Bag((tmpdir / "bag").strpath).entries, dict
+    )
+    monkeypatch.setattr(grabbags.bags, "COMPACT_MANIFEST_BYTES", 100)
+    assert grabbags.bags.manifests_size((tmpdir / "bag").strpath) > 100
+    assert isinstance(
+        grabbags.bags.Bag((tmpdir / "bag").strpath).entries,
+        manifests.ManifestIndex
+    )
+
+
+def test_compact_bag_clean_payload(tmpdir):
+    make_bag(tmpdir / "bag")
+    (tmpdir / "bag" / "data" / ".DS_Store").ensure()
+    (tmpdir / "bag" / "data" / "extra.txt").ensure()
+    bag = grabbags.bags.Bag((tmpdir / "bag").strpath, compact_manifests=True)
+
+    result = grabbags.bags.clean_payload(bag)
+
+    assert result.removed == [os.path.join("data", ".DS_Store")]
+    assert result.unexpected == [os.path.join("data", "extra.txt")]
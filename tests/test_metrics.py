@@ -0,0 +1,37 @@
+from grabbags import metrics
+
+
+def test_bag_metrics():
+    bag_metrics = metrics.BagMetrics("bag")
+    bag_metrics.add_file(1000, 0.5, 0.25)
+    bag_metrics.add_file(1000, 0.5, 0.25)
+    bag_metrics.add_time("stat_time", 0.1)
+    bag_metrics.wall_time = 2.0
+    assert bag_metrics.as_dict() == {
+        "bytes_read": 2000,
+        "files_hashed": 2,
+        "stat_time": 0.1,
+        "read_time": 1.0,
+        "hash_time": 0.5,
+        "wall_time": 2.0,
+        "mb_per_second": 0.001,
+    }
+
+
+def test_run_metrics_textfile(tmpdir):
+    run_metrics = metrics.RunMetrics(bag_workers=2)
+    for outcome in ["success", "success", "failure"]:
+        bag_metrics = run_metrics.start(tmpdir.strpath)
+        bag_metrics.add_file(10, 0.0, 0.0)
+        run_metrics.finish(bag_metrics, outcome)
+    run_metrics.stop()
+    assert 0 <= run_metrics.utilisation <= 1
+
+    textfile = tmpdir / "grabbags.prom"
+    run_metrics.write_textfile(textfile.strpath, "validate")
+    lines = textfile.read_text("utf-8").splitlines()
+    assert 'grabbags_bags{action="validate",outcome="failure"} 1' in lines
+    assert 'grabbags_bags{action="validate",outcome="success"} 2' in lines
+    assert 'grabbags_bytes_read{action="validate"} 30' in lines
+    assert "# TYPE grabbags_hash_seconds counter" in lines
+    assert [path.basename for path in tmpdir.listdir()] == ["grabbags.prom"]
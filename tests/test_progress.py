@@ -0,0 +1,50 @@
+import io
+import logging
+
+from grabbags import progress
+
+
+class FakeTerminal(io.StringIO):
+    def isatty(self):
+        return True
+
+
+def test_format_bytes():
+    assert progress.format_bytes(999) == "999 B"
+    assert progress.format_bytes(1500000) == "1.5 MB"
+
+
+def test_progress_on_terminal():
+    terminal = FakeTerminal()
+    run_progress = progress.Progress(stream=terminal, interval=0)
+    run_progress.set_work({"bag1": 100, "bag2": 300})
+
+    bag_progress = run_progress.start_bag("bag1")
+    bag_progress.add(50)
+    assert "50 B of 400 B (12%), 0 of 2 bags" in terminal.getvalue()
+
+    run_progress.finish_bag(bag_progress)
+    assert run_progress.done_bytes == 100
+
+    run_progress.skip_bag("bag2")
+    run_progress.close()
+    last_line = terminal.getvalue().rsplit("\r", 1)[1]
+    assert last_line.startswith("\x1b[K100 B of 100 B (100%), 1 of 1 bags")
+    assert last_line.endswith("ETA 0:00:00\n")
+
+
+def test_progress_logged_and_throttled(caplog):
+    caplog.set_level(logging.INFO)
+    run_progress = progress.Progress(stream=io.StringIO(), interval=3600)
+    run_progress.set_work({"bag1": 100})
+    bag_progress = run_progress.start_bag("bag1")
+    for _ in range(10):
+        bag_progress.add(1)
+    run_progress.update(force=True)
+    run_progress.finish_bag(bag_progress)
+    messages = [
+        record.getMessage() for record in caplog.records
+        if record.getMessage().startswith("Progress:")
+    ]
+    assert len(messages) == 1
+    assert messages[0].startswith("Progress: 10 B of 100 B (10%), 0 of 1 bags")
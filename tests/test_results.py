@@ -0,0 +1,74 @@
+import json
+
+from grabbags import results
+
+
+def test_result_sink(tmpdir):
+    results_file = (tmpdir / "results.ndjson").strpath
+    with results.ResultSink(results_file) as sink:
+        sink.write("bag1", "validate", "success", (100, 2), 0.5)
+        sink.write("dir1", "validate", "not_a_bag", None, 0.1)
+
+    with open(results_file, encoding="utf-8") as lines:
+        records = [json.loads(line) for line in lines]
+    assert records == [
+        {
+            "path": "bag1", "action": "validate", "outcome": "success",
+            "bytes": 100, "files": 2, "duration": 0.5
+        },
+        {
+            "path": "dir1", "action": "validate", "outcome": "not_a_bag",
+            "bytes": None, "files": None, "duration": 0.1
+        },
+    ]
+
+
+def test_result_sink_append(tmpdir):
+    results_file = (tmpdir / "results.ndjson").strpath
+    with results.ResultSink(results_file) as sink:
+        sink.write("bag1", "validate", "success", (100, 2), 0.5)
+    with results.ResultSink(results_file, append=True) as sink:
+        sink.write("bag2", "validate", "failure", None, 0.1)
+    with open(results_file, encoding="utf-8") as lines:
+        assert [json.loads(line)["path"] for line in lines] == \
+            ["bag1", "bag2"]
+
+    with results.ResultSink(results_file) as sink:
+        sink.write("bag3", "validate", "success", None, 0.1)
+    with open(results_file, encoding="utf-8") as lines:
+        assert [json.loads(line)["path"] for line in lines] == ["bag3"]
+
+
+def test_result_counters():
+    counters = results.ResultCounters()
+    counters.add(results.BagResult("bag1", results.Outcome.SUCCESS))
+    counters.add(
+        results.BagResult(
+            "dir1", results.Outcome.SKIPPED, empty_dir=True
+        )
+    )
+    counters.add(
+        results.BagResult(
+            "bag2", results.Outcome.SKIPPED, already_a_bag=True
+        )
+    )
+    counters.add(
+        results.BagResult(
+            "bag3", results.Outcome.FAILURE, sample=(1, 10, 5, 50)
+        )
+    )
+    assert counters["successes"] == 1
+    assert counters["failures"] == 1
+    assert counters["skipped"] == 2
+    assert counters["sampled"] == 1
+    assert counters["bytes_total"] == 50
+    assert counters.empty_dirs == ["dir1"]
+    assert counters.already_bags == ["bag2"]
+
+
+def test_bag_result_from_results():
+    result = results.BagResult.from_results(
+        {"path": "dir1", "not_a_bag": True}
+    )
+    assert result.outcome is results.Outcome.NOT_A_BAG
+    assert not hasattr(result, "__dict__")
@@ -0,0 +1,58 @@
+import hashlib
+
+import grabbags.bags
+from grabbags import sidecars
+
+
+MD5_A = hashlib.md5(b"a").hexdigest()
+SHA256_B = hashlib.sha256(b"b").hexdigest()
+
+
+def test_read_sidecar(tmpdir):
+    (tmpdir / "only.md5").write_text(MD5_A.upper() + "\n", encoding="utf-8")
+    (tmpdir / "md5sum.md5").write_text(
+        f"\n{MD5_A}  only.txt\n", encoding="utf-8"
+    )
+    (tmpdir / "wrong.sha256").write_text(MD5_A, encoding="utf-8")
+    assert sidecars.read_sidecar((tmpdir / "only.md5").strpath, "md5") == \
+        MD5_A
+    assert sidecars.read_sidecar((tmpdir / "md5sum.md5").strpath, "md5") == \
+        MD5_A
+    assert sidecars.read_sidecar(
+        (tmpdir / "wrong.sha256").strpath, "sha256"
+    ) is None
+
+
+def test_read_checksum_csv(tmpdir):
+    (tmpdir / "checksums.csv").write_text(
+        "Filename,Size,MD5,SHA-256\n"
+        f"./a.txt,1,{MD5_A},\n"
+        f"sub\\b.txt,1,not a digest,{SHA256_B}\n"
+        ",,,\n",
+        encoding="utf-8"
+    )
+    assert sidecars.read_checksum_csv((tmpdir / "checksums.csv").strpath) \
+        == {"a.txt": {"md5": MD5_A}, "sub/b.txt": {"sha256": SHA256_B}}
+
+
+def test_collect_digests(tmpdir):
+    (tmpdir / "bag" / "a.txt").write_text("a", encoding="utf-8", ensure=True)
+    (tmpdir / "bag" / "a.txt.md5").write_text(MD5_A, encoding="utf-8")
+    (tmpdir / "bag" / "sub" / "b.txt").write_text(
+        "b", encoding="utf-8", ensure=True
+    )
+    (tmpdir / "bag" / "sub" / "checksums.csv").write_text(
+        f"path,sha256\nb.txt,{SHA256_B}\nmissing.txt,{SHA256_B}\n",
+        encoding="utf-8"
+    )
+    prepared = grabbags.bags.prepare_tree((tmpdir / "bag").strpath)
+
+    assert sidecars.collect_digests(
+        prepared.files, prepared.path, csv_name="checksums.csv"
+    ) == {
+        "data/a.txt": {"md5": MD5_A},
+        "data/sub/b.txt": {"sha256": SHA256_B},
+    }
+    assert sidecars.collect_digests(
+        prepared.files, prepared.path, use_sidecars=False
+    ) == {}
@@ -68,3 +68,30 @@ class TestVersionStrategies:
         assert utils.current_version(
             strategies=[NotValidStrategy()]
         ) == "Unknown"
+
+
+@pytest.mark.parametrize("threads", [1, 3])
+def test_remove_system_files(tmpdir, threads, caplog):
+    (tmpdir / ".DS_Store").ensure().write_text("12345", encoding="utf-8")
+    (tmpdir / "sub" / "Thumbs.db").ensure().write_text("123", encoding="utf-8")
+    (tmpdir / "sub" / "deeper" / "._file.txt").ensure()
+    (tmpdir / "sub" / "deeper" / "file.txt").ensure()
+    (tmpdir / "._folder").ensure_dir()
+
+    result = utils.remove_system_files(tmpdir.strpath, threads=threads)
+
+    assert result == utils.SweepResult(files_removed=3, bytes_removed=8)
+    assert sorted(p.basename for p in tmpdir.visit()) == \
+        ["._folder", "deeper", "file.txt", "sub"]
+    assert not any(r.levelname == "WARNING" for r in caplog.records)
+
+
+def test_remove_system_files_log_each(tmpdir, caplog):
+    (tmpdir / "Thumbs.db").ensure()
+
+    utils.remove_system_files(tmpdir.strpath, log_each=True)
+
+    assert any(
+        r.levelname == "WARNING" and "Thumbs.db" in r.getMessage()
+        for r in caplog.records
+    )